@@ -0,0 +1,204 @@
+"""
+Activity statistics over time windows
+
+Statistics for a window [start, end) and the window of the same length
+before it. The attempt counts of both windows and the new users come from
+one query: a single range scan of quiz_attempts over both windows, split
+with conditional aggregation (CASE inside the aggregates), which SQLite
+answers from the covering index ix_quiz_attempts_completed_cover alone.
+The top quiz needs its own GROUP BY over the current window.
+
+Results are kept in a short-lived cache shared by /api/admin/jobs/daily-stats
+and the daily admin report, and concurrent requests for the same window
+wait for one computation instead of each running the queries.
+"""
+
+import copy
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Float, case, cast, distinct, func, select
+
+from models import Quiz, QuizAttempt, User
+
+MAX_WINDOW_DAYS = 366
+
+
+class StatsWindowError(ValueError):
+    pass
+
+
+def day_start(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_window(args, now=None):
+    """
+    (start, end) from request arguments, in UTC, end exclusive:
+    - days=N: the last N days including today (default 1, i.e. today)
+    - period=week: this week, from Monday
+    - start=YYYY-MM-DD and optionally end=YYYY-MM-DD (inclusive)
+    """
+    today = day_start(now or datetime.utcnow())
+    tomorrow = today + timedelta(days=1)
+
+    try:
+        if args.get('start'):
+            start = datetime.strptime(args['start'], '%Y-%m-%d')
+            end = datetime.strptime(args['end'], '%Y-%m-%d') + timedelta(days=1) if args.get('end') else tomorrow
+        elif args.get('period'):
+            if args['period'] != 'week':
+                raise StatsWindowError("period must be 'week'")
+            start, end = today - timedelta(days=today.weekday()), tomorrow
+        else:
+            days = int(args.get('days', 1))
+            start, end = tomorrow - timedelta(days=days), tomorrow
+    except (TypeError, ValueError) as e:
+        if isinstance(e, StatsWindowError):
+            raise
+        raise StatsWindowError(f"Invalid time window: {str(e)}")
+
+    if end <= start:
+        raise StatsWindowError("The window must end after it starts")
+    if (end - start).days > MAX_WINDOW_DAYS:
+        raise StatsWindowError(f"The window can be at most {MAX_WINDOW_DAYS} days")
+    return start, end
+
+
+def window_aggregates(in_window, percentage):
+    """Aggregates of the attempts matching `in_window` (active users, attempts, average, quizzes)"""
+    return [
+        func.count(distinct(case((in_window, QuizAttempt.user_id)))),
+        func.count(case((in_window, QuizAttempt.id))),
+        func.avg(case((in_window, percentage))),
+        func.count(distinct(case((in_window, QuizAttempt.quiz_id))))
+    ]
+
+
+def attempt_stats(values):
+    active_users, total_attempts, avg_score, quizzes_taken = values
+    return {
+        'active_users': active_users or 0,
+        'total_attempts': total_attempts or 0,
+        'avg_score': round(avg_score, 2) if avg_score else 0,
+        'quizzes_taken': quizzes_taken or 0
+    }
+
+
+def compute_stats(session, start, end):
+    """Stats for [start, end) and the window of the same length before it"""
+    previous_start = start - (end - start)
+    # NULLIF keeps quizzes without questions out of the average on every database
+    percentage = cast(QuizAttempt.score, Float) / func.nullif(QuizAttempt.total_questions, 0) * 100
+
+    new_users = select(func.count(User.id)).where(
+        User.created_at >= start,
+        User.created_at < end
+    ).scalar_subquery()
+
+    # Both windows in one pass over [previous_start, end)
+    current = QuizAttempt.completed_at >= start
+    row = session.query(
+        *window_aggregates(current, percentage),
+        *window_aggregates(QuizAttempt.completed_at < start, percentage),
+        new_users
+    ).filter(
+        QuizAttempt.completed_at >= previous_start,
+        QuizAttempt.completed_at < end
+    ).one()
+
+    attempts = func.count(QuizAttempt.id)
+    avg_score = func.avg(percentage)
+    top_quiz = session.query(
+        Quiz.title, attempts, avg_score
+    ).join(
+        Quiz, QuizAttempt.quiz_id == Quiz.id
+    ).filter(
+        QuizAttempt.completed_at >= start,
+        QuizAttempt.completed_at < end
+    ).group_by(
+        Quiz.id, Quiz.title
+    ).order_by(attempts.desc(), avg_score.desc().nullslast()).first()
+
+    return {
+        'window': {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'days': round((end - start).total_seconds() / 86400, 2)
+        },
+        'current': attempt_stats(row[0:4]),
+        'previous': attempt_stats(row[4:8]),
+        'new_users': row[8] or 0,
+        'top_quiz': {
+            'title': top_quiz[0] if top_quiz else 'No quizzes taken',
+            'attempts': top_quiz[1] if top_quiz else 0,
+            'avg_score': round(top_quiz[2], 2) if top_quiz and top_quiz[2] else 0
+        }
+    }
+
+
+class StatsCache:
+    """Thread-safe TTL cache of computed stats; concurrent misses for one key compute it once"""
+
+    def __init__(self, ttl=60, maxsize=64):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries = {}
+        self._computing = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _fresh(self, key, now):
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None and entry[1] > now else None
+
+    def get(self, key, compute):
+        with self._lock:
+            value = self._fresh(key, time.monotonic())
+            if value is not None:
+                self.hits += 1
+                return copy.deepcopy(value)
+            key_lock = self._computing.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                # Another thread may have computed it while this one waited
+                value = self._fresh(key, time.monotonic())
+                if value is not None:
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                self.misses += 1
+
+            value = compute()
+
+            with self._lock:
+                now = time.monotonic()
+                if len(self._entries) >= self.maxsize:
+                    self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                    if len(self._entries) >= self.maxsize:
+                        self._entries.clear()
+                self._entries[key] = (value, now + self.ttl)
+                self._computing.pop(key, None)
+        return copy.deepcopy(value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0
+            }
+
+
+stats_cache = StatsCache(ttl=int(os.getenv('STATS_CACHE_TTL', '60')))
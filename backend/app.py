@@ -11,16 +11,25 @@ from sqlalchemy.orm import joinedload
 
 # Import models and database
 from models import db, User, Subject, Chapter, Quiz, Question, QuizAttempt, UserAnswer
-
-# Import the job scheduler
-from jobs import job_scheduler, test_user_reminders, test_admin_report, test_weekly_cleanup, test_get_inactive_users, test_get_daily_stats
+from grading import answer_key_cache, get_answer_key, grade_answers, save_answers, invalidate_answer_keys
+from quiz_payload import payload_cache, get_payload, invalidate_payloads, draw_questions, start_response
+from sampling import encode_ids, decode_ids
+from shuffle import new_seed, to_original_answers
+from pagination import PaginationError, keyset_page, page_response, search_pattern, date_range_start
+from reports import record_attempt, rebuild_rollups, rollups_missing, build_report
+from cascade import BackgroundDeleter, deactivate_entity, delete_entity
+from database import database_url, engine_options, install_sqlite_pragmas
+from auth import user_role_cache, token_role, invalidate_user_roles
+from activity_stats import StatsWindowError, parse_window, stats_cache
+from catalog import CATALOG_TABLES, cache_backend, catalog_cache, catalog_cached, catalog_changed, ensure_versions
 
 load_dotenv()
 
 app = Flask(__name__)
 
 # Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quiz_app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # JWT configuration
@@ -28,10 +37,55 @@ app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'your-secret-key-chan
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 app.config['JWT_ALGORITHM'] = 'HS256'
 
+# Admin report engine: 'rollup' (default), 'sql' or 'python'
+app.config['REPORTS_ENGINE'] = os.getenv('REPORTS_ENGINE', 'rollup')
+
+# In-process LRU cache of quiz answer keys used for grading
+app.config['ANSWER_KEY_CACHE_SIZE'] = int(os.getenv('ANSWER_KEY_CACHE_SIZE', '1024'))
+answer_key_cache.maxsize = app.config['ANSWER_KEY_CACHE_SIZE']
+
+# In-process LRU cache of serialized quiz start payloads (quiz and questions)
+app.config['QUIZ_PAYLOAD_CACHE_SIZE'] = int(os.getenv('QUIZ_PAYLOAD_CACHE_SIZE', '1024'))
+payload_cache.maxsize = app.config['QUIZ_PAYLOAD_CACHE_SIZE']
+
+# Both caches drop their entries once another process changed a quiz or question,
+# which they check for at most every this many seconds
+app.config['QUIZ_CACHE_CHECK_INTERVAL'] = float(os.getenv('QUIZ_CACHE_CHECK_INTERVAL', '1'))
+answer_key_cache.check_interval = app.config['QUIZ_CACHE_CHECK_INTERVAL']
+payload_cache.check_interval = app.config['QUIZ_CACHE_CHECK_INTERVAL']
+
+# Show each attempt its questions and options in its own order (shuffle.py)
+app.config['SHUFFLE_QUESTIONS'] = os.getenv('SHUFFLE_QUESTIONS', 'true').lower() == 'true'
+
+# Role checks read the stored role through this cache; role changes apply everywhere within the TTL
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', '60'))
+user_role_cache.ttl = app.config['USER_CACHE_TTL']
+
+# Daily/windowed activity stats are shared by the admin endpoint and report for a short while
+app.config['STATS_CACHE_TTL'] = int(os.getenv('STATS_CACHE_TTL', '60'))
+stats_cache.ttl = app.config['STATS_CACHE_TTL']
+
+# Catalog responses carry ETags; browsers may reuse them this many seconds before revalidating
+app.config['CATALOG_MAX_AGE'] = int(os.getenv('CATALOG_MAX_AGE', '0'))
+
+# The whole catalog tree (/api/catalog) is cached in this process ('memory') or on Redis ('redis')
+app.config['CATALOG_CACHE_BACKEND'] = os.getenv('CATALOG_CACHE_BACKEND', 'memory')
+app.config['CATALOG_CACHE_URL'] = os.getenv('CATALOG_CACHE_URL', 'redis://localhost:6379/0')
+app.config['CATALOG_CACHE_TTL'] = int(os.getenv('CATALOG_CACHE_TTL', '3600'))
+catalog_cache.backend = cache_backend(app.config['CATALOG_CACHE_BACKEND'], app.config['CATALOG_CACHE_URL'])
+catalog_cache.ttl = app.config['CATALOG_CACHE_TTL']
+
+# Admin job endpoints; the job scheduler (jobs.py) is only loaded when one is first used
+app.config['JOBS_ENABLED'] = os.getenv('JOBS_ENABLED', 'true').lower() == 'true'
+
 # Initialize extensions
 db.init_app(app)
 jwt = JWTManager(app)
 
+# Tune SQLite connections
+with app.app_context():
+    install_sqlite_pragmas(db.engine)
+
 # CORS configuration - Fix CORS error
 CORS(app, resources={
     r"/api/*": {
@@ -42,6 +96,38 @@ CORS(app, resources={
     }
 })
 
+def invalidate_quizzes(*quiz_ids):
+    """Drop the cached answer keys and start payloads of changed quizzes (call after commit)"""
+    invalidate_answer_keys(*quiz_ids)
+    invalidate_payloads(*quiz_ids)
+
+def sample_settings(data, quiz):
+    """Apply sample_size / sample_by_points from request data to a quiz; returns an error message or None"""
+    if 'sample_size' in data:
+        sample_size = data['sample_size']
+        if sample_size in (None, '', 0):
+            quiz.sample_size = None
+        else:
+            try:
+                sample_size = int(sample_size)
+            except (TypeError, ValueError):
+                return 'Sample size must be a number'
+            if sample_size < 1:
+                return 'Sample size must be at least 1'
+            quiz.sample_size = sample_size
+    if 'sample_by_points' in data:
+        quiz.sample_by_points = bool(data['sample_by_points'])
+    return None
+
+def invalidate_deleted(kind, entity_id, quiz_ids):
+    """Drop cached data of a finished background delete"""
+    invalidate_quizzes(*quiz_ids)
+    if kind == 'user':
+        invalidate_user_roles(entity_id)
+
+# Large deletes requested with ?background=true run on this worker
+background_deletions = BackgroundDeleter(app, on_deleted=invalidate_deleted)
+
 # JWT error handlers
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
@@ -66,6 +152,14 @@ def init_db():
             print(f"Migration warning: {str(e)}")
         
         db.create_all()
+        ensure_versions()
+        db.session.commit()
+        
+        # Build report rollups for databases that predate them
+        if rollups_missing():
+            print("Backfilling report rollups...")
+            rebuild_rollups()
+            db.session.commit()
         
         # Check if admin user exists
         admin_user = User.query.filter_by(role='admin').first()
@@ -162,10 +256,11 @@ def admin_required(f):
             current_user_id = get_jwt_identity()
             if not current_user_id:
                 return jsonify({'message': 'Invalid token identity'}), 401
-                
-            user = User.query.get(int(current_user_id))
             
-            if not user or user.role != 'admin':
+            # Stored role, cached for at most USER_CACHE_TTL seconds
+            role = token_role(int(current_user_id))
+            
+            if role != 'admin':
                 return jsonify({'message': 'Admin access required'}), 403
             return f(*args, **kwargs)
         except Exception as e:
@@ -225,9 +320,22 @@ def register():
         print(f"Registration error: {str(e)}")
         return jsonify({'message': 'Registration failed', 'error': str(e)}), 500
 
+# Catalog tree: subjects -> chapters -> quizzes in one response
+@app.route('/api/catalog', methods=['GET'])
+@jwt_required()
+@catalog_cached(*CATALOG_TABLES)
+def get_catalog():
+    try:
+        return app.response_class(catalog_cache.get(), mimetype='application/json'), 200
+        
+    except Exception as e:
+        print(f"Get catalog error: {str(e)}")
+        return jsonify({'message': 'Failed to get catalog', 'error': str(e)}), 422
+
 # Subject routes
 @app.route('/api/subjects', methods=['GET'])
 @jwt_required()
+@catalog_cached('subjects', 'chapters')
 def get_subjects():
     try:
         subjects = db.session.query(
@@ -283,6 +391,7 @@ def create_subject():
         )
         
         db.session.add(subject)
+        catalog_changed('subjects')
         db.session.commit()
         
         return jsonify({'message': 'Subject created successfully', 'subject_id': subject.id}), 201
@@ -299,32 +408,19 @@ def delete_subject(subject_id):
         subject = Subject.query.get(subject_id)
         if not subject:
             return jsonify({'message': 'Subject not found'}), 404
-            
-        # Delete all associated data in correct order
-        chapters = Chapter.query.filter_by(subject_id=subject_id).all()
-        for chapter in chapters:
-            quizzes = Quiz.query.filter_by(chapter_id=chapter.id).all()
-            for quiz in quizzes:
-                # Delete user answers for all questions in this quiz
-                questions = Question.query.filter_by(quiz_id=quiz.id).all()
-                for question in questions:
-                    UserAnswer.query.filter_by(question_id=question.id).delete()
-                
-                # Delete all questions in this quiz
-                Question.query.filter_by(quiz_id=quiz.id).delete()
-                
-                # Delete all quiz attempts for this quiz
-                QuizAttempt.query.filter_by(quiz_id=quiz.id).delete()
-                
-                # Delete the quiz
-                db.session.delete(quiz)
-            
-            # Delete the chapter
-            db.session.delete(chapter)
         
-        # Finally delete the subject
-        db.session.delete(subject)
+        # Large deletes can run in the background in small batches
+        if request.args.get('background') == 'true':
+            # Hide it and its quizzes straight away
+            hidden_quiz_ids = deactivate_entity('subject', subject_id)
+            db.session.commit()
+            invalidate_quizzes(*hidden_quiz_ids)
+            job_id = background_deletions.submit('subject', subject_id, requested_by=int(get_jwt_identity()))
+            return jsonify({'message': 'Subject deletion started', 'job_id': job_id}), 202
+        
+        deleted_quiz_ids = delete_entity('subject', subject_id)
         db.session.commit()
+        invalidate_quizzes(*deleted_quiz_ids)
         
         return jsonify({'message': 'Subject deleted successfully'}), 200
         
@@ -333,9 +429,9 @@ def delete_subject(subject_id):
         print(f"Delete subject error: {str(e)}")
         return jsonify({'message': 'Failed to delete subject', 'error': str(e)}), 500
 
-# Chapter routes
 @app.route('/api/subjects/<int:subject_id>/chapters', methods=['GET'])
 @jwt_required()
+@catalog_cached('chapters', 'quizzes')
 def get_chapters(subject_id):
     try:
         chapters = db.session.query(
@@ -393,6 +489,7 @@ def create_chapter():
         )
         
         db.session.add(chapter)
+        catalog_changed('chapters')
         db.session.commit()
         
         return jsonify({'message': 'Chapter created successfully', 'chapter_id': chapter.id}), 201
@@ -409,27 +506,19 @@ def delete_chapter(chapter_id):
         chapter = Chapter.query.get(chapter_id)
         if not chapter:
             return jsonify({'message': 'Chapter not found'}), 404
-            
-        # Delete all associated data in correct order
-        quizzes = Quiz.query.filter_by(chapter_id=chapter_id).all()
-        for quiz in quizzes:
-            # Delete user answers for all questions in this quiz
-            questions = Question.query.filter_by(quiz_id=quiz.id).all()
-            for question in questions:
-                UserAnswer.query.filter_by(question_id=question.id).delete()
-            
-            # Delete all questions in this quiz
-            Question.query.filter_by(quiz_id=quiz.id).delete()
-            
-            # Delete all quiz attempts for this quiz
-            QuizAttempt.query.filter_by(quiz_id=quiz.id).delete()
-            
-            # Delete the quiz
-            db.session.delete(quiz)
         
-        # Finally delete the chapter
-        db.session.delete(chapter)
+        # Large deletes can run in the background in small batches
+        if request.args.get('background') == 'true':
+            # Hide it and its quizzes straight away
+            hidden_quiz_ids = deactivate_entity('chapter', chapter_id)
+            db.session.commit()
+            invalidate_quizzes(*hidden_quiz_ids)
+            job_id = background_deletions.submit('chapter', chapter_id, requested_by=int(get_jwt_identity()))
+            return jsonify({'message': 'Chapter deletion started', 'job_id': job_id}), 202
+        
+        deleted_quiz_ids = delete_entity('chapter', chapter_id)
         db.session.commit()
+        invalidate_quizzes(*deleted_quiz_ids)
         
         return jsonify({'message': 'Chapter deleted successfully'}), 200
         
@@ -438,9 +527,9 @@ def delete_chapter(chapter_id):
         print(f"Delete chapter error: {str(e)}")
         return jsonify({'message': 'Failed to delete chapter', 'error': str(e)}), 500
 
-# Quiz routes (updated)
 @app.route('/api/chapters/<int:chapter_id>/quizzes', methods=['GET'])
 @jwt_required()
+@catalog_cached('quizzes', 'questions')
 def get_chapter_quizzes(chapter_id):
     try:
         quizzes = db.session.query(
@@ -449,6 +538,8 @@ def get_chapter_quizzes(chapter_id):
             Quiz.description,
             Quiz.time_limit,
             Quiz.is_active,
+            Quiz.sample_size,
+            Quiz.sample_by_points,
             func.count(Question.id).label('question_count')
         ).outerjoin(Question).filter(
             and_(Quiz.chapter_id == chapter_id, Quiz.is_active == True)
@@ -462,7 +553,9 @@ def get_chapter_quizzes(chapter_id):
                 'description': quiz.description,
                 'time_limit': quiz.time_limit,
                 'is_active': quiz.is_active,
-                'question_count': quiz.question_count
+                'question_count': quiz.question_count,
+                'sample_size': quiz.sample_size,
+                'sample_by_points': bool(quiz.sample_by_points)
             })
         
         return jsonify(quiz_list), 200
@@ -528,18 +621,31 @@ def get_profile():
 # Quiz routes
 @app.route('/api/quizzes', methods=['GET'])
 @jwt_required()
+@catalog_cached('quizzes', 'questions')
 def get_quizzes():
     try:
-        quizzes = db.session.query(
+        query = db.session.query(
             Quiz.id,
             Quiz.title,
             Quiz.description,
             Quiz.time_limit,
             Quiz.is_active,
+            Quiz.created_at,
+            Quiz.sample_size,
+            Quiz.sample_by_points,
             func.count(Question.id).label('question_count')
         ).outerjoin(Question).filter(
             Quiz.is_active == True
-        ).group_by(Quiz.id).order_by(desc(Quiz.created_at)).all()
+        )
+        
+        # Optional search and filters
+        pattern = search_pattern(request.args)
+        if pattern:
+            query = query.filter(Quiz.title.ilike(pattern, escape='\\'))
+        if request.args.get('chapter_id'):
+            query = query.filter(Quiz.chapter_id == request.args.get('chapter_id', type=int))
+        
+        quizzes, next_cursor = keyset_page(query.group_by(Quiz.id), Quiz.created_at, Quiz.id, request.args)
         
         quiz_list = []
         for quiz in quizzes:
@@ -549,11 +655,15 @@ def get_quizzes():
                 'description': quiz.description,
                 'time_limit': quiz.time_limit,
                 'is_active': quiz.is_active,
-                'question_count': quiz.question_count
+                'question_count': quiz.question_count,
+                'sample_size': quiz.sample_size,
+                'sample_by_points': bool(quiz.sample_by_points)
             })
         
-        return jsonify(quiz_list), 200
+        return jsonify(page_response(quiz_list, next_cursor, request.args)), 200
         
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"Get quizzes error: {str(e)}")
         return jsonify({'message': 'Failed to get quizzes', 'error': str(e)}), 422
@@ -588,7 +698,13 @@ def create_quiz():
             created_by=current_user_id
         )
         
+        # Optional question bank sampling
+        error = sample_settings(data, quiz)
+        if error:
+            return jsonify({'message': error}), 400
+        
         db.session.add(quiz)
+        catalog_changed('quizzes')
         db.session.commit()
         
         return jsonify({'message': 'Quiz created successfully', 'quiz_id': quiz.id}), 201
@@ -619,8 +735,13 @@ def update_quiz(quiz_id):
             quiz.time_limit = data['time_limit']
         if 'is_active' in data:
             quiz.is_active = data['is_active']
+        error = sample_settings(data, quiz)
+        if error:
+            return jsonify({'message': error}), 400
         
+        catalog_changed('quizzes')
         db.session.commit()
+        invalidate_quizzes(quiz_id)
         
         return jsonify({'message': 'Quiz updated successfully'}), 200
         
@@ -629,8 +750,10 @@ def update_quiz(quiz_id):
         print(f"Update quiz error: {str(e)}")
         return jsonify({'message': 'Failed to update quiz', 'error': str(e)}), 500
 
+# The whole pool in its own order, for editing: students get their attempt's questions from start_quiz
 @app.route('/api/quizzes/<int:quiz_id>/questions', methods=['GET'])
-@jwt_required()
+@admin_required
+@catalog_cached('questions')
 def get_quiz_questions(quiz_id):
     try:
         questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id).all()
@@ -687,7 +810,9 @@ def add_question(quiz_id):
         )
         
         db.session.add(question)
+        catalog_changed('questions')
         db.session.commit()
+        invalidate_quizzes(quiz_id)
         
         return jsonify({'message': 'Question added successfully'}), 201
         
@@ -726,7 +851,9 @@ def update_question(question_id):
         if 'points' in data:
             question.points = data['points']
         
+        catalog_changed('questions')
         db.session.commit()
+        invalidate_quizzes(question.quiz_id)
         
         return jsonify({'message': 'Question updated successfully'}), 200
         
@@ -743,11 +870,15 @@ def delete_question(question_id):
         if not question:
             return jsonify({'message': 'Question not found'}), 404
             
+        quiz_id = question.quiz_id
+        
         # Delete associated user answers first
         UserAnswer.query.filter_by(question_id=question_id).delete()
         
         db.session.delete(question)
+        catalog_changed('questions')
         db.session.commit()
+        invalidate_quizzes(quiz_id)
         
         return jsonify({'message': 'Question deleted successfully'}), 200
         
@@ -760,27 +891,22 @@ def delete_question(question_id):
 @admin_required
 def delete_quiz(quiz_id):
     try:
-        current_user_id = int(get_jwt_identity())
-        
         quiz = Quiz.query.get(quiz_id)
         if not quiz:
             return jsonify({'message': 'Quiz not found'}), 404
-            
-        # Delete all associated data in the correct order
-        # 1. Delete user answers for all questions in this quiz
-        questions = Question.query.filter_by(quiz_id=quiz_id).all()
-        for question in questions:
-            UserAnswer.query.filter_by(question_id=question.id).delete()
-        
-        # 2. Delete all questions in this quiz
-        Question.query.filter_by(quiz_id=quiz_id).delete()
         
-        # 3. Delete all quiz attempts for this quiz
-        QuizAttempt.query.filter_by(quiz_id=quiz_id).delete()
+        # Large deletes can run in the background in small batches
+        if request.args.get('background') == 'true':
+            # Hide it from the catalog straight away
+            hidden_quiz_ids = deactivate_entity('quiz', quiz_id)
+            db.session.commit()
+            invalidate_quizzes(*hidden_quiz_ids)
+            job_id = background_deletions.submit('quiz', quiz_id, requested_by=int(get_jwt_identity()))
+            return jsonify({'message': 'Quiz deletion started', 'job_id': job_id}), 202
         
-        # 4. Finally delete the quiz itself
-        db.session.delete(quiz)
+        deleted_quiz_ids = delete_entity('quiz', quiz_id)
         db.session.commit()
+        invalidate_quizzes(*deleted_quiz_ids)
         
         return jsonify({'message': 'Quiz deleted successfully'}), 200
         
@@ -802,29 +928,20 @@ def delete_user(user_id):
         user = User.query.get(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
-            
-        # Delete user's quiz attempts and answers
-        user_attempts = QuizAttempt.query.filter_by(user_id=user_id).all()
-        for attempt in user_attempts:
-            UserAnswer.query.filter_by(attempt_id=attempt.id).delete()
-            db.session.delete(attempt)
-        
-        # Delete user's created quizzes and their questions
-        user_quizzes = Quiz.query.filter_by(created_by=user_id).all()
-        for quiz in user_quizzes:
-            # Delete questions and their answers
-            questions = Question.query.filter_by(quiz_id=quiz.id).all()
-            for question in questions:
-                UserAnswer.query.filter_by(question_id=question.id).delete()
-                db.session.delete(question)
-            
-            # Delete quiz attempts
-            QuizAttempt.query.filter_by(quiz_id=quiz.id).delete()
-            db.session.delete(quiz)
         
-        # Finally delete the user
-        db.session.delete(user)
+        # Large deletes can run in the background in small batches
+        if request.args.get('background') == 'true':
+            # Hide the quizzes they created, which go with them
+            hidden_quiz_ids = deactivate_entity('user', user_id)
+            db.session.commit()
+            invalidate_quizzes(*hidden_quiz_ids)
+            job_id = background_deletions.submit('user', user_id, requested_by=current_user_id)
+            return jsonify({'message': 'User deletion started', 'job_id': job_id}), 202
+        
+        deleted_quiz_ids = delete_entity('user', user_id)
         db.session.commit()
+        invalidate_quizzes(*deleted_quiz_ids)
+        invalidate_user_roles(user_id)
         
         return jsonify({'message': 'User deleted successfully'}), 200
         
@@ -833,6 +950,18 @@ def delete_user(user_id):
         print(f"Delete user error: {str(e)}")
         return jsonify({'message': 'Failed to delete user', 'error': str(e)}), 500
 
+@app.route('/api/admin/deletions/<job_id>', methods=['GET'])
+@admin_required
+def get_deletion_status(job_id):
+    try:
+        job = background_deletions.status(job_id)
+        if not job:
+            return jsonify({'message': 'Deletion job not found'}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        print(f"Get deletion status error: {str(e)}")
+        return jsonify({'message': 'Failed to get deletion status', 'error': str(e)}), 500
+
 @app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @admin_required
 def update_user(user_id):
@@ -864,8 +993,18 @@ def update_user(user_id):
                 return jsonify({'message': 'Email already exists'}), 400
             user.email = data['email']
         
+        role_changed = 'role' in data and data['role'] != user.role
+        if role_changed:
+            if data['role'] not in ['user', 'admin']:
+                return jsonify({'message': 'Invalid role. Must be user or admin'}), 400
+            user.role = data['role']
+        
         db.session.commit()
         
+        # Tokens issued before the change must not keep the old role
+        if role_changed:
+            invalidate_user_roles(user_id)
+        
         return jsonify({'message': 'User updated successfully'}), 200
         
     except Exception as e:
@@ -927,31 +1066,31 @@ def start_quiz(quiz_id):
     try:
         current_user_id = int(get_jwt_identity())
         
-        # Get quiz details
-        quiz = Quiz.query.filter_by(id=quiz_id, is_active=True).first()
+        # Quiz details and questions, serialized once per quiz
+        payload = get_payload(quiz_id)
         
-        if not quiz:
+        if not payload:
             return jsonify({'message': 'Quiz not found or inactive'}), 404
         
-        # Count questions
-        question_count = Question.query.filter_by(quiz_id=quiz_id).count()
-        
-        # Create quiz attempt
+        # Create quiz attempt, with its own sample of the quiz's questions if it has one
+        seed = new_seed() if app.config['SHUFFLE_QUESTIONS'] else None
+        positions = draw_questions(payload)
         attempt = QuizAttempt(
             user_id=current_user_id,
             quiz_id=quiz_id,
-            total_questions=question_count
+            total_questions=len(payload.question_ids) if positions is None else len(positions),
+            shuffle_seed=seed,
+            question_ids=None if positions is None else encode_ids(payload.question_ids[i] for i in positions)
         )
         
         db.session.add(attempt)
+        db.session.flush()
+        # Read before commit expires it, which would reload the row
+        attempt_id = attempt.id
         db.session.commit()
         
-        return jsonify({
-            'attempt_id': attempt.id,
-            'quiz_title': quiz.title,
-            'time_limit': quiz.time_limit,
-            'total_questions': question_count
-        }), 200
+        body = start_response(payload, attempt_id, seed, positions)
+        return app.response_class(body, mimetype='application/json'), 200
         
     except Exception as e:
         db.session.rollback()
@@ -976,35 +1115,33 @@ def submit_quiz(attempt_id):
         if not attempt:
             return jsonify({'message': 'Attempt not found or unauthorized'}), 404
         
-        # Get all questions for this quiz
-        questions = Question.query.filter_by(quiz_id=attempt.quiz_id).all()
+        # Completed attempts are already counted in the report rollups
+        if attempt.completed_at is not None:
+            return jsonify({'message': 'Attempt already submitted'}), 400
         
-        score = 0
-        total_points = 0
+        # Attempts of quizzes being deleted in the background can't be submitted
+        # (only inactive quizzes, which have no start payload, need the check)
+        if get_payload(attempt.quiz_id) is None and background_deletions.pending(attempt.quiz_id):
+            return jsonify({'message': 'Quiz is being deleted'}), 400
         
-        for question in questions:
-            selected_answer = answers.get(str(question.id))
-            is_correct = selected_answer == question.correct_answer
-            
-            if is_correct:
-                score += question.points
-            
-            total_points += question.points
-            
-            # Save user answer
-            user_answer = UserAnswer(
-                attempt_id=attempt_id,
-                question_id=question.id,
-                selected_answer=selected_answer,
-                is_correct=is_correct
-            )
-            db.session.add(user_answer)
+        # Shuffled attempts answer with the letters they were shown
+        if attempt.shuffle_seed is not None:
+            answers = to_original_answers(attempt.shuffle_seed, answers)
+        
+        # Grade against the quiz's answer key (on the attempt's sample, if any) and write all answers at once
+        answer_key = get_answer_key(attempt.quiz_id)
+        question_ids = decode_ids(attempt.question_ids) if attempt.question_ids else None
+        score, total_points, answer_rows = grade_answers(answer_key, answers, attempt_id, question_ids)
+        save_answers(answer_rows)
         
         # Update quiz attempt
         attempt.score = score
         attempt.time_taken = time_taken
         attempt.completed_at = datetime.utcnow()
         
+        # Update the report rollups in the same transaction
+        record_attempt(attempt)
+        
         db.session.commit()
         
         return jsonify({
@@ -1023,7 +1160,22 @@ def submit_quiz(attempt_id):
 @admin_required
 def get_users():
     try:
-        users = User.query.order_by(desc(User.created_at)).all()
+        query = User.query
+        
+        # Optional search and filters
+        pattern = search_pattern(request.args)
+        if pattern:
+            query = query.filter(or_(
+                User.username.ilike(pattern, escape='\\'),
+                User.email.ilike(pattern, escape='\\')
+            ))
+        if request.args.get('role'):
+            query = query.filter(User.role == request.args['role'])
+        since = date_range_start(request.args)
+        if since:
+            query = query.filter(User.created_at >= since)
+        
+        users, next_cursor = keyset_page(query, User.created_at, User.id, request.args)
         
         user_list = []
         for user in users:
@@ -1035,8 +1187,10 @@ def get_users():
                 'created_at': user.created_at.isoformat()
             })
         
-        return jsonify(user_list), 200
+        return jsonify(page_response(user_list, next_cursor, request.args)), 200
         
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"Get users error: {str(e)}")
         return jsonify({'message': 'Failed to get users', 'error': str(e)}), 422
@@ -1045,129 +1199,9 @@ def get_users():
 @admin_required
 def get_reports():
     try:
-        # Get all completed quiz attempts with explicit joins
-        completed_attempts = db.session.query(
-            QuizAttempt.id,
-            QuizAttempt.user_id,
-            QuizAttempt.quiz_id,
-            QuizAttempt.score,
-            QuizAttempt.total_questions,
-            QuizAttempt.completed_at,
-            Quiz.title.label('quiz_title'),
-            User.username
-        ).select_from(QuizAttempt).join(
-            Quiz, QuizAttempt.quiz_id == Quiz.id
-        ).join(
-            User, QuizAttempt.user_id == User.id
-        ).filter(
-            QuizAttempt.completed_at.isnot(None)
-        ).all()
-        
-        # Process quiz statistics
-        quiz_stats_dict = {}
-        user_stats_dict = {}
-        daily_stats = {}
-        score_counts = {'excellent': 0, 'good': 0, 'fair': 0, 'poor': 0}
-        
-        for attempt in completed_attempts:
-            # Calculate percentage safely
-            if attempt.total_questions > 0:
-                percentage = (attempt.score / attempt.total_questions) * 100
-            else:
-                percentage = 0
-            
-            # Quiz statistics
-            quiz_title = attempt.quiz_title
-            if quiz_title not in quiz_stats_dict:
-                quiz_stats_dict[quiz_title] = {
-                    'quiz_title': quiz_title,
-                    'attempts': 0,
-                    'total_percentage': 0,
-                    'max_score': 0,
-                    'min_score': 100
-                }
-            
-            quiz_stats_dict[quiz_title]['attempts'] += 1
-            quiz_stats_dict[quiz_title]['total_percentage'] += percentage
-            quiz_stats_dict[quiz_title]['max_score'] = max(quiz_stats_dict[quiz_title]['max_score'], percentage)
-            quiz_stats_dict[quiz_title]['min_score'] = min(quiz_stats_dict[quiz_title]['min_score'], percentage)
-            
-            # User statistics
-            username = attempt.username
-            if username not in user_stats_dict:
-                user_stats_dict[username] = {
-                    'username': username,
-                    'attempts': 0,
-                    'total_percentage': 0,
-                    'best_score': 0
-                }
-            
-            user_stats_dict[username]['attempts'] += 1
-            user_stats_dict[username]['total_percentage'] += percentage
-            user_stats_dict[username]['best_score'] = max(user_stats_dict[username]['best_score'], percentage)
-            
-            # Daily activity (last 7 days)
-            if attempt.completed_at >= datetime.utcnow() - timedelta(days=7):
-                date_str = attempt.completed_at.date().isoformat()
-                if date_str not in daily_stats:
-                    daily_stats[date_str] = {'total_percentage': 0, 'count': 0}
-                daily_stats[date_str]['total_percentage'] += percentage
-                daily_stats[date_str]['count'] += 1
-            
-            # Score distribution
-            if percentage >= 80:
-                score_counts['excellent'] += 1
-            elif percentage >= 60:
-                score_counts['good'] += 1
-            elif percentage >= 40:
-                score_counts['fair'] += 1
-            else:
-                score_counts['poor'] += 1
-        
-        # Calculate averages for quiz stats
-        quiz_statistics = []
-        for stats in quiz_stats_dict.values():
-            avg_score = stats['total_percentage'] / stats['attempts'] if stats['attempts'] > 0 else 0
-            min_score = stats['min_score'] if stats['attempts'] > 0 else 0
-            quiz_statistics.append({
-                'quiz_title': stats['quiz_title'],
-                'attempts': stats['attempts'],
-                'avg_score': round(avg_score, 2),
-                'max_score': round(stats['max_score'], 2),
-                'min_score': round(min_score, 2)
-            })
-        
-        # Calculate averages for user stats
-        user_performance = []
-        for stats in user_stats_dict.values():
-            avg_score = stats['total_percentage'] / stats['attempts'] if stats['attempts'] > 0 else 0
-            user_performance.append({
-                'username': stats['username'],
-                'attempts': stats['attempts'],
-                'avg_score': round(avg_score, 2),
-                'best_score': round(stats['best_score'], 2)
-            })
-        
-        # Calculate daily averages
-        user_activity = []
-        for date_str, stats in daily_stats.items():
-            avg_percentage = stats['total_percentage'] / stats['count'] if stats['count'] > 0 else 0
-            user_activity.append({
-                'date': date_str,
-                'avg_percentage': round(avg_percentage, 2)
-            })
-        
-        # Sort results
-        quiz_statistics.sort(key=lambda x: x['attempts'], reverse=True)
-        user_performance.sort(key=lambda x: x['avg_score'], reverse=True)
-        user_activity.sort(key=lambda x: x['date'])
-        
-        return jsonify({
-            'quiz_statistics': quiz_statistics,
-            'user_performance': user_performance,
-            'user_activity': user_activity,
-            'score_distribution': score_counts
-        }), 200
+        # Rollup tables by default; 'sql' aggregates quiz_attempts directly
+        engine = request.args.get('engine', app.config['REPORTS_ENGINE'])
+        return jsonify(build_report(engine)), 200
         
     except Exception as e:
         import traceback
@@ -1175,13 +1209,29 @@ def get_reports():
         print(f"Get reports error: {str(e)}")
         return jsonify({'message': 'Failed to get reports', 'error': str(e)}), 422
 
+@app.route('/api/admin/cache-stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    try:
+        return jsonify({
+            'answer_keys': answer_key_cache.stats(),
+            'quiz_payloads': payload_cache.stats(),
+            'user_roles': user_role_cache.stats(),
+            'activity_stats': stats_cache.stats(),
+            'catalog': catalog_cache.stats()
+        }), 200
+        
+    except Exception as e:
+        print(f"Get cache stats error: {str(e)}")
+        return jsonify({'message': 'Failed to get cache stats', 'error': str(e)}), 500
+
 @app.route('/api/user/attempts', methods=['GET'])
 @jwt_required()
 def get_user_attempts():
     try:
         current_user_id = int(get_jwt_identity())
         
-        attempts = db.session.query(
+        query = db.session.query(
             QuizAttempt.id,
             Quiz.title,
             QuizAttempt.score,
@@ -1198,7 +1248,19 @@ def get_user_attempts():
                 QuizAttempt.user_id == current_user_id,
                 QuizAttempt.completed_at.isnot(None)
             )
-        ).order_by(desc(QuizAttempt.completed_at)).all()
+        )
+        
+        # Optional search and filters
+        pattern = search_pattern(request.args)
+        if pattern:
+            query = query.filter(Quiz.title.ilike(pattern, escape='\\'))
+        if request.args.get('quiz_id'):
+            query = query.filter(QuizAttempt.quiz_id == request.args.get('quiz_id', type=int))
+        since = date_range_start(request.args)
+        if since:
+            query = query.filter(QuizAttempt.completed_at >= since)
+        
+        attempts, next_cursor = keyset_page(query, QuizAttempt.completed_at, QuizAttempt.id, request.args)
         
         attempt_list = []
         for attempt in attempts:
@@ -1213,8 +1275,10 @@ def get_user_attempts():
                 'percentage': round(attempt.percentage, 2) if attempt.percentage else 0
             })
         
-        return jsonify(attempt_list), 200
+        return jsonify(page_response(attempt_list, next_cursor, request.args)), 200
         
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"Get user attempts error: {str(e)}")
         return jsonify({'message': 'Failed to get user attempts', 'error': str(e)}), 422
@@ -1225,47 +1289,39 @@ def get_quiz_attempts(quiz_id):
     try:
         # Check if user is admin or if it's their own quiz attempts
         current_user_id = int(get_jwt_identity())
-        current_user = User.query.get(current_user_id)
-        
-        if current_user.role == 'admin':
-            # Admin can see all attempts for any quiz
-            attempts = db.session.query(
-                QuizAttempt.id,
-                QuizAttempt.score,
-                QuizAttempt.total_questions,
-                QuizAttempt.time_taken,
-                QuizAttempt.completed_at,
-                User.username,
-                func.coalesce(
-                    (func.cast(QuizAttempt.score, db.Float) / 
-                     func.nullif(QuizAttempt.total_questions, 0) * 100), 0
-                ).label('percentage')
-            ).join(User).filter(
-                and_(
-                    QuizAttempt.quiz_id == quiz_id,
-                    QuizAttempt.completed_at.isnot(None)
-                )
-            ).order_by(desc(QuizAttempt.completed_at)).all()
-        else:
-            # Regular users can only see their own attempts
-            attempts = db.session.query(
-                QuizAttempt.id,
-                QuizAttempt.score,
-                QuizAttempt.total_questions,
-                QuizAttempt.time_taken,
-                QuizAttempt.completed_at,
-                User.username,
-                func.coalesce(
-                    (func.cast(QuizAttempt.score, db.Float) / 
-                     func.nullif(QuizAttempt.total_questions, 0) * 100), 0
-                ).label('percentage')
-            ).join(User).filter(
-                and_(
-                    QuizAttempt.quiz_id == quiz_id,
-                    QuizAttempt.user_id == current_user_id,
-                    QuizAttempt.completed_at.isnot(None)
-                )
-            ).order_by(desc(QuizAttempt.completed_at)).all()
+        current_role = token_role(current_user_id)
+        
+        query = db.session.query(
+            QuizAttempt.id,
+            QuizAttempt.score,
+            QuizAttempt.total_questions,
+            QuizAttempt.time_taken,
+            QuizAttempt.completed_at,
+            User.username,
+            func.coalesce(
+                (func.cast(QuizAttempt.score, db.Float) / 
+                 func.nullif(QuizAttempt.total_questions, 0) * 100), 0
+            ).label('percentage')
+        ).join(User).filter(
+            and_(
+                QuizAttempt.quiz_id == quiz_id,
+                QuizAttempt.completed_at.isnot(None)
+            )
+        )
+        
+        # Admin can see all attempts for any quiz, regular users only their own
+        if current_role != 'admin':
+            query = query.filter(QuizAttempt.user_id == current_user_id)
+        
+        # Optional search and filters
+        pattern = search_pattern(request.args)
+        if pattern:
+            query = query.filter(User.username.ilike(pattern, escape='\\'))
+        since = date_range_start(request.args)
+        if since:
+            query = query.filter(QuizAttempt.completed_at >= since)
+        
+        attempts, next_cursor = keyset_page(query, QuizAttempt.completed_at, QuizAttempt.id, request.args)
         
         attempt_list = []
         for attempt in attempts:
@@ -1279,57 +1335,102 @@ def get_quiz_attempts(quiz_id):
                 'percentage': round(attempt.percentage, 2) if attempt.percentage else 0
             })
         
-        return jsonify(attempt_list), 200
+        return jsonify(page_response(attempt_list, next_cursor, request.args)), 200
         
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"Get quiz attempts error: {str(e)}")
         return jsonify({'message': 'Failed to get quiz attempts', 'error': str(e)}), 422
 
 # Job management routes (Admin only)
+def job_scheduler():
+    """The job scheduler, created on first use and sharing the app's engine"""
+    from jobs import get_job_scheduler
+    return get_job_scheduler(db.engine)
+
+def jobs_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not app.config['JOBS_ENABLED']:
+            return jsonify({'message': 'Jobs are disabled on this server'}), 503
+        return f(*args, **kwargs)
+    return decorated_function
+
+def queue_job(job, label):
+    """Queue a job run and return its id right away; the job worker runs it"""
+    scheduler = job_scheduler()
+    run, created = scheduler.runs.request(job, requested_by=int(get_jwt_identity()))
+    
+    # Without a job worker (e.g. a single development server) run it on a thread here
+    if created and not scheduler.runs.worker_running():
+        scheduler.runs.run_in_background(scheduler, run['job_id'], job)
+    
+    return jsonify({
+        'message': f'{label} job queued' if created else f'{label} job is already queued or running',
+        'job_id': run['job_id'],
+        'status': run['status']
+    }), 202
+
 @app.route('/api/admin/jobs/test-reminders', methods=['POST'])
 @admin_required
+@jobs_required
 def test_reminders():
     try:
-        count = test_user_reminders()
-        return jsonify({
-            'message': f'Successfully sent {count} reminder emails',
-            'count': count
-        }), 200
+        return queue_job('daily_user_reminders', 'User reminders')
     except Exception as e:
         print(f"Test reminders error: {str(e)}")
         return jsonify({'message': 'Failed to send reminders', 'error': str(e)}), 500
 
 @app.route('/api/admin/jobs/test-admin-report', methods=['POST'])
 @admin_required
+@jobs_required
 def test_admin_report():
     try:
-        count = test_admin_report()
-        return jsonify({
-            'message': f'Successfully sent {count} admin report emails',
-            'count': count
-        }), 200
+        return queue_job('daily_admin_report', 'Admin report')
     except Exception as e:
         print(f"Test admin report error: {str(e)}")
         return jsonify({'message': 'Failed to send admin report', 'error': str(e)}), 500
 
 @app.route('/api/admin/jobs/test-cleanup', methods=['POST'])
 @admin_required
+@jobs_required
 def test_cleanup():
     try:
-        success = test_weekly_cleanup()
-        return jsonify({
-            'message': 'Weekly cleanup completed successfully' if success else 'Weekly cleanup failed',
-            'success': success
-        }), 200
+        return queue_job('weekly_cleanup', 'Weekly cleanup')
     except Exception as e:
         print(f"Test cleanup error: {str(e)}")
         return jsonify({'message': 'Failed to run cleanup', 'error': str(e)}), 500
 
+@app.route('/api/admin/jobs/runs', methods=['GET'])
+@admin_required
+@jobs_required
+def get_job_runs():
+    try:
+        return jsonify({'runs': job_scheduler().runs.recent()}), 200
+    except Exception as e:
+        print(f"Get job runs error: {str(e)}")
+        return jsonify({'message': 'Failed to get job runs', 'error': str(e)}), 500
+
+@app.route('/api/admin/jobs/runs/<job_id>', methods=['GET'])
+@admin_required
+@jobs_required
+def get_job_run(job_id):
+    try:
+        run = job_scheduler().runs.get(job_id)
+        if not run:
+            return jsonify({'message': 'Job run not found'}), 404
+        return jsonify(run), 200
+    except Exception as e:
+        print(f"Get job run error: {str(e)}")
+        return jsonify({'message': 'Failed to get job run', 'error': str(e)}), 500
+
 @app.route('/api/admin/jobs/inactive-users', methods=['GET'])
 @admin_required
+@jobs_required
 def get_inactive_users():
     try:
-        users = test_get_inactive_users()
+        users = job_scheduler().get_inactive_users(days=7)
         return jsonify({
             'message': f'Found {len(users)} inactive users',
             'users': users
@@ -1340,29 +1441,59 @@ def get_inactive_users():
 
 @app.route('/api/admin/jobs/daily-stats', methods=['GET'])
 @admin_required
+@jobs_required
 def get_daily_stats():
     try:
-        stats = test_get_daily_stats()
+        # Today vs yesterday by default; days=N, period=week or start/end pick another window
+        if any(request.args.get(name) for name in ('days', 'period', 'start', 'end')):
+            stats = job_scheduler().get_stats(*parse_window(request.args))
+        else:
+            stats = job_scheduler().get_daily_stats()
         return jsonify({
             'message': 'Daily statistics retrieved successfully',
             'stats': stats
         }), 200
+    except StatsWindowError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         print(f"Get daily stats error: {str(e)}")
         return jsonify({'message': 'Failed to get daily stats', 'error': str(e)}), 500
 
+@app.route('/api/admin/jobs/outbox', methods=['GET'])
+@admin_required
+@jobs_required
+def get_outbox_stats():
+    try:
+        return jsonify({
+            'message': 'Email outbox statistics retrieved successfully',
+            'outbox': job_scheduler().outbox.stats()
+        }), 200
+    except Exception as e:
+        print(f"Get outbox stats error: {str(e)}")
+        return jsonify({'message': 'Failed to get outbox stats', 'error': str(e)}), 500
+
 if __name__ == '__main__':
     print("Initializing database...")
     init_db()
     print("Database initialized successfully!")
     
-    # Start the job scheduler
-    print("Starting job scheduler...")
-    job_scheduler.start()
+    # Scheduled jobs run in a separate worker (python worker.py); running them
+    # in this process is only meant for a single development server
+    run_scheduler = app.config['JOBS_ENABLED'] and os.getenv('SCHEDULER_IN_APP', 'false').lower() == 'true'
+    if run_scheduler:
+        from job_logging import configure_logging
+        print("Starting job scheduler...")
+        configure_logging()
+        with app.app_context():
+            scheduler = job_scheduler()
+        scheduler.start()
+    else:
+        print("Job scheduler not started; run python worker.py for scheduled jobs")
     
     try:
         print("Starting Flask server on http://localhost:5000")
         app.run(debug=True, host='0.0.0.0', port=5000)
     finally:
         # Stop the job scheduler when the app shuts down
-        job_scheduler.stop()
\ No newline at end of file
+        if run_scheduler:
+            scheduler.stop()
\ No newline at end of file
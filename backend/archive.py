@@ -0,0 +1,348 @@
+"""
+Cold storage for old quiz attempts
+
+The weekly cleanup moves completed attempts older than ARCHIVE_RETENTION_DAYS
+(default 365) out of quiz_attempts and user_answers into a separate archive
+database, ARCHIVE_DATABASE_URL (by default instance/quiz_archive.db). Each
+attempt becomes a single row there with its answers packed column-wise
+(question ids, selected answers, correctness) into one zlib-compressed
+blob, instead of one indexed user_answers row per question.
+
+The report rollups are not touched: they already count the archived
+attempts. Rebuilding or refreshing rollup rows (reports.py) adds the
+archived attempts' share from here, so this database is the record of what
+archived attempts contribute.
+
+Attempts move in batches of ARCHIVE_BATCH_SIZE, oldest first:
+
+1. the batch is written to the archive as pending (archived_at is NULL),
+   replacing copies left there by an interrupted run;
+2. the attempts and their answers are deleted from the main database;
+3. the batch is marked archived.
+
+Only archived rows count towards the rollups, so a batch is never counted
+twice. A run that dies between the steps is settled by the next one: pending
+rows whose attempt is gone are marked archived, the others are dropped and
+moved again.
+
+quiz_attempts ids are AUTOINCREMENT, so SQLite never hands out the id of
+an archived attempt again. Databases created before that give a new row
+max(id) + 1, so the newest attempt is never archived, and an attempt whose
+id is already taken in the archive (an older attempt with the same id was
+archived, then newer ones were deleted) is left where it is rather than
+overwriting the archived one.
+
+Attempts that were started but never submitted before the retention window
+are deleted: they have no answers and aren't counted in the rollups.
+
+Archived attempts of deleted users and quizzes are normally removed right
+after the delete commits (cascade.py); the weekly run removes any that are
+left because that failed. Their rollup share was already taken out.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, MetaData, Table, delete, func, select, update
+from sqlalchemy.engine import make_url
+
+from database import INSTANCE_DIR, create_db_engine
+from models import Quiz, QuizAttempt, User, UserAnswer
+from reports import ID_CHUNK_SIZE, percentage_expr, score_bucket_expr
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_URL = f"sqlite:///{os.path.join(INSTANCE_DIR, 'quiz_archive.db')}"
+
+NO_SYNC = {'synchronize_session': False}
+
+archive_metadata = MetaData()
+
+archived_attempts = Table(
+    'archived_attempts', archive_metadata,
+    Column('id', Integer, primary_key=True),  # id the attempt had in quiz_attempts
+    Column('user_id', Integer, nullable=False),
+    Column('quiz_id', Integer, nullable=False),
+    Column('score', Integer),
+    Column('total_questions', Integer),
+    Column('time_taken', Integer),
+    Column('started_at', DateTime),
+    Column('completed_at', DateTime),
+    Column('answers', LargeBinary),  # see pack_answers()
+    Column('archived_at', DateTime),  # NULL while the move is in progress
+    Index('ix_archived_attempts_user', 'user_id'),
+    Index('ix_archived_attempts_quiz', 'quiz_id'),
+)
+
+# Only the few pending rows are indexed
+_pending = archived_attempts.c.archived_at.is_(None)
+Index('ix_archived_attempts_pending', archived_attempts.c.id, sqlite_where=_pending, postgresql_where=_pending)
+
+
+def pack_answers(answers):
+    """[(question_id, selected_answer, is_correct), ...] -> compressed [[question_ids], [selected], [correct]]"""
+    columns = [
+        [question_id for question_id, _, _ in answers],
+        [selected for _, selected, _ in answers],
+        [1 if correct else 0 for _, _, correct in answers]
+    ]
+    return zlib.compress(json.dumps(columns, separators=(',', ':')).encode(), 9)
+
+
+def unpack_answers(blob):
+    """Inverse of pack_answers()"""
+    question_ids, selected, correct = json.loads(zlib.decompress(blob))
+    return [
+        {'question_id': question_id, 'selected_answer': answer, 'is_correct': bool(is_correct)}
+        for question_id, answer, is_correct in zip(question_ids, selected, correct)
+    ]
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[i:i + ID_CHUNK_SIZE]
+
+
+class AttemptArchive:
+    def __init__(self, url=None):
+        self.url = url or os.getenv('ARCHIVE_DATABASE_URL', DEFAULT_ARCHIVE_URL)
+        self.retention_days = int(os.getenv('ARCHIVE_RETENTION_DAYS', '365'))
+        # Also bounds the IN (...) lists, so keep it below SQLite's parameter limit
+        self.batch_size = min(int(os.getenv('ARCHIVE_BATCH_SIZE', '500')), ID_CHUNK_SIZE)
+        self._engine = None
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        # Created on first use, so processes that never archive don't open it
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_db_engine(self.url)
+                archive_metadata.create_all(self._engine)
+            return self._engine
+
+    def exists(self):
+        """False until something has been archived into a (SQLite) archive file"""
+        url = make_url(self.url)
+        if self._engine is not None or url.get_backend_name() != 'sqlite' or not url.database:
+            return True
+        return os.path.exists(url.database)
+
+    def rollup_rows(self, by, *criteria):
+        """
+        (key, attempts, total_percentage, max, min) of the archived attempts
+        matching `criteria`, grouped by 'quiz', 'user', 'day' or 'bucket'
+        """
+        if not self.exists():
+            return []
+        pct = percentage_expr(archived_attempts.c.score, archived_attempts.c.total_questions)
+        key = {
+            'quiz': archived_attempts.c.quiz_id,
+            'user': archived_attempts.c.user_id,
+            'day': func.date(archived_attempts.c.completed_at),
+            'bucket': score_bucket_expr(pct)
+        }[by]
+        query = select(
+            key, func.count(archived_attempts.c.id), func.sum(pct), func.max(pct), func.min(pct)
+        ).where(
+            archived_attempts.c.archived_at.isnot(None), *criteria
+        ).group_by(key)
+
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(query)]
+
+    def delete(self, *criteria):
+        """Delete the archived attempts matching `criteria`"""
+        if self.exists():
+            with self.engine.begin() as conn:
+                conn.execute(delete(archived_attempts).where(*criteria))
+
+    def get(self, attempt_id):
+        """An archived attempt with its answers, or None"""
+        if not self.exists():
+            return None
+        with self.engine.connect() as conn:
+            row = conn.execute(select(archived_attempts).where(archived_attempts.c.id == attempt_id)).first()
+        if row is None:
+            return None
+        attempt = dict(row._mapping)
+        attempt['answers'] = unpack_answers(attempt['answers'])
+        return attempt
+
+    def _settle(self, session):
+        """Finish the batches an interrupted run left pending"""
+        with self.engine.connect() as conn:
+            pending = [attempt_id for (attempt_id,) in conn.execute(
+                select(archived_attempts.c.id).where(archived_attempts.c.archived_at.is_(None))
+            )]
+
+        for chunk in _chunks(pending):
+            still_hot = [attempt_id for (attempt_id,) in session.query(QuizAttempt.id).filter(QuizAttempt.id.in_(chunk))]
+            with self.engine.begin() as conn:
+                conn.execute(delete(archived_attempts).where(archived_attempts.c.id.in_(still_hot)))
+                conn.execute(
+                    update(archived_attempts)
+                    .where(archived_attempts.c.id.in_(chunk), archived_attempts.c.archived_at.is_(None))
+                    .values(archived_at=datetime.utcnow())
+                )
+        if pending:
+            logger.info("Settled %d attempts left pending by an interrupted archive run", len(pending))
+
+    def _drop_orphans(self, session):
+        """Delete archived attempts whose user or quiz no longer exists; returns how many"""
+        with self.engine.connect() as conn:
+            quiz_ids = [quiz_id for (quiz_id,) in conn.execute(select(archived_attempts.c.quiz_id).distinct())]
+            user_ids = [user_id for (user_id,) in conn.execute(select(archived_attempts.c.user_id).distinct())]
+
+        gone_quizzes, gone_users = set(quiz_ids), set(user_ids)
+        for chunk in _chunks(quiz_ids):
+            gone_quizzes.difference_update(quiz_id for (quiz_id,) in session.query(Quiz.id).filter(Quiz.id.in_(chunk)))
+        for chunk in _chunks(user_ids):
+            gone_users.difference_update(user_id for (user_id,) in session.query(User.id).filter(User.id.in_(chunk)))
+
+        deleted = 0
+        for chunk in _chunks(gone_quizzes):
+            with self.engine.begin() as conn:
+                deleted += conn.execute(delete(archived_attempts).where(archived_attempts.c.quiz_id.in_(chunk))).rowcount
+        for chunk in _chunks(gone_users):
+            with self.engine.begin() as conn:
+                deleted += conn.execute(delete(archived_attempts).where(archived_attempts.c.user_id.in_(chunk))).rowcount
+        if deleted:
+            logger.info("Deleted %d archived attempts of deleted users and quizzes", deleted)
+        return deleted
+
+    def _archived_ids(self, ids):
+        """The ids in `ids` that already belong to an archived attempt"""
+        with self.engine.connect() as conn:
+            return {attempt_id for (attempt_id,) in conn.execute(
+                select(archived_attempts.c.id).where(archived_attempts.c.id.in_(ids), archived_attempts.c.archived_at.isnot(None))
+            )}
+
+    def _write_pending(self, attempts, answers):
+        # Only pending copies are replaced; callers leave out ids that are already archived
+        with self.engine.begin() as conn:
+            conn.execute(delete(archived_attempts).where(
+                archived_attempts.c.id.in_([a.id for a in attempts]), archived_attempts.c.archived_at.is_(None)
+            ))
+            conn.execute(archived_attempts.insert(), [{
+                'id': a.id,
+                'user_id': a.user_id,
+                'quiz_id': a.quiz_id,
+                'score': a.score,
+                'total_questions': a.total_questions,
+                'time_taken': a.time_taken,
+                'started_at': a.started_at,
+                'completed_at': a.completed_at,
+                'answers': pack_answers(answers.get(a.id, [])),
+                'archived_at': None
+            } for a in attempts])
+
+    def _mark_archived(self, ids):
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(archived_attempts).where(archived_attempts.c.id.in_(ids)).values(archived_at=datetime.utcnow())
+            )
+
+    def _delete_abandoned(self, session, before, newest):
+        """Delete attempts started before `before` and never submitted; returns how many"""
+        deleted = 0
+        while True:
+            ids = [attempt_id for (attempt_id,) in session.query(QuizAttempt.id).filter(
+                QuizAttempt.completed_at.is_(None),
+                QuizAttempt.started_at < before,
+                QuizAttempt.id < newest
+            ).limit(self.batch_size)]
+            if not ids:
+                return deleted
+            session.execute(delete(UserAnswer).where(UserAnswer.attempt_id.in_(ids)), execution_options=NO_SYNC)
+            session.execute(delete(QuizAttempt).where(QuizAttempt.id.in_(ids)), execution_options=NO_SYNC)
+            session.commit()
+            deleted += len(ids)
+
+    def archive_attempts(self, session_factory, before=None, progress=None):
+        """
+        Move the attempts completed before `before` (default: the retention
+        window) to the archive, and delete the ones started before it and never
+        submitted. `progress(**fields)` is called after every batch.
+        """
+        before = before or datetime.utcnow() - timedelta(days=self.retention_days)
+        moved_attempts = moved_answers = abandoned = 0
+        started = time.perf_counter()
+        collisions = set()
+
+        def summary():
+            elapsed = time.perf_counter() - started
+            return {
+                'attempts_archived': moved_attempts,
+                'answers_archived': moved_answers,
+                'abandoned_deleted': abandoned,
+                'id_collisions': len(collisions),
+                'seconds': round(elapsed, 2),
+                'rows_per_second': round((moved_attempts + moved_answers) / elapsed) if elapsed > 0 else 0
+            }
+
+        session = session_factory()
+        try:
+            self._settle(session)
+            self._drop_orphans(session)
+            newest = session.query(func.max(QuizAttempt.id)).scalar()
+            while newest is not None:
+                attempts = session.query(
+                    QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.quiz_id,
+                    QuizAttempt.score, QuizAttempt.total_questions, QuizAttempt.time_taken,
+                    QuizAttempt.started_at, QuizAttempt.completed_at
+                ).filter(
+                    QuizAttempt.completed_at < before,
+                    QuizAttempt.id < newest,
+                    QuizAttempt.id.notin_(collisions)
+                ).order_by(QuizAttempt.completed_at).limit(self.batch_size).all()
+                if not attempts:
+                    break
+
+                # Never overwrite an archived attempt that had the same id
+                taken = self._archived_ids([a.id for a in attempts])
+                if taken:
+                    logger.error("Not archiving attempts %s: their ids belong to archived attempts", sorted(taken))
+                    collisions.update(taken)
+                    attempts = [a for a in attempts if a.id not in taken]
+                    if not attempts:
+                        continue
+
+                ids = [a.id for a in attempts]
+                answers = {}
+                for attempt_id, question_id, selected, correct in session.query(
+                    UserAnswer.attempt_id, UserAnswer.question_id, UserAnswer.selected_answer, UserAnswer.is_correct
+                ).filter(UserAnswer.attempt_id.in_(ids)).order_by(UserAnswer.id):
+                    answers.setdefault(attempt_id, []).append((question_id, selected, correct))
+
+                self._write_pending(attempts, answers)
+                session.execute(delete(UserAnswer).where(UserAnswer.attempt_id.in_(ids)), execution_options=NO_SYNC)
+                session.execute(delete(QuizAttempt).where(QuizAttempt.id.in_(ids)), execution_options=NO_SYNC)
+                session.commit()
+                self._mark_archived(ids)
+
+                moved_attempts += len(attempts)
+                moved_answers += sum(len(rows) for rows in answers.values())
+                if progress:
+                    progress(stage='archiving', **summary())
+
+            if newest is not None:
+                abandoned = self._delete_abandoned(session, before, newest)
+        finally:
+            session.close()
+
+        result = summary()
+        logger.info("Archived %d attempts and %d answers completed before %s in %ss (%d rows/s); "
+                    "deleted %d abandoned attempts",
+                    result['attempts_archived'], result['answers_archived'], before.date(), result['seconds'],
+                    result['rows_per_second'], result['abandoned_deleted'])
+        return result
+
+
+attempt_archive = AttemptArchive()
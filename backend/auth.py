@@ -0,0 +1,102 @@
+"""
+Role checks for authenticated requests
+
+Access tokens carry only the user id: a token lives for a day and the role
+can change (or the user be deleted) in the meantime, through any API
+process. Checks therefore use the role stored in the database, read through
+a short-TTL in-process cache of user roles, so admin_required costs one
+primary key lookup per user every USER_CACHE_TTL seconds rather than one per
+request.
+
+update_user/delete_user call invalidate_user_roles(), so the process that
+made a change applies it at once (a lookup already under way when it does
+isn't cached); every other process applies it within USER_CACHE_TTL
+seconds.
+"""
+
+import threading
+import time
+
+from models import db, User
+
+
+def load_user_role(user_id):
+    """Role of a user, or None if the user doesn't exist"""
+    return db.session.query(User.role).filter(User.id == user_id).scalar()
+
+
+class UserRoleCache:
+    """Thread-safe TTL cache of user roles keyed by user id"""
+
+    def __init__(self, ttl=60, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._roles = {}
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id, loader=load_user_role):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._roles.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(user_id, 0))
+
+        role = loader(user_id)
+
+        with self._lock:
+            # A role invalidated while it was loading may be the old one
+            if (self._epoch, self._generations.get(user_id, 0)) != generation:
+                return role
+            if len(self._roles) >= self.maxsize:
+                # Drop expired entries first, then everything if still full
+                self._roles = {k: v for k, v in self._roles.items() if v[1] > now}
+                if len(self._roles) >= self.maxsize:
+                    self._roles.clear()
+            self._roles[user_id] = (role, now + self.ttl)
+        return role
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._generations[user_id] = self._generations.get(user_id, 0) + 1
+                self._roles.pop(user_id, None)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._roles.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._roles),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'invalidations': self.invalidations
+            }
+
+
+user_role_cache = UserRoleCache()
+
+
+def token_role(user_id):
+    """Role of the user behind a verified token: the stored role, at most USER_CACHE_TTL seconds old"""
+    return user_role_cache.get(user_id)
+
+
+def invalidate_user_roles(*user_ids):
+    """Call after a user's role changed or the user was deleted (after commit)"""
+    user_role_cache.invalidate(*user_ids)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Admin Authorization Benchmark
+Times admin requests when the role is looked up in the database on every
+request (old behaviour) and when it is read through the role cache
+
+Usage: python benchmarks/bench_admin_auth.py [requests]   (default: 2000)
+
+Runs in-process with the Flask test client against a temporary database.
+"""
+
+import os
+import sys
+import statistics
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Point the app at a scratch database before it is imported
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import event
+import app as quiz_app
+from auth import user_role_cache
+from models import db
+
+ENDPOINT = '/api/admin/cache-stats'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(label, client, token, requests):
+    headers = {'Authorization': f'Bearer {token}'}
+    statements = []
+
+    with quiz_app.app.app_context():
+        engine = db.engine
+    count = lambda *args: statements.append(1)
+    event.listen(engine, 'before_cursor_execute', count)
+
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(ENDPOINT, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+
+    event.remove(engine, 'before_cursor_execute', count)
+
+    print(f"{label}:")
+    print(f"  mean {statistics.mean(latencies) * 1000:.3f} ms"
+          f"   p50 {percentile(latencies, 50) * 1000:.3f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:.3f} ms"
+          f"   queries/request {len(statements) / requests:.2f}")
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    quiz_app.init_db()
+    client = quiz_app.app.test_client()
+    token = client.post('/api/login', json={
+        'username': 'admin', 'password': 'admin123'
+    }).get_json()['access_token']
+
+    print(f"{requests} x GET {ENDPOINT}\n")
+
+    user_role_cache.ttl = 0
+    run('database lookup per request', client, token, requests)
+
+    user_role_cache.ttl = quiz_app.app.config['USER_CACHE_TTL']
+    run(f"cached role (USER_CACHE_TTL={user_role_cache.ttl})", client, token, requests)
+
+
+if __name__ == "__main__":
+    main()
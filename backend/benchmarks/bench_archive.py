@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Archive Benchmark
+Moves the attempts outside the retention window of a synthetic three-year
+history to the archive database, and compares table sizes and the rows
+moved per second
+
+Usage: python benchmarks/bench_archive.py [attempts]   (default: 100000)
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from archive import AttemptArchive
+from database import create_db_engine
+from models import db
+from sqlalchemy.orm import sessionmaker
+
+USERS = 2000
+QUIZZES = 30
+QUESTIONS = 10
+DAYS = 3 * 365
+
+
+def populate(db_path, attempts):
+    """Attempts with QUESTIONS answers each, spread over the last DAYS days"""
+    rnd = random.Random(1)
+    now = datetime.utcnow()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role) VALUES (?, ?, ?, 'x', 'user')",
+        ((i, f'user{i}', f'user{i}@example.com') for i in range(1, USERS + 1))
+    )
+    conn.executemany(
+        "INSERT INTO quizzes (id, title, chapter_id, created_by) VALUES (?, ?, 1, 1)",
+        ((i, f'Quiz {i}') for i in range(1, QUIZZES + 1))
+    )
+    # Attempt ids follow completion time, as they do in production
+    completed = sorted((now - timedelta(minutes=rnd.randint(0, DAYS * 24 * 60)) for _ in range(attempts)))
+    conn.executemany(
+        "INSERT INTO quiz_attempts (id, user_id, quiz_id, score, total_questions, time_taken, started_at, completed_at) "
+        "VALUES (?, ?, ?, ?, ?, 300, ?, ?)",
+        ((i, rnd.randint(1, USERS), rnd.randint(1, QUIZZES), rnd.randint(0, QUESTIONS), QUESTIONS, at, at)
+         for i, at in enumerate(completed, start=1))
+    )
+    conn.executemany(
+        "INSERT INTO user_answers (attempt_id, question_id, selected_answer, is_correct) VALUES (?, ?, ?, ?)",
+        ((attempt_id, q, rnd.choice('ABCD'), rnd.random() < 0.5)
+         for attempt_id in range(1, attempts + 1) for q in range(1, QUESTIONS + 1))
+    )
+    conn.commit()
+    conn.close()
+
+
+def table_sizes(db_path, tables):
+    """Bytes used by each table and its indexes"""
+    conn = sqlite3.connect(db_path)
+    try:
+        sizes = {}
+        for table in tables:
+            names = [table] + [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)
+            )]
+            sizes[table] = sum(conn.execute(
+                "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = ?", (name,)
+            ).fetchone()[0] for name in names)
+        return sizes
+    finally:
+        conn.close()
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:8.1f} MB"
+
+
+def main():
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, 'bench.db')
+    archive_path = os.path.join(workdir, 'archive.db')
+
+    engine = create_db_engine(f'sqlite:///{db_path}')
+    db.metadata.create_all(engine)
+    populate(db_path, attempts)
+    Session = sessionmaker(bind=engine)
+
+    hot_tables = ('quiz_attempts', 'user_answers')
+    before = table_sizes(db_path, hot_tables)
+
+    archive = AttemptArchive(f'sqlite:///{archive_path}')
+    start = time.perf_counter()
+    result = archive.archive_attempts(Session)
+    elapsed = time.perf_counter() - start
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    with archive.engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    after = table_sizes(db_path, hot_tables)
+    archived = table_sizes(archive_path, ('archived_attempts',))['archived_attempts']
+
+    print(f"{attempts} attempts ({attempts * QUESTIONS} answers) over {DAYS} days, "
+          f"retention {archive.retention_days} days:")
+    print(f"  moved {result['attempts_archived']} attempts and {result['answers_archived']} answers "
+          f"in {elapsed:.2f} s ({result['rows_per_second']} rows/s)")
+    for table in hot_tables:
+        print(f"  {table:24} {mb(before[table])} -> {mb(after[table])}")
+    moved_size = (before['quiz_attempts'] + before['user_answers']) - (after['quiz_attempts'] + after['user_answers'])
+    print(f"  archive                  {mb(archived)}   ({moved_size / archived:.1f}x smaller than the rows it replaced)")
+    archive.engine.dispose()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Catalog Conditional GET Benchmark
+Times the catalog endpoints on a synthetic catalog for a first visit (full
+response) and a repeat visit that sends back the ETag (304 Not Modified),
+and browsing down to a chapter's quizzes with three requests against one
+/api/catalog request served from the catalog cache
+
+Usage: python benchmarks/bench_catalog_etag.py [requests]   (default: 500)
+
+Runs in-process with the Flask test client against a temporary database.
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Point the app at a scratch database before it is imported
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import event, insert
+import app as quiz_app
+from models import db, Subject, Chapter, Quiz, Question
+
+SUBJECTS = 20
+CHAPTERS = 10     # per subject
+QUIZZES = 10      # per chapter
+QUESTIONS = 20    # per quiz
+
+# Clear of the sample catalog init_db() creates
+FIRST_SUBJECT = 1000
+
+
+def populate():
+    """SUBJECTS x CHAPTERS x QUIZZES x QUESTIONS catalog owned by the admin"""
+    with quiz_app.app.app_context():
+        db.session.execute(insert(Subject), [
+            {'id': s, 'name': f'Subject {s}', 'created_by': 1} for s in range(FIRST_SUBJECT, FIRST_SUBJECT + SUBJECTS)
+        ])
+        db.session.execute(insert(Chapter), [
+            {'id': s * 100 + c, 'name': f'Chapter {c}', 'subject_id': s, 'created_by': 1}
+            for s in range(FIRST_SUBJECT, FIRST_SUBJECT + SUBJECTS) for c in range(CHAPTERS)
+        ])
+        quiz_ids = []
+        for s in range(FIRST_SUBJECT, FIRST_SUBJECT + SUBJECTS):
+            for c in range(CHAPTERS):
+                quiz_ids += [(s * 100 + c) * 100 + q for q in range(QUIZZES)]
+        db.session.execute(insert(Quiz), [
+            {'id': quiz_id, 'title': f'Quiz {quiz_id}', 'chapter_id': quiz_id // 100, 'created_by': 1}
+            for quiz_id in quiz_ids
+        ])
+        db.session.execute(insert(Question), [
+            {'quiz_id': quiz_id, 'question': f'Question {n}?', 'option_a': 'a', 'option_b': 'b',
+             'option_c': 'c', 'option_d': 'd', 'correct_answer': 'A'}
+            for quiz_id in quiz_ids for n in range(QUESTIONS)
+        ])
+        db.session.commit()
+        return quiz_ids[0]
+
+
+def run(client, path, headers, requests):
+    """Mean latency (ms) and queries per request of a full and a conditional GET"""
+    with quiz_app.app.app_context():
+        engine = db.engine
+    statements = []
+    count = lambda *args: statements.append(1)
+    event.listen(engine, 'before_cursor_execute', count)
+
+    results = []
+    etag = client.get(path, headers=headers).headers['ETag']
+    for conditional in (False, True):
+        request_headers = dict(headers, **({'If-None-Match': etag} if conditional else {}))
+        statements.clear()
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = client.get(path, headers=request_headers)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == (304 if conditional else 200), response.status_code
+        results.append((statistics.mean(latencies) * 1000, len(statements) / requests, len(response.data)))
+
+    event.remove(engine, 'before_cursor_execute', count)
+    return results
+
+
+def browse(client, headers, requests):
+    """Mean latency (ms) of subjects -> chapters -> quizzes, and of /api/catalog"""
+    def per_level():
+        client.get('/api/subjects', headers=headers)
+        client.get(f'/api/subjects/{FIRST_SUBJECT}/chapters', headers=headers)
+        client.get(f'/api/chapters/{FIRST_SUBJECT * 100}/quizzes', headers=headers)
+
+    def tree():
+        assert client.get('/api/catalog', headers=headers).status_code == 200
+
+    results = []
+    for fn in (per_level, tree):
+        fn()
+        start = time.perf_counter()
+        for _ in range(requests):
+            fn()
+        results.append((time.perf_counter() - start) / requests * 1000)
+    return results
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    quiz_app.init_db()
+    quiz_id = populate()
+    client = quiz_app.app.test_client()
+    token = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{SUBJECTS} subjects, {SUBJECTS * CHAPTERS} chapters, {SUBJECTS * CHAPTERS * QUIZZES} quizzes, "
+          f"{SUBJECTS * CHAPTERS * QUIZZES * QUESTIONS} questions; {requests} requests each\n")
+    paths = ('/api/subjects', f'/api/subjects/{FIRST_SUBJECT}/chapters', f'/api/chapters/{FIRST_SUBJECT * 100}/quizzes',
+             '/api/quizzes?limit=50', f'/api/quizzes/{quiz_id}/questions')
+    for path in paths:
+        (full_ms, full_queries, size), (cached_ms, cached_queries, _) = run(client, path, headers, requests)
+        print(f"  {path:34} 200: {full_ms:7.3f} ms {full_queries:.0f} queries {size:6} bytes"
+              f"   304: {cached_ms:7.3f} ms {cached_queries:.0f} queries")
+
+    per_level_ms, tree_ms = browse(client, headers, requests)
+    print(f"\n  browse: 3 requests (subjects, chapters, quizzes) {per_level_ms:7.3f} ms"
+          f"   /api/catalog from the cache {tree_ms:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+SQLite Concurrency Benchmark
+Runs report readers and submission writers against the same database file,
+once with the default rollback journal and once with the tuned pragmas from
+database.py (WAL), and reports throughput, latency and lock errors
+
+Usage: python benchmarks/bench_concurrency.py [--readers N] [--writers N] [--seconds N] [--attempts N]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from database import SQLITE_PRAGMAS, create_db_engine
+from models import db
+
+USERS = 500
+QUIZZES = 50
+QUESTIONS_PER_QUIZ = 20
+
+# Default rollback journal, no busy timeout: how the app and scheduler ran before
+ROLLBACK_PRAGMAS = {'journal_mode': 'DELETE'}
+
+# The scheduler's reporting queries (jobs.py)
+READ_QUERIES = [
+    text("""
+        SELECT u.id, MAX(qa.completed_at), COUNT(qa.id)
+        FROM users u LEFT JOIN quiz_attempts qa ON u.id = qa.user_id
+        WHERE u.role = 'user' AND (qa.completed_at IS NULL OR qa.completed_at < :cutoff)
+        GROUP BY u.id ORDER BY 2 ASC
+    """),
+    text("""
+        SELECT COUNT(DISTINCT qa.user_id), COUNT(qa.id), AVG(qa.score * 100.0 / qa.total_questions)
+        FROM quiz_attempts qa WHERE qa.completed_at >= :cutoff
+    """)
+]
+
+
+def populate(db_path, attempts):
+    """Fill a fresh database with users, quizzes, questions and completed attempts"""
+    conn = sqlite3.connect(db_path)
+    now = datetime.utcnow()
+    rng = random.Random(42)
+
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, 'x', 'user', ?)",
+        [(i, f'user{i}', f'user{i}@example.com', now) for i in range(1, USERS + 1)]
+    )
+    conn.execute("INSERT INTO subjects (id, name, is_active, created_by) VALUES (1, 'Bench', 1, 1)")
+    conn.execute("INSERT INTO chapters (id, name, subject_id, is_active, created_by) VALUES (1, 'Bench', 1, 1, 1)")
+    conn.executemany(
+        "INSERT INTO quizzes (id, title, chapter_id, time_limit, is_active, created_by, created_at) VALUES (?, ?, 1, 30, 1, 1, ?)",
+        [(i, f'Quiz {i}', now) for i in range(1, QUIZZES + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO questions (quiz_id, question, option_a, option_b, option_c, option_d, correct_answer, points) "
+        "VALUES (?, 'Q', 'A', 'B', 'C', 'D', 'A', 1)",
+        [(quiz_id,) for quiz_id in range(1, QUIZZES + 1) for _ in range(QUESTIONS_PER_QUIZ)]
+    )
+    conn.executemany(
+        "INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions, time_taken, started_at, completed_at) "
+        "VALUES (?, ?, ?, ?, 60, ?, ?)",
+        (
+            (rng.randint(1, USERS), rng.randint(1, QUIZZES), rng.randint(0, QUESTIONS_PER_QUIZ), QUESTIONS_PER_QUIZ,
+             completed, completed)
+            for completed in (now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)) for _ in range(attempts))
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def submit(conn, rng):
+    """One quiz submission: an attempt row plus its answers in one transaction"""
+    now = datetime.utcnow()
+    quiz_id = rng.randint(1, QUIZZES)
+    attempt_id = conn.execute(text(
+        "INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions, time_taken, started_at, completed_at) "
+        "VALUES (:user_id, :quiz_id, :score, :total, 60, :now, :now)"
+    ), {
+        'user_id': rng.randint(1, USERS), 'quiz_id': quiz_id,
+        'score': rng.randint(0, QUESTIONS_PER_QUIZ), 'total': QUESTIONS_PER_QUIZ, 'now': now
+    }).lastrowid
+    conn.execute(text(
+        "INSERT INTO user_answers (attempt_id, question_id, selected_answer, is_correct) "
+        "VALUES (:attempt_id, :question_id, 'A', 1)"
+    ), [
+        {'attempt_id': attempt_id, 'question_id': (quiz_id - 1) * QUESTIONS_PER_QUIZ + i + 1}
+        for i in range(QUESTIONS_PER_QUIZ)
+    ])
+
+
+def run(label, db_path, pragmas, readers, writers, seconds):
+    engine = create_db_engine(f'sqlite:///{db_path}', pragmas=pragmas, pool_size=readers + writers)
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'read': [], 'write': [], 'read_errors': 0, 'write_errors': 0}
+
+    def record(kind, latency=None):
+        with lock:
+            if latency is None:
+                results[f'{kind}_errors'] += 1
+            else:
+                results[kind].append(latency)
+
+    def reader(seed):
+        rng = random.Random(seed)
+        cutoff = datetime.utcnow() - timedelta(days=7)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with engine.connect() as conn:
+                    conn.execute(rng.choice(READ_QUERIES), {'cutoff': cutoff}).fetchall()
+                record('read', time.perf_counter() - start)
+            except OperationalError:
+                record('read')
+
+    def writer(seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with engine.begin() as conn:
+                    submit(conn, rng)
+                record('write', time.perf_counter() - start)
+            except OperationalError:
+                record('write')
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(f"{label}:")
+    for kind in ('read', 'write'):
+        latencies = results[kind]
+        print(f"  {kind:5}  {len(latencies) / seconds:8.1f} ops/sec"
+              f"   p50 {percentile(latencies, 50) * 1000:7.1f} ms"
+              f"   p99 {percentile(latencies, 99) * 1000:7.1f} ms"
+              f"   locked errors {results[f'{kind}_errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite reader/writer concurrency benchmark')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--attempts', type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s each, {args.attempts} attempts\n")
+
+    for label, pragmas in (('rollback journal', ROLLBACK_PRAGMAS), ('WAL + tuned pragmas', SQLITE_PRAGMAS)):
+        tmp = tempfile.mkdtemp()
+        db_path = os.path.join(tmp, 'bench.db')
+        schema_engine = create_db_engine(f'sqlite:///{db_path}', pragmas={})
+        db.metadata.create_all(schema_engine)
+        schema_engine.dispose()
+        populate(db_path, args.attempts)
+
+        run(label, db_path, pragmas, args.readers, args.writers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Activity Stats Benchmark
+Times the daily and weekly activity stats on a synthetic attempt history:
+with the covering completed_at index, with the previous plain completed_at
+index, and served from the stats cache
+
+Usage: python benchmarks/bench_daily_stats.py [attempts]   (default: 200000)
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from activity_stats import StatsCache, compute_stats, day_start
+from database import create_db_engine
+from models import db
+from sqlalchemy.orm import sessionmaker
+
+USERS = 2000
+QUIZZES = 30
+
+
+def populate(db_path, attempts):
+    """Attempts spread over the last 30 days"""
+    rnd = random.Random(1)
+    now = datetime.utcnow()
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, 'x', 'user', ?)",
+        ((i, f'user{i}', f'user{i}@example.com', now - timedelta(hours=rnd.randint(0, 72))) for i in range(1, USERS + 1))
+    )
+    conn.executemany(
+        "INSERT INTO quizzes (id, title, chapter_id, created_by) VALUES (?, ?, 1, 1)",
+        ((i, f'Quiz {i}') for i in range(1, QUIZZES + 1))
+    )
+    conn.executemany(
+        "INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions, started_at, completed_at) "
+        "VALUES (?, ?, ?, 10, ?, ?)",
+        ((rnd.randint(1, USERS), rnd.randint(1, QUIZZES), rnd.randint(0, 10), completed, completed)
+         for completed in (now - timedelta(minutes=rnd.randint(0, 30 * 24 * 60)) for _ in range(attempts)))
+    )
+    conn.commit()
+    conn.close()
+
+
+def best_of(fn, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_db_engine(f'sqlite:///{db_path}')
+    db.metadata.create_all(engine)
+    populate(db_path, attempts)
+    Session = sessionmaker(bind=engine)
+
+    tomorrow = day_start(datetime.utcnow()) + timedelta(days=1)
+    windows = [('today vs yesterday', tomorrow - timedelta(days=1)), ('last 7 days vs the 7 before', tomorrow - timedelta(days=7))]
+
+    def compute(start):
+        session = Session()
+        try:
+            return compute_stats(session, start, tomorrow)
+        finally:
+            session.close()
+
+    print(f"{attempts} attempts over 30 days:")
+    covering = {label: best_of(lambda: compute(start)) for label, start in windows}
+
+    # The previous index: completed_at only, so every matching row is read from the table
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_quiz_attempts_completed_cover")
+        conn.exec_driver_sql("CREATE INDEX ix_quiz_attempts_completed ON quiz_attempts (completed_at)")
+    plain = {label: best_of(lambda: compute(start)) for label, start in windows}
+
+    cache = StatsCache(ttl=60)
+    for label, start in windows:
+        cached = best_of(lambda: cache.get(start, lambda: compute(start)), runs=50)
+        print(f"  {label:30} plain index {plain[label]:8.1f} ms   covering index {covering[label]:8.1f} ms"
+              f"   cached {cached:8.3f} ms")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Email Dispatch Benchmark
+Sends reminder emails to a local SMTP stand-in, once with a new connection
+per message sent one after another (the old EmailService, minus its
+1 second sleep) and once through the pooled, concurrent sender
+
+Requires aiosmtpd (pip install aiosmtpd)
+
+Usage: python benchmarks/bench_email.py [--messages N] [--workers N] [--latency MS]
+
+--latency delays each SMTP greeting/EHLO/DATA reply to mimic a remote server.
+"""
+
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from email.mime.text import MIMEText
+from mailer import BulkSender, SMTPConnectionPool
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    sys.exit("aiosmtpd is required: pip install aiosmtpd")
+
+HOST = '127.0.0.1'
+PORT = 8025
+
+
+class SlowHandler:
+    """Accepts every message after `latency` seconds per reply"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return '250 OK'
+
+
+def make_message(i):
+    msg = MIMEText(f'<p>Hi user{i}, new quizzes are waiting for you!</p>', 'html')
+    msg['Subject'] = "Don't Miss Out - New Quizzes Await You!"
+    msg['From'] = 'Quiz App <noreply@quizapp.com>'
+    msg['To'] = f'user{i}@example.com'
+    return msg
+
+
+def send_unpooled(i):
+    """What EmailService.send_email() did per message: connect, send, quit"""
+    with smtplib.SMTP(HOST, PORT) as server:
+        server.ehlo()
+        server.send_message(make_message(i))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Email dispatch benchmark')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=5, help='milliseconds per SMTP reply')
+    args = parser.parse_args()
+
+    handler = SlowHandler(args.latency / 1000)
+    controller = Controller(handler, hostname=HOST, port=PORT)
+    controller.start()
+
+    try:
+        print(f"{args.messages} messages, {args.latency:g} ms per SMTP reply\n")
+
+        start = time.perf_counter()
+        for i in range(args.messages):
+            send_unpooled(i)
+        elapsed = time.perf_counter() - start
+        print(f"{'connection per message, sequential:':40} {args.messages / elapsed:8.1f} msgs/sec  ({elapsed:.2f}s)")
+
+        pool = SMTPConnectionPool(HOST, PORT, use_tls=False, size=args.workers)
+
+        def send_pooled(i):
+            pool.send_message(make_message(i))
+            return True
+
+        sender = BulkSender(send_pooled, workers=args.workers, rate=0)
+        start = time.perf_counter()
+        sent = sender.send_all((i,) for i in range(args.messages))
+        elapsed = time.perf_counter() - start
+        pool.close()
+        print(f"{f'pooled, {args.workers} workers:':40} {sent / elapsed:8.1f} msgs/sec  ({elapsed:.2f}s, "
+              f"{pool.connects} connections)")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Email Rendering Benchmark
+Measures how many reminder and admin report messages per second can be
+rendered and turned into SMTP-ready bytes
+
+Usage: python benchmarks/bench_email_render.py [messages]   (default: 20000)
+
+"per message MIMEMultipart" is the previous path: render, then build a
+MIMEMultipart with two MIMEText parts and serialize it for every recipient.
+"""
+
+import os
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from email_templates import build_message, render_admin_report, render_user_reminder
+
+FROM_EMAIL = 'Quiz App <noreply@quizapp.com>'
+
+STATS = {
+    'today': {'active_users': 120, 'total_attempts': 480, 'avg_score': 71.3, 'quizzes_taken': 35},
+    'yesterday': {'active_users': 110, 'total_attempts': 500, 'avg_score': 69.8, 'quizzes_taken': 31},
+    'new_users': 12,
+    'top_quiz': {'title': 'Basic Math Quiz', 'attempts': 64, 'avg_score': 78.2}
+}
+
+
+def user(i):
+    return {
+        'id': i,
+        'username': f'user{i}',
+        'email': f'user{i}@example.com',
+        'last_attempt': '2025-01-01 10:00:00' if i % 2 else None,
+        'total_attempts': i % 17
+    }
+
+
+def mime_bytes(to_email, subject, html_content, text_content):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = FROM_EMAIL
+    msg['To'] = to_email
+    if text_content:
+        msg.attach(MIMEText(text_content, 'plain'))
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg.as_bytes()
+
+
+def rate(label, count, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:45} {count / elapsed:10.0f} msgs/sec")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    users = [user(i) for i in range(count)]
+    admins = [f'admin{i}@example.com' for i in range(count)]
+
+    print(f"{count} reminder emails:")
+    rate('render only', count, lambda: [render_user_reminder(u) for u in users])
+    rate('render + per message MIMEMultipart', count, lambda: [
+        mime_bytes(u['email'], *render_user_reminder(u)) for u in users
+    ])
+    rate('render + build_message', count, lambda: [
+        build_message(FROM_EMAIL, u['email'], *render_user_reminder(u)) for u in users
+    ])
+
+    print(f"\n{count} admin reports:")
+    rate('rendered per admin + per message MIMEMultipart', count, lambda: [
+        mime_bytes(email, *render_admin_report(STATS), None) for email in admins
+    ])
+
+    def shared_report():
+        subject, html_content = render_admin_report(STATS)
+        return [build_message(FROM_EMAIL, email, subject, html_content) for email in admins]
+    rate('rendered once + build_message', count, shared_report)
+
+
+if __name__ == "__main__":
+    main()
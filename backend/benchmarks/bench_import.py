@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Import Time Benchmark
+Times `import app` in fresh interpreters with python -X importtime, against
+importing app and then building the job scheduler, which is what every import
+of app.py used to do (the scheduler is now created by the first admin job
+request), and lists the modules only the job scheduler loads
+
+Usage: python benchmarks/bench_import.py [runs]   (default: 10)
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SCENARIOS = [
+    ('import app', 'import app'),
+    ('import app + job scheduler',
+     'import app\n'
+     'from jobs import get_job_scheduler\n'
+     'with app.app.app_context():\n'
+     '    get_job_scheduler(app.db.engine)')
+]
+
+
+def import_times(code, env):
+    """{module: cumulative microseconds} and the total wall time (ms) of running `code`"""
+    script = f"import time\nstart = time.perf_counter()\n{code}\nprint((time.perf_counter() - start) * 1000)"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules, float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+    print(f"Median of {runs} fresh interpreters:")
+    loaded = {}
+    for label, code in SCENARIOS:
+        samples = [import_times(code, env) for _ in range(runs)]
+        loaded[label] = set(samples[-1][0])
+        print(f"  {label:28} {statistics.median(wall for _, wall in samples):8.1f} ms   "
+              f"{len(loaded[label])} modules")
+
+    modules, _ = import_times(SCENARIOS[-1][1], env)
+    extra = sorted(loaded[SCENARIOS[-1][0]] - loaded[SCENARIOS[0][0]], key=modules.get, reverse=True)
+    print(f"  modules no longer imported with app.py: {len(extra)}")
+    for name in extra[:10]:
+        print(f"    {name:28} {modules[name] / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Inactive User Streaming Benchmark
+Compares get_inactive_users() (whole list) with iter_inactive_users()
+(keyset batches) on a synthetic user base: peak Python memory, time until
+the first user is available and total time
+
+Usage: python benchmarks/bench_inactive_users.py [users ...]   (default: 10000 100000)
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database import create_db_engine
+from jobs import JobScheduler
+from models import db
+
+
+def populate(db_path, users):
+    """Users with one attempt each; three quarters of them inactive for a month"""
+    conn = sqlite3.connect(db_path)
+    now = datetime.utcnow()
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, 'x', 'user', ?)",
+        ((i, f'user{i}', f'user{i}@example.com', now) for i in range(1, users + 1))
+    )
+    conn.executemany(
+        "INSERT INTO quiz_attempts (user_id, quiz_id, score, total_questions, time_taken, started_at, completed_at) "
+        "VALUES (?, 1, 5, 10, 60, ?, ?)",
+        ((i, completed, completed) for i in range(1, users + 1)
+         for completed in [now - timedelta(days=30 if i % 4 else 1)])
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(fn):
+    """(count, seconds to first user, total seconds, peak traced bytes)"""
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in fn():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+
+    # Memory is traced in a second pass; tracing slows everything down
+    tracemalloc.start()
+    for _ in fn():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return count, first or 0, total, peak
+
+
+def run(users):
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    engine = create_db_engine(f'sqlite:///{db_path}')
+    db.metadata.create_all(engine)
+    populate(db_path, users)
+
+    scheduler = JobScheduler()
+    scheduler.use_engine(engine)
+
+    print(f"{users} users:")
+    for label, fn in (
+        ('get_inactive_users (list)', lambda: scheduler.get_inactive_users(days=7)),
+        ('iter_inactive_users (stream)', lambda: scheduler.iter_inactive_users(days=7))
+    ):
+        count, first, total, peak = measure(fn)
+        print(f"  {label:30} {count} users   first after {first * 1000:8.1f} ms"
+              f"   total {total:6.2f}s   peak memory {peak / 1024 / 1024:7.1f} MB")
+    engine.dispose()
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    for users in sizes:
+        run(users)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Admin Report Benchmark
+Compares the report engines in reports.py on a synthetic attempt history
+
+Usage: python benchmarks/bench_reports.py [attempts ...]   (default: 10000 100000 1000000)
+"""
+
+import os
+import sys
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from models import db
+from reports import build_report, rebuild_rollups
+
+USERS = 2000
+QUIZZES = 200
+
+
+def populate(db_path, attempts):
+    """Fill a fresh database with users, quizzes and completed attempts"""
+    conn = sqlite3.connect(db_path)
+    now = datetime.utcnow()
+    rng = random.Random(42)
+
+    conn.executemany(
+        "INSERT INTO users (id, username, email, password_hash, role, created_at) VALUES (?, ?, ?, 'x', 'user', ?)",
+        [(i, f'user{i}', f'user{i}@example.com', now) for i in range(1, USERS + 1)]
+    )
+    conn.execute("INSERT INTO subjects (id, name, is_active, created_by) VALUES (1, 'Bench', 1, 1)")
+    conn.execute("INSERT INTO chapters (id, name, subject_id, is_active, created_by) VALUES (1, 'Bench', 1, 1, 1)")
+    conn.executemany(
+        "INSERT INTO quizzes (id, title, chapter_id, time_limit, is_active, created_by, created_at) VALUES (?, ?, 1, 30, 1, 1, ?)",
+        [(i, f'Quiz {i}', now) for i in range(1, QUIZZES + 1)]
+    )
+
+    def rows():
+        for i in range(1, attempts + 1):
+            total = rng.randint(5, 20)
+            completed = now - timedelta(minutes=rng.randint(0, 60 * 24 * 30))
+            yield (i, rng.randint(1, USERS), rng.randint(1, QUIZZES), rng.randint(0, total), total, 60, completed, completed)
+
+    conn.executemany(
+        "INSERT INTO quiz_attempts (id, user_id, quiz_id, score, total_questions, time_taken, started_at, completed_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows()
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run(attempts):
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, 'bench.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        populate(db_path, attempts)
+
+        python_report, python_time = timed(lambda: build_report('python'))
+        sql_report, sql_time = timed(lambda: build_report('sql'))
+
+        _, backfill_time = timed(rebuild_rollups)
+        db.session.commit()
+        _, rollup_time = timed(lambda: build_report('rollup'))
+
+        db.session.remove()
+        db.engine.dispose()
+
+    os.remove(db_path)
+    os.rmdir(tmp)
+
+    print(f"{attempts:>9} attempts | python {python_time * 1000:9.1f} ms | sql {sql_time * 1000:9.1f} ms "
+          f"({python_time / sql_time:4.1f}x) | rollup {rollup_time * 1000:7.1f} ms "
+          f"(backfill {backfill_time * 1000:.0f} ms) | sql == python: {sql_report == python_report}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    for size in sizes:
+        run(size)
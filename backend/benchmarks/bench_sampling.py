@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Question Bank Sampling Benchmark
+Times starting and submitting attempts of a quiz that draws a sample from a
+large question pool (plain and stratified by points), and compares the draw
+with picking the sample in SQL with ORDER BY RANDOM() LIMIT n
+
+Usage: python benchmarks/bench_sampling.py [starts] [pool] [sample]   (default: 500 5000 50)
+
+Runs in-process with the Flask test client against a temporary database.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Point the app at a scratch database before it is imported
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import insert, text
+import app as quiz_app
+from models import db, Question, Quiz
+from quiz_payload import draw_questions, get_payload, start_response
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def create_quiz(pool, sample):
+    with quiz_app.app.app_context():
+        quiz = Quiz(title='Sampling benchmark', chapter_id=1, created_by=1, time_limit=30, sample_size=sample)
+        db.session.add(quiz)
+        db.session.flush()
+        db.session.execute(insert(Question), [
+            {'quiz_id': quiz.id, 'question': f'Question {n}: which option is right?', 'option_a': 'First option',
+             'option_b': 'Second option', 'option_c': 'Third option', 'option_d': 'Fourth option',
+             'correct_answer': 'ABCD'[n % 4], 'points': (1, 1, 2, 3)[n % 4]}
+            for n in range(pool)
+        ])
+        db.session.commit()
+        return quiz.id
+
+
+def report(label, latencies):
+    print(f"{label}:")
+    print(f"  mean {statistics.mean(latencies) * 1000:.3f} ms"
+          f"   p50 {percentile(latencies, 50) * 1000:.3f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:.3f} ms")
+
+
+def run(label, client, headers, quiz_id, starts):
+    """Time `starts` starts and the submissions of those attempts"""
+    rnd = random.Random(1)
+    start_latencies = []
+    submit_latencies = []
+    for _ in range(starts):
+        start = time.perf_counter()
+        response = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+        start_latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+
+        attempt = response.get_json()
+        answers = {str(question['id']): rnd.choice('ABCD') for question in attempt['questions']}
+        start = time.perf_counter()
+        response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                               json={'answers': answers, 'time_taken': 60}, headers=headers)
+        submit_latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+
+    report(f"start: {label}", start_latencies)
+    report(f"submit: {label}", submit_latencies)
+
+
+def run_order_by_random(quiz_id, sample, starts):
+    """Time drawing the sample in SQL, the way a start would without the cached pool"""
+    latencies = []
+    with quiz_app.app.app_context():
+        for _ in range(starts):
+            start = time.perf_counter()
+            db.session.execute(text(
+                "SELECT id, question, option_a, option_b, option_c, option_d, points FROM questions "
+                "WHERE quiz_id = :quiz_id ORDER BY RANDOM() LIMIT :sample"
+            ), {'quiz_id': quiz_id, 'sample': sample}).all()
+            latencies.append(time.perf_counter() - start)
+        db.session.rollback()
+    report('draw in SQL: ORDER BY RANDOM() LIMIT n', latencies)
+
+
+def run_cached_draw(quiz_id, starts):
+    """Time drawing the sample from the cached pool and building the response body"""
+    latencies = []
+    with quiz_app.app.app_context():
+        payload = get_payload(quiz_id)
+        for attempt_id in range(starts):
+            start = time.perf_counter()
+            start_response(payload, attempt_id, positions=draw_questions(payload))
+            latencies.append(time.perf_counter() - start)
+    report('draw from the cached pool + response body', latencies)
+
+
+def main():
+    starts = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    pool = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    sample = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    quiz_app.init_db()
+    quiz_id = create_quiz(pool, sample)
+    client = quiz_app.app.test_client()
+    token = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{starts} attempts drawing {sample} of {pool} questions\n")
+    run_order_by_random(quiz_id, sample, starts)
+    run_cached_draw(quiz_id, starts)
+
+    client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+    run('sampled', client, headers, quiz_id, starts)
+
+    client.put(f'/api/quizzes/{quiz_id}', json={'sample_by_points': True}, headers=headers)
+    client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+    run('sampled by points', client, headers, quiz_id, starts)
+
+
+if __name__ == "__main__":
+    main()
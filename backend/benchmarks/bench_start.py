@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Quiz Start Benchmark
+Times starting a quiz: the start request with the quiz's payload rebuilt
+every time (what a start cost before the payload cache, plus the separate
+questions request it replaces), and with the cached payload. Then times
+starts and submissions with and without per-attempt shuffling
+
+Usage: python benchmarks/bench_start.py [starts] [questions]   (default: 1000 50)
+
+Runs in-process with the Flask test client against a temporary database.
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Point the app at a scratch database before it is imported
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import event, insert
+import app as quiz_app
+from models import db, Question, Quiz
+from quiz_payload import payload_cache
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def create_quiz(questions):
+    with quiz_app.app.app_context():
+        quiz = Quiz(title='Start benchmark', chapter_id=1, created_by=1, time_limit=30)
+        db.session.add(quiz)
+        db.session.flush()
+        db.session.execute(insert(Question), [
+            {'quiz_id': quiz.id, 'question': f'Question {n}: which option is right?', 'option_a': 'First option',
+             'option_b': 'Second option', 'option_c': 'Third option', 'option_d': 'Fourth option',
+             'correct_answer': 'ABCD'[n % 4]}
+            for n in range(questions)
+        ])
+        db.session.commit()
+        return quiz.id
+
+
+def report(label, latencies, statements):
+    writes = sum(1 for statement in statements if statement in ('INSERT', 'UPDATE', 'DELETE'))
+    print(f"{label}:")
+    print(f"  mean {statistics.mean(latencies) * 1000:.3f} ms"
+          f"   p50 {percentile(latencies, 50) * 1000:.3f} ms"
+          f"   p99 {percentile(latencies, 99) * 1000:.3f} ms"
+          f"   statements/request {len(statements) / len(latencies):.2f} ({writes / len(latencies):.2f} writes)")
+
+
+def run(label, client, headers, quiz_id, starts, cached=True, submit=False):
+    """Time `starts` starts (or, with submit=True, the submissions of as many attempts)"""
+    with quiz_app.app.app_context():
+        engine = db.engine
+    statements = []
+    count = lambda conn, cursor, statement, *args: statements.append(statement.split()[0].upper())
+    rnd = random.Random(1)
+
+    latencies = []
+    for _ in range(starts):
+        if not cached:
+            payload_cache.clear()
+        if not submit:
+            event.listen(engine, 'before_cursor_execute', count)
+        start = time.perf_counter()
+        response = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+        if not cached:
+            client.get(f'/api/quizzes/{quiz_id}/questions', headers=headers)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.get_json()
+
+        if submit:
+            attempt = response.get_json()
+            answers = {str(question['id']): rnd.choice('ABCD') for question in attempt['questions']}
+            event.listen(engine, 'before_cursor_execute', count)
+            start = time.perf_counter()
+            response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                                   json={'answers': answers, 'time_taken': 60}, headers=headers)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.get_json()
+        event.remove(engine, 'before_cursor_execute', count)
+        latencies.append(elapsed)
+
+    report(label, latencies, statements)
+
+
+def main():
+    starts = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    quiz_app.init_db()
+    quiz_id = create_quiz(questions)
+    client = quiz_app.app.test_client()
+    token = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'}).get_json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    print(f"{starts} starts of a {questions}-question quiz\n")
+    quiz_app.app.config['SHUFFLE_QUESTIONS'] = False
+    run('start: payload rebuilt + questions request', client, headers, quiz_id, starts, cached=False)
+    client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+    run('start: cached payload', client, headers, quiz_id, starts)
+    run('submit', client, headers, quiz_id, starts, submit=True)
+
+    quiz_app.app.config['SHUFFLE_QUESTIONS'] = True
+    run('start: cached payload, shuffled', client, headers, quiz_id, starts)
+    run('submit: shuffled', client, headers, quiz_id, starts, submit=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Quiz Submission Load Benchmark
+Fires concurrent quiz submissions at a running server and reports latency
+
+Start the server first (python app.py), then run:
+    python benchmarks/bench_submit.py [--url URL] [--questions N] [--submissions N] [--concurrency N]
+
+Run it once on the old and once on the new code to compare before/after.
+The benchmark quiz it creates is deleted at the end.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def call(base_url, method, path, token=None, payload=None):
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read() or b'null')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quiz submission load benchmark')
+    parser.add_argument('--url', default='http://localhost:5000/api')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--chapter-id', type=int, default=1)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--submissions', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    token = call(args.url, 'POST', '/login', payload={
+        'username': args.username, 'password': args.password
+    })['access_token']
+
+    quiz_id = call(args.url, 'POST', '/quizzes', token, {
+        'title': f'Submission benchmark {int(time.time())}',
+        'chapter_id': args.chapter_id
+    })['quiz_id']
+
+    try:
+        for i in range(args.questions):
+            call(args.url, 'POST', f'/quizzes/{quiz_id}/questions', token, {
+                'question': f'Question {i}',
+                'option_a': 'A', 'option_b': 'B', 'option_c': 'C', 'option_d': 'D',
+                'correct_answer': random.choice('ABCD')
+            })
+
+        question_ids = [q['id'] for q in call(args.url, 'GET', f'/quizzes/{quiz_id}/questions', token)]
+        attempt_ids = [
+            call(args.url, 'POST', f'/quizzes/{quiz_id}/start', token)['attempt_id']
+            for _ in range(args.submissions)
+        ]
+
+        def submit(attempt_id):
+            answers = {str(qid): random.choice('ABCD') for qid in question_ids}
+            start = time.perf_counter()
+            call(args.url, 'POST', f'/attempts/{attempt_id}/submit', token, {
+                'answers': answers, 'time_taken': 60
+            })
+            return time.perf_counter() - start
+
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            latencies = list(pool.map(submit, attempt_ids))
+        wall = time.perf_counter() - wall_start
+
+        print(f"{args.submissions} submissions x {args.questions} questions, concurrency {args.concurrency}")
+        print(f"  throughput: {args.submissions / wall:.1f} submissions/sec")
+        print(f"  p50: {percentile(latencies, 50) * 1000:.1f} ms")
+        print(f"  p99: {percentile(latencies, 99) * 1000:.1f} ms")
+        print(f"  mean: {statistics.mean(latencies) * 1000:.1f} ms")
+    finally:
+        call(args.url, 'DELETE', f'/quizzes/{quiz_id}', token)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Cascading deletes
+
+Deleting a subject, chapter, quiz or user removes everything below it with
+a handful of set-based DELETE ... WHERE ... IN (subquery) statements instead
+of walking the tree in Python.
+
+Large deletes can run in the background: user answers (by far the biggest
+table) are removed in small batches with a commit after each one, so the
+database write lock is only held briefly and exam traffic keeps flowing.
+The rest of the tree is removed in one short final transaction. Until
+then the entity and every quiz below it are deactivated, so nobody can
+start them, and submissions of attempts already under way are refused.
+
+Attempts already moved to the archive database (archive.py) are taken out
+of the rollups and deleted from the archive as well, once the delete has
+committed in the main database (the archive is a separate database, so it
+can't share the transaction). If that archive delete fails, the weekly
+cleanup removes the archived attempts of users and quizzes that no longer
+exist.
+
+The catalog change counters (catalog.py) of the tables rows were removed
+from are bumped in the same transaction as the delete.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import delete, event, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from archive import archived_attempts, attempt_archive
+from catalog import DELETED_TABLES, catalog_changed
+from job_runs import JobRuns, job_lease
+from models import db, User, Subject, Chapter, Quiz, Question, QuizAttempt, UserAnswer
+from reports import forget_archived, forget_attempts, refresh_rollups
+
+DELETE_KINDS = ('subject', 'chapter', 'quiz', 'user')
+
+NO_SYNC = {'synchronize_session': False}
+
+
+def quiz_ids_select(kind, entity_id):
+    """Subquery selecting the ids of the quizzes removed with an entity"""
+    if kind == 'subject':
+        return select(Quiz.id).join(Chapter, Quiz.chapter_id == Chapter.id).where(Chapter.subject_id == entity_id)
+    if kind == 'chapter':
+        return select(Quiz.id).where(Quiz.chapter_id == entity_id)
+    if kind == 'quiz':
+        return select(Quiz.id).where(Quiz.id == entity_id)
+    if kind == 'user':
+        return select(Quiz.id).where(Quiz.created_by == entity_id)
+    raise ValueError(f"Unknown delete kind: {kind}")
+
+
+def attempt_criteria(kind, entity_id):
+    """Criteria matching the quiz attempts removed with an entity"""
+    criteria = QuizAttempt.quiz_id.in_(quiz_ids_select(kind, entity_id))
+    if kind == 'user':
+        criteria = or_(QuizAttempt.user_id == entity_id, criteria)
+    return criteria
+
+
+def archived_criteria(kind, quiz_ids, entity_id):
+    """Criteria matching the archived attempts removed with an entity (its quizzes' ids are known)"""
+    criteria = archived_attempts.c.quiz_id.in_(quiz_ids)
+    if kind == 'user':
+        criteria = or_(archived_attempts.c.user_id == entity_id, criteria)
+    return criteria
+
+
+def _answer_criteria(kind, entity_id):
+    attempt_ids = select(QuizAttempt.id).where(attempt_criteria(kind, entity_id))
+    question_ids = select(Question.id).where(Question.quiz_id.in_(quiz_ids_select(kind, entity_id)))
+    return or_(UserAnswer.attempt_id.in_(attempt_ids), UserAnswer.question_id.in_(question_ids))
+
+
+def delete_answers_in_batches(kind, entity_id, batch_size=5000, pause=0.05):
+    """Delete the user answers below an entity, committing after every batch"""
+    criteria = _answer_criteria(kind, entity_id)
+    deleted = 0
+    while True:
+        batch = select(UserAnswer.id).where(criteria).limit(batch_size)
+        result = db.session.execute(delete(UserAnswer).where(UserAnswer.id.in_(batch)), execution_options=NO_SYNC)
+        db.session.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+        # Give waiting writers a chance at the lock between batches
+        time.sleep(pause)
+
+
+def deactivate_entity(kind, entity_id):
+    """
+    Hide an entity and every quiz below it until a background delete removes
+    them (caller commits), so none of its quizzes can be started or submitted
+    in the meantime.
+
+    Returns the ids of the hidden quizzes so their caches can be dropped.
+    """
+    quiz_ids = [quiz_id for (quiz_id,) in db.session.execute(quiz_ids_select(kind, entity_id))]
+    tables = []
+    if quiz_ids:
+        db.session.execute(update(Quiz).where(Quiz.id.in_(quiz_ids)).values(is_active=False), execution_options=NO_SYNC)
+        tables.append('quizzes')
+    if kind == 'subject':
+        db.session.execute(update(Subject).where(Subject.id == entity_id).values(is_active=False), execution_options=NO_SYNC)
+        db.session.execute(update(Chapter).where(Chapter.subject_id == entity_id).values(is_active=False), execution_options=NO_SYNC)
+        tables += ['subjects', 'chapters']
+    elif kind == 'chapter':
+        db.session.execute(update(Chapter).where(Chapter.id == entity_id).values(is_active=False), execution_options=NO_SYNC)
+        tables.append('chapters')
+
+    if tables:
+        catalog_changed(*tables)
+    return quiz_ids
+
+
+def delete_entity(kind, entity_id):
+    """
+    Delete an entity and everything below it (caller commits).
+
+    Returns the ids of the deleted quizzes so their caches can be dropped.
+    """
+    quiz_ids = [quiz_id for (quiz_id,) in db.session.execute(quiz_ids_select(kind, entity_id))]
+
+    # Take the attempts out of the report rollups before deleting them
+    affected_quizzes, affected_users = forget_attempts(attempt_criteria(kind, entity_id))
+    archived_quizzes, archived_users = forget_archived(archived_criteria(kind, quiz_ids, entity_id))
+    # A separate database: deleted from there after this transaction commits
+    db.session.info.setdefault('archive_deletes', []).append(archived_criteria(kind, quiz_ids, entity_id))
+
+    db.session.execute(delete(UserAnswer).where(_answer_criteria(kind, entity_id)), execution_options=NO_SYNC)
+    db.session.execute(delete(QuizAttempt).where(attempt_criteria(kind, entity_id)), execution_options=NO_SYNC)
+    db.session.execute(delete(Question).where(Question.quiz_id.in_(quiz_ids_select(kind, entity_id))), execution_options=NO_SYNC)
+    db.session.execute(delete(Quiz).where(Quiz.id.in_(quiz_ids_select(kind, entity_id))), execution_options=NO_SYNC)
+
+    if kind == 'subject':
+        db.session.execute(delete(Chapter).where(Chapter.subject_id == entity_id), execution_options=NO_SYNC)
+        db.session.execute(delete(Subject).where(Subject.id == entity_id), execution_options=NO_SYNC)
+    elif kind == 'chapter':
+        db.session.execute(delete(Chapter).where(Chapter.id == entity_id), execution_options=NO_SYNC)
+    elif kind == 'user':
+        db.session.execute(delete(User).where(User.id == entity_id), execution_options=NO_SYNC)
+
+    refresh_rollups(affected_quizzes | archived_quizzes, affected_users | archived_users)
+    if kind != 'user' or quiz_ids:
+        catalog_changed(*DELETED_TABLES[kind])
+    return quiz_ids
+
+
+@event.listens_for(Session, 'after_commit')
+def _delete_archived(session):
+    for criteria in session.info.pop('archive_deletes', []):
+        try:
+            attempt_archive.delete(criteria)
+        except Exception as e:
+            # The delete itself is committed; the weekly cleanup drops the leftovers
+            print(f"Archive delete error: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_archive_deletes(session):
+    session.info.pop('archive_deletes', None)
+
+
+class BackgroundDeleter:
+    """
+    Runs large deletes on background threads, one at a time per process.
+
+    Each delete is recorded in job_runs (job_runs.py), so any web process can
+    report its status, and holds a 'job:delete_<kind>:<id>' lease from the
+    moment it is submitted. If the process dies, the lease lapses and the run
+    is marked failed; the item stays hidden and the delete can be requested
+    again.
+    """
+
+    def __init__(self, app, on_deleted=None, batch_size=5000):
+        self.app = app
+        self.on_deleted = on_deleted
+        self.batch_size = batch_size
+        self._runs = None
+        # Only one delete works at a time, so big deletes don't compete with each other
+        self._lock = threading.Lock()
+
+    @property
+    def runs(self):
+        if self._runs is None:
+            with self.app.app_context():
+                engine = db.engine
+            self._runs = JobRuns(engine, sessionmaker(autocommit=False, autoflush=False, bind=engine))
+        return self._runs
+
+    def submit(self, kind, entity_id, requested_by=None):
+        job = f'delete_{kind}:{entity_id}'
+        run_id = self.runs.start(job, requested_by=requested_by)
+        threading.Thread(target=self._run, args=(run_id, job, kind, entity_id),
+                         name=f'background-delete-{run_id[:8]}', daemon=True).start()
+        return run_id
+
+    def pending(self, quiz_id):
+        """True if a background delete that removes the quiz is queued or running"""
+        quiz = db.session.query(Quiz.chapter_id, Chapter.subject_id, Quiz.created_by).join(
+            Chapter, Quiz.chapter_id == Chapter.id
+        ).filter(Quiz.id == quiz_id).first()
+        if quiz is None:
+            return False
+        return self.runs.any_active([
+            f'delete_quiz:{quiz_id}',
+            f'delete_chapter:{quiz.chapter_id}',
+            f'delete_subject:{quiz.subject_id}',
+            f'delete_user:{quiz.created_by}'
+        ])
+
+    def status(self, run_id):
+        # Fail the runs of processes that died first
+        self.runs.fail_abandoned()
+        run = self.runs.get(run_id)
+        return run if run and run['job'].startswith('delete_') else None
+
+    def _run(self, run_id, job, kind, entity_id):
+        lease = job_lease(self.runs.SessionLocal, job)
+        if not lease.acquire():
+            self.runs.update(run_id, status='failed', error=f'This {kind} is already being deleted',
+                             finished_at=datetime.utcnow())
+            return
+
+        try:
+            with lease.keep_alive(), self._lock, self.app.app_context():
+                self._delete(run_id, kind, entity_id)
+        finally:
+            lease.release()
+
+    def _delete(self, run_id, kind, entity_id):
+        try:
+            answers_deleted = delete_answers_in_batches(kind, entity_id, self.batch_size)
+            self.runs.update(run_id, progress=json.dumps({'answers_deleted': answers_deleted}))
+
+            quiz_ids = delete_entity(kind, entity_id)
+            db.session.commit()
+            if self.on_deleted:
+                self.on_deleted(kind, entity_id, quiz_ids)
+
+            result = {'answers_deleted': answers_deleted, 'quizzes_deleted': len(quiz_ids)}
+            self.runs.update(run_id, status='completed', result=json.dumps(result), finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            print(f"Background delete error ({kind} {entity_id}): {str(e)}")
+            self.runs.update(run_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+        finally:
+            db.session.remove()
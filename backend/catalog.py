@@ -0,0 +1,307 @@
+"""
+Catalog change counters, conditional GETs and the catalog tree cache
+
+The catalog endpoints (subjects, chapters, quizzes and questions) change
+rarely, but the dashboard fetches them on every navigation. Each catalog
+table has a change counter in catalog_versions, bumped by the admin write
+endpoints (and cascade.delete_entity) in the same transaction as the change.
+
+catalog_cached(*tables) turns the counters of the tables an endpoint reads
+into its ETag. A request whose If-None-Match still matches gets 304 Not
+Modified after one primary key lookup, without running the endpoint's
+query. Responses are sent with Cache-Control: private, max-age=
+CATALOG_MAX_AGE (default 0, i.e. revalidate every time).
+
+/api/catalog returns the whole active subject -> chapter -> quiz tree, with
+the same fields and counts as the per-level endpoints, in one response.
+catalog_cache holds it as serialized JSON together with the counters it was
+built at, in memory (CATALOG_CACHE_BACKEND=memory, the default) or on a
+Redis server shared by the API processes (CATALOG_CACHE_BACKEND=redis,
+CATALOG_CACHE_URL; needs the redis package). A session that bumped a
+counter drops the cached tree when it commits, and a tree built at other
+counters (e.g. by another process before a change) is never served.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import desc, event, func, update
+from sqlalchemy.orm import Session
+
+from models import db, CatalogVersion, Subject, Chapter, Quiz, Question
+
+CATALOG_TABLES = ('subjects', 'chapters', 'quizzes', 'questions')
+
+# Tables whose rows a cascading delete removes (a user's quizzes, for 'user')
+DELETED_TABLES = {
+    'subject': CATALOG_TABLES,
+    'chapter': ('chapters', 'quizzes', 'questions'),
+    'quiz': ('quizzes', 'questions'),
+    'user': ('quizzes', 'questions')
+}
+
+
+def ensure_versions():
+    """Create the missing counters (caller commits)"""
+    existing = {name for (name,) in db.session.query(CatalogVersion.name)}
+    for name in CATALOG_TABLES:
+        if name not in existing:
+            db.session.add(CatalogVersion(name=name, version=0))
+
+
+def catalog_changed(*tables):
+    """Bump the change counters of `tables` (caller commits with the change itself)"""
+    result = db.session.execute(
+        update(CatalogVersion).where(CatalogVersion.name.in_(tables)).values(version=CatalogVersion.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.info['catalog_changed'] = True
+    if result.rowcount < len(tables):
+        # A missing counter reads as 0, so it starts at 1
+        existing = {name for (name,) in db.session.query(CatalogVersion.name).filter(CatalogVersion.name.in_(tables))}
+        db.session.add_all(CatalogVersion(name=name, version=1) for name in tables if name not in existing)
+
+
+def catalog_versions(*tables):
+    """{table: version} for `tables`"""
+    rows = db.session.query(CatalogVersion.name, CatalogVersion.version).filter(CatalogVersion.name.in_(tables))
+    return dict(rows.all())
+
+
+def version_stamp(tables):
+    """The current counters of `tables` as a string, e.g. 'subjects:3,chapters:7'"""
+    versions = catalog_versions(*tables)
+    return ','.join(f"{name}:{versions.get(name, 0)}" for name in tables)
+
+
+def catalog_etag(tables, key):
+    """ETag of a response built from `tables` and identified by `key` (path and query string)"""
+    stamp = version_stamp(tables)
+    return hashlib.blake2b(f"{key}|{stamp}".encode(), digest_size=12).hexdigest()
+
+
+def catalog_cached(*tables):
+    """Serve a catalog GET endpoint with an ETag from the counters of `tables`"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                # Read before the endpoint runs: a change committed in between
+                # leaves an older ETag on newer data, never the other way round
+                etag = catalog_etag(tables, request.full_path)
+            except Exception as e:
+                print(f"Catalog version error: {str(e)}")
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = f"private, max-age={current_app.config.get('CATALOG_MAX_AGE', 0)}"
+            response.vary.add('Authorization')
+            return response
+        return decorated_function
+    return decorator
+
+
+def build_catalog():
+    """The active catalog tree: subjects with their active chapters, and those with their active quizzes"""
+    subjects = db.session.query(
+        Subject.id, Subject.name, Subject.description, Subject.is_active, func.count(Chapter.id)
+    ).outerjoin(Chapter).filter(
+        Subject.is_active == True
+    ).group_by(Subject.id).order_by(desc(Subject.created_at)).all()
+
+    chapters = db.session.query(
+        Chapter.id, Chapter.subject_id, Chapter.name, Chapter.description, Chapter.is_active, func.count(Quiz.id)
+    ).outerjoin(Quiz).filter(
+        Chapter.is_active == True
+    ).group_by(Chapter.id).order_by(desc(Chapter.created_at)).all()
+
+    quizzes = db.session.query(
+        Quiz.id, Quiz.chapter_id, Quiz.title, Quiz.description, Quiz.time_limit, Quiz.is_active,
+        Quiz.sample_size, Quiz.sample_by_points, func.count(Question.id)
+    ).outerjoin(Question).filter(
+        Quiz.is_active == True
+    ).group_by(Quiz.id).order_by(desc(Quiz.created_at)).all()
+
+    quizzes_by_chapter = {}
+    for quiz_id, chapter_id, title, description, time_limit, is_active, sample_size, sample_by_points, question_count in quizzes:
+        quizzes_by_chapter.setdefault(chapter_id, []).append({
+            'id': quiz_id,
+            'title': title,
+            'description': description,
+            'time_limit': time_limit,
+            'is_active': is_active,
+            'question_count': question_count,
+            'sample_size': sample_size,
+            'sample_by_points': bool(sample_by_points)
+        })
+
+    chapters_by_subject = {}
+    for chapter_id, subject_id, name, description, is_active, quiz_count in chapters:
+        chapters_by_subject.setdefault(subject_id, []).append({
+            'id': chapter_id,
+            'name': name,
+            'description': description,
+            'is_active': is_active,
+            'quiz_count': quiz_count,
+            'quizzes': quizzes_by_chapter.get(chapter_id, [])
+        })
+
+    return {
+        'subjects': [{
+            'id': subject_id,
+            'name': name,
+            'description': description,
+            'is_active': is_active,
+            'chapter_count': chapter_count,
+            'chapters': chapters_by_subject.get(subject_id, [])
+        } for subject_id, name, description, is_active, chapter_count in subjects]
+    }
+
+
+class MemoryBackend:
+    """Values kept in this process"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._values.get(key, (None, 0))
+            if value is not None and expires_at <= time.monotonic():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class RedisBackend:
+    """Values kept on a Redis server, shared by every process that uses it"""
+
+    name = 'redis'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CATALOG_CACHE_BACKEND=redis needs the redis package (pip install redis)")
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, ex=ttl)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+def cache_backend(name, url=None):
+    """Backend for CATALOG_CACHE_BACKEND: 'memory' or 'redis'"""
+    if name == 'memory':
+        return MemoryBackend()
+    if name == 'redis':
+        return RedisBackend(url)
+    raise ValueError(f"Unknown catalog cache backend: {name}")
+
+
+class CatalogCache:
+    """The serialized catalog tree, stored with the counters it was built at"""
+
+    KEY = 'quiz_app:catalog'
+
+    def __init__(self, backend=None, ttl=3600):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, builder=build_catalog):
+        """The catalog tree as JSON bytes"""
+        stamp = version_stamp(CATALOG_TABLES).encode()
+        try:
+            cached = self.backend.get(self.KEY)
+        except Exception as e:
+            print(f"Catalog cache error: {str(e)}")
+            self._count('errors')
+            cached = None
+        if cached is not None:
+            cached_stamp, _, body = cached.partition(b'\n')
+            if cached_stamp == stamp:
+                self._count('hits')
+                return body
+
+        self._count('misses')
+        # Built after reading the counters, so a concurrent change can only
+        # leave newer data under an older stamp, which is rebuilt next time
+        body = json.dumps(builder(), separators=(',', ':')).encode()
+        try:
+            self.backend.set(self.KEY, stamp + b'\n' + body, self.ttl)
+        except Exception as e:
+            print(f"Catalog cache error: {str(e)}")
+            self._count('errors')
+        return body
+
+    def invalidate(self):
+        self._count('invalidations')
+        try:
+            self.backend.delete(self.KEY)
+        except Exception as e:
+            print(f"Catalog cache error: {str(e)}")
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend.name,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'invalidations': self.invalidations,
+                'errors': self.errors
+            }
+
+
+catalog_cache = CatalogCache()
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_changed_catalog(session):
+    # Write-through: the commit that bumped a counter also drops the cached tree
+    if session.info.pop('catalog_changed', False):
+        catalog_cache.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_catalog_change(session):
+    session.info.pop('catalog_changed', None)
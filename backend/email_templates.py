@@ -0,0 +1,353 @@
+"""
+Email templates
+
+Each template is parsed once, at import, into its literal chunks and the
+names of its ${placeholders}; rendering only joins the chunks with the
+field values. Values are HTML-escaped in HTML templates unless they are
+Markup (fragments the code built itself).
+
+build_message() assembles the MIME message bytes straight from the rendered
+parts. Headers shared by every message of a run are encoded once and
+cached, and identical bodies (the admin report) are encoded once, which is
+far cheaper than building and serializing a MIMEMultipart per recipient.
+"""
+
+import base64
+import html
+import string
+import uuid
+from datetime import datetime
+from email.header import Header
+from email.utils import formataddr, parseaddr
+from functools import lru_cache
+
+
+class Markup(str):
+    """A string that is already safe HTML"""
+
+
+class CompiledTemplate:
+    """A string.Template (${name}, $name, $$) parsed once for fast rendering"""
+
+    def __init__(self, source, escape=None):
+        self.escape = escape
+        self.chunks = []
+        self.fields = []
+
+        literal = ''
+        position = 0
+        for match in string.Template.pattern.finditer(source):
+            literal += source[position:match.start()]
+            position = match.end()
+            if match.group('escaped') is not None:
+                literal += '$'
+                continue
+            field = match.group('named') or match.group('braced')
+            if field is None:
+                raise ValueError(f"Invalid placeholder at position {match.start()}")
+            self.chunks.append(literal)
+            self.fields.append(field)
+            literal = ''
+        self.chunks.append(literal + source[position:])
+
+    def render(self, values):
+        escape = self.escape
+        parts = [self.chunks[0]]
+        for field, chunk in zip(self.fields, self.chunks[1:]):
+            value = values[field]
+            if escape and not isinstance(value, Markup):
+                value = escape(str(value))
+            parts.append(str(value))
+            parts.append(chunk)
+        return ''.join(parts)
+
+
+def html_template(source):
+    return CompiledTemplate(source, escape=html.escape)
+
+
+def text_template(source):
+    return CompiledTemplate(source)
+
+
+USER_REMINDER_SUBJECT = "🎯 Don't Miss Out - New Quizzes Await You!"
+
+USER_REMINDER_HTML = html_template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f8fafc; padding: 30px; border-radius: 0 0 10px 10px; }
+        .button { display: inline-block; background: #3b82f6; color: white; padding: 12px 30px; text-decoration: none; border-radius: 6px; margin: 20px 0; }
+        .stats { background: white; padding: 20px; border-radius: 8px; margin: 20px 0; }
+        .footer { text-align: center; color: #6b7280; font-size: 14px; margin-top: 30px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🎯 Quiz App</h1>
+            <h2>We Miss You, ${username}!</h2>
+        </div>
+        <div class="content">
+            <p>Hi ${username},</p>
+
+            <p>We noticed you haven't taken any quizzes recently. There are exciting new challenges waiting for you!</p>
+
+            <div class="stats">
+                <h3>📊 Your Quiz Journey So Far:</h3>
+                <p><strong>Total Attempts:</strong> ${total_attempts}</p>
+                ${last_quiz}
+            </div>
+
+            <p>🚀 <strong>What's New:</strong></p>
+            <ul>
+                <li>Fresh quiz questions added weekly</li>
+                <li>Performance analytics to track your progress</li>
+                <li>Compete with other learners</li>
+                <li>Export your performance reports</li>
+            </ul>
+
+            <div style="text-align: center;">
+                <a href="http://localhost:5173/dashboard" class="button">🎯 Take a Quiz Now</a>
+            </div>
+
+            <p>Keep learning and growing! 📚✨</p>
+
+            <p>Best regards,<br>The Quiz App Team</p>
+        </div>
+        <div class="footer">
+            <p>This is an automated reminder. You can update your preferences in your profile settings.</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+USER_REMINDER_TEXT = text_template("""
+Hi ${username},
+
+We miss you at Quiz App! You haven't taken any quizzes recently.
+
+Your Stats:
+- Total Attempts: ${total_attempts}
+- Last Quiz: ${last_attempt}
+
+Visit http://localhost:5173/dashboard to take a quiz now!
+
+Best regards,
+The Quiz App Team
+""")
+
+LAST_QUIZ_HTML = html_template('<p><strong>Last Quiz:</strong> ${last_attempt}</p>')
+FIRST_QUIZ_HTML = Markup('<p><strong>Status:</strong> Ready for your first quiz!</p>')
+
+ADMIN_REPORT_SUBJECT = text_template('📊 Daily Quiz App Report - ${report_day}')
+
+ADMIN_REPORT_HTML = html_template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 700px; margin: 0 auto; padding: 20px; }
+        .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }
+        .content { background: #f8fafc; padding: 30px; border-radius: 0 0 10px 10px; }
+        .stats-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; margin: 20px 0; }
+        .stat-card { background: white; padding: 20px; border-radius: 8px; text-align: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .stat-number { font-size: 2em; font-weight: bold; color: #3b82f6; }
+        .stat-change { font-size: 0.9em; margin-top: 5px; }
+        .positive { color: #10b981; }
+        .negative { color: #ef4444; }
+        .neutral { color: #6b7280; }
+        .highlight { background: #dbeafe; padding: 15px; border-radius: 8px; margin: 20px 0; }
+        .footer { text-align: center; color: #6b7280; font-size: 14px; margin-top: 30px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📊 Quiz App Daily Report</h1>
+            <p>${report_date}</p>
+        </div>
+        <div class="content">
+            <h2>📈 Today's Performance</h2>
+
+            <div class="stats-grid">
+                <div class="stat-card">
+                    <div class="stat-number">${today_active_users}</div>
+                    <div>Active Users</div>
+                    <div class="stat-change ${active_users_class}">
+                        ${active_users_change}
+                    </div>
+                </div>
+
+                <div class="stat-card">
+                    <div class="stat-number">${today_total_attempts}</div>
+                    <div>Quiz Attempts</div>
+                    <div class="stat-change ${total_attempts_class}">
+                        ${total_attempts_change}
+                    </div>
+                </div>
+
+                <div class="stat-card">
+                    <div class="stat-number">${today_avg_score}%</div>
+                    <div>Average Score</div>
+                    <div class="stat-change ${avg_score_class}">
+                        ${avg_score_change}
+                    </div>
+                </div>
+
+                <div class="stat-card">
+                    <div class="stat-number">${new_users}</div>
+                    <div>New Users</div>
+                    <div class="stat-change neutral">Today</div>
+                </div>
+            </div>
+
+            <div class="highlight">
+                <h3>🏆 Top Quiz Today</h3>
+                <p><strong>${top_quiz_title}</strong></p>
+                <p>${top_quiz_attempts} attempts • ${top_quiz_avg_score}% average score</p>
+            </div>
+
+            <h3>📊 Yesterday vs Today Comparison</h3>
+            <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
+                <tr style="background: #f3f4f6;">
+                    <th style="padding: 10px; text-align: left;">Metric</th>
+                    <th style="padding: 10px; text-align: center;">Yesterday</th>
+                    <th style="padding: 10px; text-align: center;">Today</th>
+                    <th style="padding: 10px; text-align: center;">Change</th>
+                </tr>
+                <tr>
+                    <td style="padding: 10px;">Active Users</td>
+                    <td style="padding: 10px; text-align: center;">${yesterday_active_users}</td>
+                    <td style="padding: 10px; text-align: center;">${today_active_users}</td>
+                    <td style="padding: 10px; text-align: center;">${active_users_change}</td>
+                </tr>
+                <tr style="background: #f9fafb;">
+                    <td style="padding: 10px;">Quiz Attempts</td>
+                    <td style="padding: 10px; text-align: center;">${yesterday_total_attempts}</td>
+                    <td style="padding: 10px; text-align: center;">${today_total_attempts}</td>
+                    <td style="padding: 10px; text-align: center;">${total_attempts_change}</td>
+                </tr>
+                <tr>
+                    <td style="padding: 10px;">Average Score</td>
+                    <td style="padding: 10px; text-align: center;">${yesterday_avg_score}%</td>
+                    <td style="padding: 10px; text-align: center;">${today_avg_score}%</td>
+                    <td style="padding: 10px; text-align: center;">${avg_score_change}</td>
+                </tr>
+            </table>
+
+            <p>Keep up the great work managing the Quiz App! 🚀</p>
+        </div>
+        <div class="footer">
+            <p>This is an automated daily report from Quiz App Admin System.</p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+def render_user_reminder(user):
+    """(subject, html, text) of the reminder email for an inactive user"""
+    last_attempt = user['last_attempt']
+    values = {
+        'username': user['username'],
+        'total_attempts': user['total_attempts'],
+        'last_attempt': last_attempt if last_attempt else 'None yet',
+        'last_quiz': Markup(LAST_QUIZ_HTML.render({'last_attempt': last_attempt})) if last_attempt else FIRST_QUIZ_HTML
+    }
+    return USER_REMINDER_SUBJECT, USER_REMINDER_HTML.render(values), USER_REMINDER_TEXT.render(values)
+
+
+def percent_change(today, yesterday):
+    """Change from yesterday as shown in the admin report"""
+    if yesterday == 0:
+        return "New!" if today > 0 else "No change"
+    change = ((today - yesterday) / yesterday) * 100
+    if change > 0:
+        return f"+{change:.1f}%"
+    elif change < 0:
+        return f"{change:.1f}%"
+    else:
+        return "No change"
+
+
+def change_class(today, yesterday):
+    if today > yesterday:
+        return 'positive'
+    if today < yesterday:
+        return 'negative'
+    return 'neutral'
+
+
+def render_admin_report(stats, now=None):
+    """(subject, html) of the daily admin report; the same for every admin"""
+    now = now or datetime.now()
+    values = {
+        'report_day': now.strftime('%B %d, %Y'),
+        'report_date': now.strftime('%A, %B %d, %Y'),
+        'new_users': stats['new_users']
+    }
+    for day in ('today', 'yesterday'):
+        for metric, value in stats[day].items():
+            values[f'{day}_{metric}'] = value
+    for metric in ('active_users', 'total_attempts', 'avg_score'):
+        today, yesterday = stats['today'][metric], stats['yesterday'][metric]
+        values[f'{metric}_change'] = percent_change(today, yesterday)
+        values[f'{metric}_class'] = change_class(today, yesterday)
+    for key, value in stats['top_quiz'].items():
+        values[f'top_quiz_{key}'] = value
+
+    return ADMIN_REPORT_SUBJECT.render(values), ADMIN_REPORT_HTML.render(values)
+
+
+@lru_cache(maxsize=64)
+def _encoded_header(value):
+    return value if value.isascii() else Header(value, 'utf-8').encode(linesep='\r\n')
+
+
+@lru_cache(maxsize=16)
+def _encoded_from(from_email):
+    name, address = parseaddr(from_email)
+    return formataddr((name, address), charset='utf-8')
+
+
+@lru_cache(maxsize=16)
+def _encoded_part(content, subtype):
+    body = base64.encodebytes(content.encode('utf-8')).decode('ascii')
+    return (
+        f'Content-Type: text/{subtype}; charset="utf-8"\r\n'
+        'MIME-Version: 1.0\r\n'
+        'Content-Transfer-Encoding: base64\r\n'
+        '\r\n'
+        + body.replace('\n', '\r\n')
+    )
+
+
+def build_message(from_email, to_email, subject, html_content, text_content=None):
+    """
+    Raw bytes of a multipart/alternative message (text, then HTML).
+
+    Returns (envelope_from, message_bytes) for SMTP.sendmail().
+    """
+    boundary = f'=_{uuid.uuid4().hex}'
+    parts = [_encoded_part(text_content, 'plain')] if text_content else []
+    parts.append(_encoded_part(html_content, 'html'))
+
+    message = (
+        f'Content-Type: multipart/alternative; boundary="{boundary}"\r\n'
+        'MIME-Version: 1.0\r\n'
+        f'Subject: {_encoded_header(subject)}\r\n'
+        f'From: {_encoded_from(from_email)}\r\n'
+        f'To: {to_email}\r\n'
+        '\r\n'
+        + ''.join(f'--{boundary}\r\n{part}' for part in parts)
+        + f'--{boundary}--\r\n'
+    )
+    return parseaddr(from_email)[1], message.encode('ascii')
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Query Plan Check
+Runs a scripted session against a scratch SQLite database (the API through
+the Flask test client, then the jobs, the attempt archive and a rollup
+rebuild), records every statement the app sends to its database with a
+before_cursor_execute listener, and prints EXPLAIN QUERY PLAN for each
+distinct one. Fails if any of them does an unexpected full table scan.
+
+Usage: python explain_queries.py [path/to/quiz_app.db]
+
+The scripted session never touches the given database. Without a path the
+plans are checked against a fresh in-memory database built from models.py.
+That shows the plans SQLite picks for large tables; on a small database
+that has been ANALYZEd it may rightly prefer scanning a table of a few rows.
+
+A plain "SCAN <table>" is a full table scan. "SCAN <table> USING INDEX" is
+an ordered walk of an index (used with LIMIT for the paginated lists) and
+is accepted. Statements that read a whole table on purpose are listed in
+ALLOWED_SCANS with the reason they are allowed to scan.
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# (table, pattern the statement matches, reason a full scan is acceptable)
+ALLOWED_SCANS = [
+    ('chapters', r'FROM chapters LEFT OUTER JOIN quizzes .* WHERE chapters\.is_active = 1 GROUP BY',
+     'builds the whole catalog tree, cached until the catalog changes'),
+    ('quiz_report_stats', r'^SELECT .* FROM quiz_report_stats', 'rollup tables hold one row per quiz'),
+    ('user_report_stats', r'^SELECT .* FROM user_report_stats', 'rollup tables hold one row per user'),
+    ('score_bucket_stats', r'^SELECT .* FROM score_bucket_stats', 'four score buckets'),
+    ('email_outbox', r'WHERE email_outbox\.last_error IS NOT NULL ORDER BY email_outbox\.id DESC LIMIT',
+     'admin stats; newest rows first, stops after 10'),
+]
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)\b(?! USING)')
+
+# Expanded IN lists; "IN (?, ?)" and "IN (?, ?, ?)" are the same query
+PARAM_LIST = re.compile(r'\(\?(?:, \?)+\)')
+
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+class StatementLog:
+    """The distinct statements sent to one database, with the step that sent each first"""
+
+    def __init__(self, database):
+        self.database = database
+        self.step = None
+        self.statements = {}
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.step is None or conn.engine.url.database != self.database:
+            return
+        sql = ' '.join(statement.split())
+        if not sql.upper().startswith(STATEMENTS):
+            return
+        key = PARAM_LIST.sub('(?)', sql)
+        if key not in self.statements:
+            self.statements[key] = (self.step, sql, parameters[0] if executemany else parameters)
+
+    @contextmanager
+    def during(self, step):
+        self.step = step
+        try:
+            yield
+        finally:
+            self.step = None
+
+
+class Session:
+    """Test client calls that must succeed"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def call(self, method, url, headers=None, **kwargs):
+        response = self.client.open(url, method=method, headers=headers, **kwargs)
+        if response.status_code >= 300:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    def login(self, username, password):
+        body = self.call('POST', '/api/login', json={'username': username, 'password': password})
+        return body['user']['id'], {'Authorization': f"Bearer {body['access_token']}"}
+
+    def all_pages(self, url, headers):
+        """Every page of a paginated list, two rows at a time"""
+        separator = '&' if '?' in url else '?'
+        page = self.call('GET', f'{url}{separator}limit=2', headers)
+        while page.get('next_cursor'):
+            page = self.call('GET', f"{url}{separator}limit=2&cursor={page['next_cursor']}", headers)
+
+
+def run_session(log, workdir):
+    """Drive the app through the API, the jobs and the archive, recording its statements in `log`"""
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'quiz_app.db')}",
+        'ARCHIVE_DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'quiz_archive.db')}",
+        'EMAIL_DEBUG_MODE': 'true',
+        'REMINDER_BATCH_SIZE': '2'
+    })
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    import app as quiz_app
+    from archive import attempt_archive
+    from reports import rebuild_rollups
+
+    event.listen(Engine, 'before_cursor_execute', log.record)
+    quiz_app.init_db()
+    api = Session(quiz_app.app.test_client())
+
+    with log.during('login'):
+        _, admin = api.login('admin', 'admin123')
+        api.call('GET', '/api/profile', admin)
+
+    with log.during('register'):
+        students = []
+        for n in range(4):
+            api.call('POST', '/api/register', json={
+                'username': f'student{n}', 'email': f'student{n}@example.com', 'password': 'secret'
+            })
+            students.append(api.login(f'student{n}', 'secret'))
+        api.call('POST', '/api/admin/users', admin, json={
+            'username': 'teacher', 'email': 'teacher@example.com', 'password': 'secret'
+        })
+
+    with log.during('catalog writes'):
+        subject_id = api.call('POST', '/api/subjects', admin, json={'name': 'Physics'})['subject_id']
+        chapter_id = api.call('POST', '/api/chapters', admin,
+                              json={'name': 'Optics', 'subject_id': subject_id})['chapter_id']
+        quiz_ids = []
+        for n in range(3):
+            quiz_id = api.call('POST', '/api/quizzes', admin,
+                               json={'title': f'Quiz {n}', 'chapter_id': chapter_id})['quiz_id']
+            for q in range(4):
+                api.call('POST', f'/api/quizzes/{quiz_id}/questions', admin, json={
+                    'question': f'Question {q}', 'option_a': 'A', 'option_b': 'B', 'option_c': 'C',
+                    'option_d': 'D', 'correct_answer': 'ABCD'[q], 'points': q + 1
+                })
+            quiz_ids.append(quiz_id)
+        question_id = api.call('GET', f'/api/quizzes/{quiz_ids[0]}/questions', admin)[-1]['id']
+        api.call('PUT', f'/api/questions/{question_id}', admin, json={'points': 2})
+        api.call('PUT', f'/api/quizzes/{quiz_ids[1]}', admin, json={'sample_size': 2})
+        api.call('PUT', f'/api/quizzes/{quiz_ids[2]}', admin, json={'sample_size': 5, 'sample_by_points': True})
+
+    with log.during('catalog reads'):
+        api.call('GET', '/api/catalog', admin)
+        api.call('GET', '/api/subjects', admin)
+        api.call('GET', f'/api/subjects/{subject_id}/chapters', admin)
+        api.call('GET', f'/api/chapters/{chapter_id}/quizzes', admin)
+        api.call('GET', '/api/quizzes', admin)
+        api.all_pages(f'/api/quizzes?chapter_id={chapter_id}&search=Quiz', admin)
+        api.call('GET', f'/api/quizzes/{quiz_ids[0]}/questions', admin)
+
+    with log.during('start and submit'):
+        for _, headers in students:
+            for quiz_id in quiz_ids:
+                attempt = api.call('POST', f'/api/quizzes/{quiz_id}/start', headers)
+                answers = {str(question['id']): 'A' for question in attempt['questions']}
+                api.call('POST', f"/api/attempts/{attempt['attempt_id']}/submit", headers,
+                         json={'answers': answers, 'time_taken': 60})
+        # One left unsubmitted, for the archive's abandoned attempts
+        api.call('POST', f'/api/quizzes/{quiz_ids[0]}/start', students[0][1])
+
+    with log.during('attempt and user lists'):
+        headers = students[0][1]
+        api.call('GET', '/api/user/attempts', headers)
+        api.all_pages(f'/api/user/attempts?quiz_id={quiz_ids[0]}&date_range=week&search=Quiz', headers)
+        api.call('GET', f'/api/quizzes/{quiz_ids[0]}/attempts', admin)
+        api.all_pages(f'/api/quizzes/{quiz_ids[0]}/attempts?date_range=week&search=student', admin)
+        api.call('GET', '/api/admin/users', admin)
+        api.all_pages('/api/admin/users?role=user&search=student', admin)
+        api.call('PUT', f'/api/admin/users/{students[3][0]}', admin, json={'email': 'renamed@example.com'})
+
+    with log.during('reports'):
+        for engine in ('rollup', 'sql', 'python'):
+            api.call('GET', f'/api/admin/reports?engine={engine}', admin)
+        api.call('GET', '/api/admin/cache-stats', admin)
+
+    with log.during('job endpoints'):
+        api.call('GET', '/api/admin/jobs/inactive-users', admin)
+        api.call('GET', '/api/admin/jobs/daily-stats', admin)
+        api.call('GET', '/api/admin/jobs/daily-stats?days=30', admin)
+        api.call('GET', '/api/admin/jobs/outbox', admin)
+        api.call('GET', '/api/admin/jobs/runs', admin)
+
+    with quiz_app.app.app_context():
+        scheduler = quiz_app.job_scheduler()
+        with log.during('jobs'):
+            for job in ('daily_user_reminders', 'daily_admin_report', 'weekly_cleanup'):
+                scheduler.run_job(job)
+
+        with log.during('archive'):
+            attempt_archive.archive_attempts(scheduler.SessionLocal, before=datetime.utcnow() + timedelta(days=1))
+
+        with log.during('rebuild rollups'):
+            rebuild_rollups()
+            quiz_app.db.session.commit()
+
+    with log.during('reports after archiving'):
+        for engine in ('rollup', 'sql', 'python'):
+            api.call('GET', f'/api/admin/reports?engine={engine}', admin)
+        api.call('GET', '/api/user/attempts', students[0][1])
+
+    with log.during('deletes'):
+        api.call('DELETE', f'/api/questions/{question_id}', admin)
+        api.call('DELETE', f'/api/quizzes/{quiz_ids[0]}', admin)
+        api.call('DELETE', f'/api/admin/users/{students[1][0]}', admin)
+        job_id = api.call('DELETE', f'/api/chapters/{chapter_id}?background=true', admin)['job_id']
+        deadline = time.monotonic() + 30
+        while api.call('GET', f'/api/admin/deletions/{job_id}', admin)['status'] in ('queued', 'running'):
+            if time.monotonic() > deadline:
+                raise RuntimeError("The background delete did not finish")
+            time.sleep(0.05)
+        api.call('DELETE', f'/api/subjects/{subject_id}', admin)
+
+
+def explain(conn, sql, params):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[3] for row in rows]
+
+
+def allowed_scan(table, sql):
+    for allowed_table, pattern, reason in ALLOWED_SCANS:
+        if table == allowed_table and re.search(pattern, sql):
+            return reason
+    return None
+
+
+def schema_connection():
+    """In-memory database with the tables and indexes declared in models.py"""
+    from sqlalchemy import create_engine
+    from models import db
+
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+
+    conn = sqlite3.connect(':memory:')
+    with engine.connect() as source:
+        source.connection.driver_connection.backup(conn)
+    return conn
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        log = StatementLog(os.path.join(workdir, 'quiz_app.db'))
+        run_session(log, workdir)
+
+    if len(sys.argv) > 1:
+        conn = sqlite3.connect(sys.argv[1])
+    else:
+        conn = schema_connection()
+
+    unexpected = []
+    for step, sql, params in log.statements.values():
+        print(f"\n== {step}: {sql}")
+        for detail in explain(conn, sql, params):
+            match = FULL_SCAN.match(detail)
+            marker = ''
+            if match and not detail.startswith('SCAN CONSTANT'):
+                allowed = allowed_scan(match.group(1), sql)
+                if allowed:
+                    marker = f'   (full scan allowed: {allowed})'
+                else:
+                    marker = '   <-- FULL SCAN'
+                    unexpected.append((step, sql, detail))
+            print(f"   {detail}{marker}")
+
+    conn.close()
+
+    print()
+    if unexpected:
+        print(f"{len(unexpected)} unexpected full scan(s):")
+        for step, sql, detail in unexpected:
+            print(f"  - {step}: {detail}\n      {sql}")
+        sys.exit(1)
+    print(f"All {len(log.statements)} statements use indexes (or scan on purpose).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Quiz grading
+
+A quiz's answer key is held as parallel tuples of question ids, correct
+letters and points, loaded with a single column query instead of building
+one ORM object per question. Keys are kept in an in-process LRU cache that
+the question and quiz edit routes invalidate. Edits made through another
+API process are picked up from the quizzes/questions change counters
+(catalog.py), which each cache reads at most every QUIZ_CACHE_CHECK_INTERVAL
+seconds and drops all its entries when they moved. Submissions are graded against
+the key and their answers written with one executemany INSERT. An attempt
+that was given a sample of the quiz (sampling.py) is graded on those
+questions only, looked up by their position in the key.
+"""
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sqlalchemy import insert
+
+from catalog import version_stamp
+from models import db, Question, UserAnswer
+
+AnswerKey = namedtuple('AnswerKey', ['question_ids', 'correct_answers', 'points', 'positions'])
+
+
+def load_answer_key(quiz_id):
+    """Load the answer key of a quiz in question id order"""
+    rows = db.session.query(
+        Question.id, Question.correct_answer, Question.points
+    ).filter(Question.quiz_id == quiz_id).order_by(Question.id).all()
+
+    return AnswerKey(
+        question_ids=tuple(row[0] for row in rows),
+        correct_answers=tuple(row[1] for row in rows),
+        points=tuple(row[2] or 0 for row in rows),
+        positions={row[0]: position for position, row in enumerate(rows)}
+    )
+
+
+def quiz_versions():
+    """Change counters of the tables cached per quiz"""
+    return version_stamp(('quizzes', 'questions'))
+
+
+class AnswerKeyCache:
+    """
+    Thread-safe LRU cache of per-quiz values (answer keys, start payloads) keyed
+    by quiz id. `versions()` returns the change counters the values depend on;
+    it is read at most every `check_interval` seconds (None: never).
+    """
+
+    def __init__(self, maxsize=1024, versions=quiz_versions, check_interval=1.0):
+        self.maxsize = maxsize
+        self.versions = versions
+        self.check_interval = check_interval
+        self._keys = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self._stamp = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.version_changes = 0
+
+    def _check_versions(self):
+        """Drop every value if the change counters moved since the last check"""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        try:
+            stamp = self.versions()
+        except Exception as e:
+            print(f"Quiz cache version error: {str(e)}")
+            return
+        with self._lock:
+            if stamp != self._stamp:
+                if self._stamp is not None:
+                    self.version_changes += 1
+                    self._drop_all()
+                self._stamp = stamp
+
+    def _drop_all(self):
+        # Values loading right now may predate the change too (see get)
+        self._epoch += 1
+        self._keys.clear()
+
+    def get(self, quiz_id, loader=load_answer_key):
+        if self.versions is not None and self.check_interval is not None:
+            self._check_versions()
+
+        with self._lock:
+            answer_key = self._keys.get(quiz_id)
+            if answer_key is not None:
+                self._keys.move_to_end(quiz_id)
+                self.hits += 1
+                return answer_key
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(quiz_id, 0))
+
+        answer_key = loader(quiz_id)
+
+        with self._lock:
+            # Don't cache a missing quiz, or a key that was invalidated while it was loading
+            if answer_key is not None and (self._epoch, self._generations.get(quiz_id, 0)) == generation:
+                self._keys[quiz_id] = answer_key
+                self._keys.move_to_end(quiz_id)
+                while len(self._keys) > self.maxsize:
+                    self._keys.popitem(last=False)
+                    self.evictions += 1
+        return answer_key
+
+    def invalidate(self, *quiz_ids):
+        with self._lock:
+            for quiz_id in quiz_ids:
+                self._generations[quiz_id] = self._generations.get(quiz_id, 0) + 1
+                self._keys.pop(quiz_id, None)
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._drop_all()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._keys),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'version_changes': self.version_changes
+            }
+
+
+answer_key_cache = AnswerKeyCache()
+
+
+def get_answer_key(quiz_id):
+    """Answer key used for grading submissions of a quiz"""
+    return answer_key_cache.get(quiz_id)
+
+
+def invalidate_answer_keys(*quiz_ids):
+    """Drop cached answer keys after their questions changed (call after commit)"""
+    answer_key_cache.invalidate(*quiz_ids)
+
+
+def grade_answers(answer_key, answers, attempt_id, question_ids=None):
+    """
+    Grade submitted answers ({question_id: letter}) against an answer key,
+    on the questions in `question_ids` (a sampled attempt) or all of them.
+
+    Returns (score, total_points, rows) where rows are the user_answers
+    rows ready for a bulk insert.
+    """
+    score = 0
+    total_points = 0
+    rows = []
+
+    if question_ids is None:
+        entries = zip(answer_key.question_ids, answer_key.correct_answers, answer_key.points)
+    else:
+        # Questions deleted since the attempt started are left out
+        positions = [answer_key.positions[question_id] for question_id in question_ids
+                     if question_id in answer_key.positions]
+        entries = [(answer_key.question_ids[position], answer_key.correct_answers[position], answer_key.points[position])
+                   for position in positions]
+
+    for question_id, correct_answer, points in entries:
+        selected_answer = answers.get(str(question_id))
+        is_correct = selected_answer == correct_answer
+
+        if is_correct:
+            score += points
+        total_points += points
+
+        rows.append({
+            'attempt_id': attempt_id,
+            'question_id': question_id,
+            'selected_answer': selected_answer,
+            'is_correct': is_correct
+        })
+
+    return score, total_points, rows
+
+
+def save_answers(rows):
+    """Write graded answers with a single executemany INSERT (caller commits)"""
+    if rows:
+        db.session.execute(insert(UserAnswer), rows)
@@ -0,0 +1,134 @@
+"""
+Job logging
+
+Log output is set up by the process that runs jobs (worker.py, the jobs.py
+command line, or app.py when it runs the scheduler itself), never as a side
+effect of importing a module. configure_logging():
+
+- writes one JSON object per line to JOB_LOG_FILE (default jobs.log), rotated
+  by size (JOB_LOG_MAX_BYTES, default 10 MB) or, with JOB_LOG_ROTATE_WHEN
+  (e.g. 'midnight'), by time, keeping JOB_LOG_BACKUP_COUNT old files
+  (default 5);
+- echoes plain text lines to stderr;
+- puts a QueueHandler in front of both, so the thread that logs (an email
+  worker, say) only enqueues the record, and a QueueListener thread does the
+  formatting and the disk I/O.
+
+Records logged inside log_context(job=..., job_id=...) carry those fields,
+and fields passed with extra={...} (e.g. duration_ms) become JSON keys too.
+Processes in the job worker's pool send their records to the worker's
+queue (configure_child_logging()), so a single process writes and rotates
+the file.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every record has; anything else came from extra= or log_context()
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_context = contextvars.ContextVar('log_context', default={})
+_listener = None
+
+
+@contextmanager
+def log_context(**fields):
+    """Add `fields` to every record logged in this context (threads need contextvars.copy_context())"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copies the log_context() fields onto records, in the thread that logs them"""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def file_handler(path=None):
+    """Rotating JSON lines handler for the job log"""
+    path = path or os.getenv('JOB_LOG_FILE', 'jobs.log')
+    backups = int(os.getenv('JOB_LOG_BACKUP_COUNT', '5'))
+    when = os.getenv('JOB_LOG_ROTATE_WHEN')
+    if when:
+        handler = TimedRotatingFileHandler(path, when=when, backupCount=backups, utc=True, delay=True)
+    else:
+        handler = RotatingFileHandler(path, maxBytes=int(os.getenv('JOB_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                                      backupCount=backups, delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _route_to(log_queue, level=None):
+    """Make the root logger hand every record to `log_queue`"""
+    handler = QueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level or os.getenv('JOB_LOG_LEVEL', 'INFO').upper())
+
+
+def configure_logging(log_queue=None, level=None):
+    """
+    Log to the rotating job log and stderr from a background listener.
+    Returns the queue records go through; calling it again reuses it.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener.queue
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    log_queue = log_queue if log_queue is not None else queue.SimpleQueue()
+    _listener = QueueListener(log_queue, file_handler(), console)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    _route_to(log_queue, level)
+    return log_queue
+
+
+def configure_child_logging(log_queue, level=None):
+    """Pool process initializer: send records to the parent's listener (a multiprocessing queue)"""
+    _route_to(log_queue, level)
+
+
+def stop_logging():
+    """Write out queued records and stop the listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,227 @@
+"""
+Job runs requested from the admin API
+
+POST /api/admin/jobs/<job> only records a queued row in job_runs and returns
+its id. The job worker (worker.py) picks queued runs up and runs them in its
+process pool; when no worker is running, the web server runs the job on a
+background thread instead. Either way the running job writes its progress
+to the row, so any web process can answer GET /api/admin/jobs/runs/<id>.
+Background deletes (cascade.py) record their runs here as well, but run
+on the web process that took the request.
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from job_logging import log_context
+from lease import Lease
+from models import JobLease, JobRun
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ('queued', 'running')
+
+# Held by the job worker that schedules jobs (see worker.py)
+LEADER_LEASE = 'scheduler'
+
+
+def leader_lease(session_factory):
+    return Lease(session_factory, LEADER_LEASE, ttl=int(os.getenv('SCHEDULER_LEASE_TTL', '60')))
+
+
+def job_lease(session_factory, name):
+    return Lease(session_factory, f'job:{name}', ttl=int(os.getenv('JOB_LEASE_TTL', '300')))
+
+
+class JobRuns:
+    def __init__(self, engine, session_factory):
+        self.engine = engine
+        self.SessionLocal = session_factory
+        self._table_ready = False
+
+    def ensure_table(self):
+        if not self._table_ready:
+            JobRun.__table__.create(self.engine, checkfirst=True)
+            JobLease.__table__.create(self.engine, checkfirst=True)
+            self._table_ready = True
+
+    @staticmethod
+    def to_dict(run):
+        finished_or_now = run.finished_at or datetime.utcnow()
+        return {
+            'job_id': run.id,
+            'job': run.job,
+            'status': run.status,
+            'progress': json.loads(run.progress) if run.progress else {},
+            'result': json.loads(run.result) if run.result else None,
+            'error': run.error,
+            'requested_by': run.requested_by,
+            'queued_at': run.queued_at.isoformat() if run.queued_at else None,
+            'started_at': run.started_at.isoformat() if run.started_at else None,
+            'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+            'duration_seconds': round((finished_or_now - run.started_at).total_seconds(), 2) if run.started_at else None
+        }
+
+    def request(self, job, requested_by=None):
+        """Queue a run of `job`; returns (run, created). A queued or running run of the same job is reused."""
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            active = session.query(JobRun).filter(
+                JobRun.job == job,
+                JobRun.status.in_(ACTIVE)
+            ).order_by(JobRun.queued_at.desc()).first()
+            if active:
+                return self.to_dict(active), False
+
+            run = JobRun(id=uuid.uuid4().hex, job=job, requested_by=requested_by, queued_at=datetime.utcnow())
+            session.add(run)
+            session.commit()
+            return self.to_dict(run), True
+        finally:
+            session.close()
+
+    def start(self, job, requested_by=None):
+        """Record a run of `job` that this process runs itself (e.g. a background delete); returns its id"""
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            now = datetime.utcnow()
+            run = JobRun(id=uuid.uuid4().hex, job=job, status='running', requested_by=requested_by,
+                         queued_at=now, started_at=now)
+            session.add(run)
+            session.commit()
+            return run.id
+        finally:
+            session.close()
+
+    def get(self, run_id):
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            run = session.get(JobRun, run_id)
+            return self.to_dict(run) if run else None
+        finally:
+            session.close()
+
+    def any_active(self, jobs):
+        """True if a run of any of `jobs` is queued or running"""
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            return session.query(JobRun.id).filter(JobRun.job.in_(jobs), JobRun.status.in_(ACTIVE)).first() is not None
+        finally:
+            session.close()
+
+    def recent(self, limit=20):
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            runs = session.query(JobRun).order_by(JobRun.queued_at.desc()).limit(limit).all()
+            return [self.to_dict(run) for run in runs]
+        finally:
+            session.close()
+
+    def claim(self, run_id=None):
+        """Mark the given (or the oldest) queued run as running; returns (run_id, job) or None"""
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            query = session.query(JobRun.id, JobRun.job).filter(JobRun.status == 'queued')
+            if run_id:
+                query = query.filter(JobRun.id == run_id)
+            row = query.order_by(JobRun.queued_at).first()
+            if not row:
+                return None
+
+            # Only one process gets past the status check
+            claimed = session.execute(
+                update(JobRun)
+                .where(JobRun.id == row.id, JobRun.status == 'queued')
+                .values(status='running', started_at=datetime.utcnow()),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            session.commit()
+            return (row.id, row.job) if claimed else None
+        finally:
+            session.close()
+
+    def update(self, run_id, **fields):
+        session = self.SessionLocal()
+        try:
+            session.query(JobRun).filter(JobRun.id == run_id).update(fields, synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def worker_running(self):
+        """True if a job worker currently holds the leader lease"""
+        self.ensure_table()
+        return leader_lease(self.SessionLocal).holder() is not None
+
+    def run_in_background(self, scheduler, run_id, job):
+        """Claim and run a queued run on a thread of this process (when no job worker is up)"""
+        def target():
+            if self.claim(run_id):
+                self.execute(scheduler, run_id, job)
+
+        threading.Thread(target=target, name=f'job-{job}', daemon=True).start()
+
+    def fail_abandoned(self, grace=60):
+        """Fail running runs whose job lease has lapsed, i.e. the process running them died"""
+        self.ensure_table()
+        session = self.SessionLocal()
+        try:
+            running = session.query(JobRun.id, JobRun.job).filter(
+                JobRun.status == 'running',
+                JobRun.started_at < datetime.utcnow() - timedelta(seconds=grace)
+            ).all()
+        finally:
+            session.close()
+
+        for run_id, job in running:
+            if job_lease(self.SessionLocal, job).holder() is None:
+                self.update(run_id, status='failed', error='The job stopped before it finished',
+                            finished_at=datetime.utcnow())
+
+    def execute(self, scheduler, run_id, job):
+        """Run a claimed run of `job` on `scheduler`, recording progress and the outcome"""
+        progress = {}
+
+        def report(**fields):
+            progress.update(fields)
+            self.update(run_id, progress=json.dumps(progress))
+
+        try:
+            with log_context(job_id=run_id):
+                result = run_job(scheduler, job, progress=report)
+        except Exception as e:
+            logger.error("Job run %s (%s) failed: %s", run_id, job, e)
+            self.update(run_id, status='failed', error=str(e), finished_at=datetime.utcnow())
+            return None
+
+        if result is None:
+            self.update(run_id, status='skipped', error='The job is already running elsewhere',
+                        finished_at=datetime.utcnow())
+        else:
+            self.update(run_id, status='completed', result=json.dumps(result), finished_at=datetime.utcnow())
+        return result
+
+
+def run_job(scheduler, name, progress=None):
+    """Run a job unless another process is already running it; returns its result (None if skipped)"""
+    lease = job_lease(scheduler.SessionLocal, name)
+    if not lease.acquire():
+        logger.info("Job %s is already running elsewhere - skipping", name)
+        return None
+    try:
+        with lease.keep_alive():
+            return scheduler.run_job(name, progress=progress)
+    finally:
+        lease.release()
@@ -1,6 +1,3 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 import schedule
 import time
@@ -8,21 +5,25 @@ import threading
 import os
 from dotenv import load_dotenv
 import logging
-from sqlalchemy import create_engine, text
+from sqlalchemy import func, or_
 from sqlalchemy.orm import sessionmaker
-from models import User, Quiz, QuizAttempt
+from models import User, QuizAttempt
+from database import create_db_engine
+from mailer import SMTPConnectionPool, PermanentSendError
+from outbox import Outbox
+from job_runs import JobRuns
+from archive import attempt_archive
+from activity_stats import compute_stats, day_start, stats_cache
+from email_templates import build_message, render_user_reminder, render_admin_report
+from job_logging import configure_logging, log_context
 
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('jobs.log'),
-        logging.StreamHandler()
-    ]
-)
+# Output is configured by whoever runs the jobs (see job_logging.py)
+logger = logging.getLogger('jobs')
+
+def report_nothing(**fields):
+    """Default progress callback"""
 
 class EmailService:
     def __init__(self):
@@ -32,6 +33,17 @@ class EmailService:
         self.email_password = os.getenv('EMAIL_PASSWORD', 'your-app-password')
         self.from_email = os.getenv('FROM_EMAIL', 'Quiz App <noreply@quizapp.com>')
         self.debug_mode = os.getenv('EMAIL_DEBUG_MODE', 'false').lower() == 'true'
+        self.use_tls = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
+        
+        # Authenticated connections are reused across messages
+        self.pool = SMTPConnectionPool(
+            self.smtp_server, self.smtp_port,
+            self.email_user, self.email_password,
+            use_tls=self.use_tls,
+            size=int(os.getenv('SMTP_POOL_SIZE', '4'))
+        )
+        self.workers = int(os.getenv('EMAIL_WORKERS', '4'))
+        self.rate_limit = float(os.getenv('EMAIL_RATE_LIMIT', '5'))  # messages per second
     
     def is_valid_email(self, email):
         """Basic email validation"""
@@ -39,64 +51,87 @@ class EmailService:
         pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
         return re.match(pattern, email) is not None
     
+    def deliver(self, to_email, subject, html_content, text_content=None):
+        """Send an email with HTML content; raises if it could not be sent"""
+        # Validate email address
+        if not self.is_valid_email(to_email):
+            raise PermanentSendError(f"Invalid email address: {to_email}")
+        
+        # Debug mode - just log instead of sending
+        if self.debug_mode:
+            logger.debug("[DEBUG MODE] Would send email to %s: %s", to_email, subject)
+            return
+        
+        # Check if email configuration is set up
+        if (self.email_user == 'your-email@gmail.com' or 
+            self.email_password == 'your-app-password'):
+            raise RuntimeError("Email not configured properly. Set EMAIL_DEBUG_MODE=true to test without sending real emails.")
+        
+        # Text version (if provided) and HTML version
+        envelope_from, message = build_message(self.from_email, to_email, subject, html_content, text_content)
+        
+        # Send email over a pooled connection
+        self.pool.sendmail(envelope_from, [to_email], message)
+        
+        logger.debug("Email sent successfully to %s", to_email)
+    
     def send_email(self, to_email, subject, html_content, text_content=None):
         """Send an email with HTML content"""
         try:
-            # Validate email address
-            if not self.is_valid_email(to_email):
-                logging.warning(f"Invalid email address: {to_email} - skipping")
-                return False
-            
-            # Debug mode - just log instead of sending
-            if self.debug_mode:
-                logging.info(f"[DEBUG MODE] Would send email to {to_email}")
-                logging.info(f"[DEBUG MODE] Subject: {subject}")
-                logging.info(f"[DEBUG MODE] Email content logged successfully")
-                return True
-            
-            # Check if email configuration is set up
-            if (self.email_user == 'your-email@gmail.com' or 
-                self.email_password == 'your-app-password'):
-                logging.warning("Email not configured properly. Set EMAIL_DEBUG_MODE=true to test without sending real emails.")
-                return False
-            
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            
-            # Add text version if provided
-            if text_content:
-                text_part = MIMEText(text_content, 'plain')
-                msg.attach(text_part)
-            
-            # Add HTML version
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_user, self.email_password)
-                server.send_message(msg)
-            
-            logging.info(f"Email sent successfully to {to_email}")
+            self.deliver(to_email, subject, html_content, text_content)
             return True
             
+        except PermanentSendError as e:
+            logger.warning("%s - skipping", e)
+            return False
         except Exception as e:
-            logging.error(f"Failed to send email to {to_email}: {str(e)}")
+            logger.error("Failed to send email to %s: %s", to_email, e)
             return False
 
+# Jobs that can be scheduled or run by name (see worker.py)
+JOBS = ('daily_user_reminders', 'daily_admin_report', 'weekly_cleanup', 'drain_outbox')
+
 class JobScheduler:
-    def __init__(self):
+    def __init__(self, engine=None):
         self.email_service = EmailService()
         self.running = False
         self.thread = None
+        self.user_batch_size = int(os.getenv('REMINDER_BATCH_SIZE', '500'))
         
         # Initialize database connection
-        database_url = 'sqlite:///instance/quiz_app.db'
-        self.engine = create_engine(database_url)
+        self.use_engine(engine or create_db_engine())
+    
+    def use_engine(self, engine):
+        """Run the jobs on `engine` (app.py shares the web app's engine)"""
+        self.engine = engine
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.outbox = Outbox(self.engine, self.SessionLocal)
+        self.runs = JobRuns(self.engine, self.SessionLocal)
+    
+    def inactive_users_query(self, session, cutoff_date):
+        """Users (id, username, email, last_attempt, total_attempts) with no quiz since cutoff_date"""
+        return session.query(
+            User.id, User.username, User.email,
+            func.max(QuizAttempt.completed_at),
+            func.count(QuizAttempt.id)
+        ).outerjoin(
+            QuizAttempt, User.id == QuizAttempt.user_id
+        ).filter(
+            User.role == 'user',
+            or_(QuizAttempt.completed_at.is_(None), QuizAttempt.completed_at < cutoff_date)
+        ).group_by(
+            User.id, User.username, User.email
+        )
+    
+    @staticmethod
+    def inactive_user(row):
+        return {
+            'id': row[0],
+            'username': row[1],
+            'email': row[2],
+            'last_attempt': str(row[3]) if row[3] else None,
+            'total_attempts': row[4]
+        }
     
     def get_inactive_users(self, days=7):
         """Get users who haven't taken a quiz in the last N days"""
@@ -105,105 +140,72 @@ class JobScheduler:
             # Get users who haven't taken a quiz in the last N days
             cutoff_date = datetime.utcnow() - timedelta(days=days)
             
-            # Raw SQL query using SQLAlchemy text
-            query = text('''
-                SELECT u.id, u.username, u.email, 
-                       MAX(qa.completed_at) as last_attempt,
-                       COUNT(qa.id) as total_attempts
-                FROM users u
-                LEFT JOIN quiz_attempts qa ON u.id = qa.user_id
-                WHERE u.role = 'user'
-                AND (qa.completed_at IS NULL OR qa.completed_at < :cutoff_date)
-                GROUP BY u.id, u.username, u.email
-                ORDER BY last_attempt ASC
-            ''')
-            
-            result = session.execute(query, {'cutoff_date': cutoff_date})
-            users = result.fetchall()
+            users = self.inactive_users_query(session, cutoff_date).order_by(
+                func.max(QuizAttempt.completed_at).asc().nullsfirst()
+            ).all()
             
-            return [
-                {
-                    'id': user[0],
-                    'username': user[1],
-                    'email': user[2],
-                    'last_attempt': user[3],
-                    'total_attempts': user[4]
-                }
-                for user in users
-            ]
+            return [self.inactive_user(user) for user in users]
         finally:
             session.close()
     
-    def get_daily_stats(self):
-        """Get daily statistics for admin reports"""
-        session = self.SessionLocal()
-        try:
-            # Get today's stats
-            today_query = text('''
-                SELECT 
-                    COUNT(DISTINCT qa.user_id) as active_users,
-                    COUNT(qa.id) as total_attempts,
-                    AVG(CAST(qa.score AS FLOAT) / qa.total_questions * 100) as avg_score,
-                    COUNT(DISTINCT qa.quiz_id) as quizzes_taken
-                FROM quiz_attempts qa
-                WHERE DATE(qa.completed_at) = DATE('now')
-            ''')
-            today_result = session.execute(today_query).fetchone()
-            
-            # Get yesterday's stats for comparison
-            yesterday_query = text('''
-                SELECT 
-                    COUNT(DISTINCT qa.user_id) as active_users,
-                    COUNT(qa.id) as total_attempts,
-                    AVG(CAST(qa.score AS FLOAT) / qa.total_questions * 100) as avg_score,
-                    COUNT(DISTINCT qa.quiz_id) as quizzes_taken
-                FROM quiz_attempts qa
-                WHERE DATE(qa.completed_at) = DATE('now', '-1 day')
-            ''')
-            yesterday_result = session.execute(yesterday_query).fetchone()
-            
-            # Get new users today
-            new_users_query = text('''
-                SELECT COUNT(*) FROM users 
-                WHERE DATE(created_at) = DATE('now')
-            ''')
-            new_users = session.execute(new_users_query).fetchone()[0]
+    def iter_inactive_users(self, days=7, batch_size=None):
+        """
+        Yield users who haven't taken a quiz in the last N days, in id order.
+        
+        Users are fetched in keyset batches (id > last id seen), each in its
+        own short session, so memory stays flat however many users there are
+        and the first users are available before the last batch is read.
+        """
+        batch_size = batch_size or self.user_batch_size
+        cutoff_date = datetime.utcnow() - timedelta(days=days)
+        last_id = 0
+        
+        while True:
+            session = self.SessionLocal()
+            try:
+                # Pick the next id range first so only its attempts are aggregated
+                user_ids = [user_id for (user_id,) in session.query(User.id).filter(
+                    User.role == 'user',
+                    User.id > last_id
+                ).order_by(User.id).limit(batch_size)]
+                
+                if not user_ids:
+                    return
+                
+                rows = self.inactive_users_query(session, cutoff_date).filter(
+                    User.id.between(user_ids[0], user_ids[-1])
+                ).order_by(User.id).all()
+            finally:
+                session.close()
             
-            # Get top performing quiz today
-            top_quiz_query = text('''
-                SELECT q.title, COUNT(qa.id) as attempts,
-                       AVG(CAST(qa.score AS FLOAT) / qa.total_questions * 100) as avg_score
-                FROM quiz_attempts qa
-                JOIN quizzes q ON qa.quiz_id = q.id
-                WHERE DATE(qa.completed_at) = DATE('now')
-                GROUP BY q.id, q.title
-                ORDER BY attempts DESC, avg_score DESC
-                LIMIT 1
-            ''')
-            top_quiz_result = session.execute(top_quiz_query).fetchone()
+            for row in rows:
+                yield self.inactive_user(row)
             
-            return {
-                'today': {
-                    'active_users': today_result[0] or 0,
-                    'total_attempts': today_result[1] or 0,
-                    'avg_score': round(today_result[2], 2) if today_result[2] else 0,
-                    'quizzes_taken': today_result[3] or 0
-                },
-                'yesterday': {
-                    'active_users': yesterday_result[0] or 0,
-                    'total_attempts': yesterday_result[1] or 0,
-                    'avg_score': round(yesterday_result[2], 2) if yesterday_result[2] else 0,
-                    'quizzes_taken': yesterday_result[3] or 0
-                },
-                'new_users': new_users,
-                'top_quiz': {
-                    'title': top_quiz_result[0] if top_quiz_result else 'No quizzes taken',
-                    'attempts': top_quiz_result[1] if top_quiz_result else 0,
-                    'avg_score': round(top_quiz_result[2], 2) if top_quiz_result and top_quiz_result[2] else 0
-                }
-            }
-        finally:
-            session.close()
+            if len(user_ids) < batch_size:
+                return
+            last_id = user_ids[-1]
+    
+    def get_stats(self, start, end):
+        """Statistics for [start, end) and the window before it, cached briefly (see activity_stats.py)"""
+        def compute():
+            session = self.SessionLocal()
+            try:
+                return compute_stats(session, start, end)
+            finally:
+                session.close()
+        
+        return stats_cache.get((str(self.engine.url), start, end), compute)
+    
+    def get_daily_stats(self):
+        """Get daily statistics for admin reports"""
+        # Day boundaries are computed here (UTC) and compared as plain ranges
+        today_start = day_start(datetime.utcnow())
+        stats = self.get_stats(today_start, today_start + timedelta(days=1))
+        
+        # Today vs yesterday, as the admin report shows them
+        stats['today'] = stats['current']
+        stats['yesterday'] = stats['previous']
+        return stats
     
     def get_admin_emails(self):
         """Get all admin email addresses (only valid ones)"""
@@ -217,7 +219,7 @@ class JobScheduler:
             
             if len(valid_emails) != len(all_emails):
                 invalid_emails = [email for email in all_emails if not self.email_service.is_valid_email(email)]
-                logging.warning(f"Found {len(invalid_emails)} invalid admin emails: {invalid_emails}")
+                logger.warning("Found %d invalid admin emails: %s", len(invalid_emails), invalid_emails)
             
             return valid_emails
         finally:
@@ -225,278 +227,153 @@ class JobScheduler:
     
     def send_user_reminder(self, user):
         """Send reminder email to inactive user"""
-        subject = "🎯 Don't Miss Out - New Quizzes Await You!"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f8fafc; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .button {{ display: inline-block; background: #3b82f6; color: white; padding: 12px 30px; text-decoration: none; border-radius: 6px; margin: 20px 0; }}
-                .stats {{ background: white; padding: 20px; border-radius: 8px; margin: 20px 0; }}
-                .footer {{ text-align: center; color: #6b7280; font-size: 14px; margin-top: 30px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>🎯 Quiz App</h1>
-                    <h2>We Miss You, {user['username']}!</h2>
-                </div>
-                <div class="content">
-                    <p>Hi {user['username']},</p>
-                    
-                    <p>We noticed you haven't taken any quizzes recently. There are exciting new challenges waiting for you!</p>
-                    
-                    <div class="stats">
-                        <h3>📊 Your Quiz Journey So Far:</h3>
-                        <p><strong>Total Attempts:</strong> {user['total_attempts']}</p>
-                        {f"<p><strong>Last Quiz:</strong> {user['last_attempt']}</p>" if user['last_attempt'] else "<p><strong>Status:</strong> Ready for your first quiz!</p>"}
-                    </div>
-                    
-                    <p>🚀 <strong>What's New:</strong></p>
-                    <ul>
-                        <li>Fresh quiz questions added weekly</li>
-                        <li>Performance analytics to track your progress</li>
-                        <li>Compete with other learners</li>
-                        <li>Export your performance reports</li>
-                    </ul>
-                    
-                    <div style="text-align: center;">
-                        <a href="http://localhost:5173/dashboard" class="button">🎯 Take a Quiz Now</a>
-                    </div>
-                    
-                    <p>Keep learning and growing! 📚✨</p>
-                    
-                    <p>Best regards,<br>The Quiz App Team</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated reminder. You can update your preferences in your profile settings.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        text_content = f"""
-        Hi {user['username']},
-        
-        We miss you at Quiz App! You haven't taken any quizzes recently.
-        
-        Your Stats:
-        - Total Attempts: {user['total_attempts']}
-        - Last Quiz: {user['last_attempt'] if user['last_attempt'] else 'None yet'}
-        
-        Visit http://localhost:5173/dashboard to take a quiz now!
-        
-        Best regards,
-        The Quiz App Team
-        """
-        
-        return self.email_service.send_email(user['email'], subject, html_content, text_content)
+        return self.email_service.send_email(*self.user_reminder_message(user))
+    
+    def user_reminder_message(self, user):
+        """Reminder email for an inactive user as (to_email, subject, html, text)"""
+        return (user['email'],) + render_user_reminder(user)
     
     def send_admin_daily_report(self, admin_email, stats):
         """Send daily report to admin"""
-        subject = f"📊 Daily Quiz App Report - {datetime.now().strftime('%B %d, %Y')}"
-        
-        # Calculate changes from yesterday
-        def get_change(today, yesterday):
-            if yesterday == 0:
-                return "New!" if today > 0 else "No change"
-            change = ((today - yesterday) / yesterday) * 100
-            if change > 0:
-                return f"+{change:.1f}%"
-            elif change < 0:
-                return f"{change:.1f}%"
-            else:
-                return "No change"
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 700px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f8fafc; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .stats-grid {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 20px; margin: 20px 0; }}
-                .stat-card {{ background: white; padding: 20px; border-radius: 8px; text-align: center; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-                .stat-number {{ font-size: 2em; font-weight: bold; color: #3b82f6; }}
-                .stat-change {{ font-size: 0.9em; margin-top: 5px; }}
-                .positive {{ color: #10b981; }}
-                .negative {{ color: #ef4444; }}
-                .neutral {{ color: #6b7280; }}
-                .highlight {{ background: #dbeafe; padding: 15px; border-radius: 8px; margin: 20px 0; }}
-                .footer {{ text-align: center; color: #6b7280; font-size: 14px; margin-top: 30px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📊 Quiz App Daily Report</h1>
-                    <p>{datetime.now().strftime('%A, %B %d, %Y')}</p>
-                </div>
-                <div class="content">
-                    <h2>📈 Today's Performance</h2>
-                    
-                    <div class="stats-grid">
-                        <div class="stat-card">
-                            <div class="stat-number">{stats['today']['active_users']}</div>
-                            <div>Active Users</div>
-                            <div class="stat-change {'positive' if stats['today']['active_users'] > stats['yesterday']['active_users'] else 'negative' if stats['today']['active_users'] < stats['yesterday']['active_users'] else 'neutral'}">
-                                {get_change(stats['today']['active_users'], stats['yesterday']['active_users'])}
-                            </div>
-                        </div>
-                        
-                        <div class="stat-card">
-                            <div class="stat-number">{stats['today']['total_attempts']}</div>
-                            <div>Quiz Attempts</div>
-                            <div class="stat-change {'positive' if stats['today']['total_attempts'] > stats['yesterday']['total_attempts'] else 'negative' if stats['today']['total_attempts'] < stats['yesterday']['total_attempts'] else 'neutral'}">
-                                {get_change(stats['today']['total_attempts'], stats['yesterday']['total_attempts'])}
-                            </div>
-                        </div>
-                        
-                        <div class="stat-card">
-                            <div class="stat-number">{stats['today']['avg_score']}%</div>
-                            <div>Average Score</div>
-                            <div class="stat-change {'positive' if stats['today']['avg_score'] > stats['yesterday']['avg_score'] else 'negative' if stats['today']['avg_score'] < stats['yesterday']['avg_score'] else 'neutral'}">
-                                {get_change(stats['today']['avg_score'], stats['yesterday']['avg_score'])}
-                            </div>
-                        </div>
-                        
-                        <div class="stat-card">
-                            <div class="stat-number">{stats['new_users']}</div>
-                            <div>New Users</div>
-                            <div class="stat-change neutral">Today</div>
-                        </div>
-                    </div>
-                    
-                    <div class="highlight">
-                        <h3>🏆 Top Quiz Today</h3>
-                        <p><strong>{stats['top_quiz']['title']}</strong></p>
-                        <p>{stats['top_quiz']['attempts']} attempts • {stats['top_quiz']['avg_score']}% average score</p>
-                    </div>
-                    
-                    <h3>📊 Yesterday vs Today Comparison</h3>
-                    <table style="width: 100%; border-collapse: collapse; margin: 20px 0;">
-                        <tr style="background: #f3f4f6;">
-                            <th style="padding: 10px; text-align: left;">Metric</th>
-                            <th style="padding: 10px; text-align: center;">Yesterday</th>
-                            <th style="padding: 10px; text-align: center;">Today</th>
-                            <th style="padding: 10px; text-align: center;">Change</th>
-                        </tr>
-                        <tr>
-                            <td style="padding: 10px;">Active Users</td>
-                            <td style="padding: 10px; text-align: center;">{stats['yesterday']['active_users']}</td>
-                            <td style="padding: 10px; text-align: center;">{stats['today']['active_users']}</td>
-                            <td style="padding: 10px; text-align: center;">{get_change(stats['today']['active_users'], stats['yesterday']['active_users'])}</td>
-                        </tr>
-                        <tr style="background: #f9fafb;">
-                            <td style="padding: 10px;">Quiz Attempts</td>
-                            <td style="padding: 10px; text-align: center;">{stats['yesterday']['total_attempts']}</td>
-                            <td style="padding: 10px; text-align: center;">{stats['today']['total_attempts']}</td>
-                            <td style="padding: 10px; text-align: center;">{get_change(stats['today']['total_attempts'], stats['yesterday']['total_attempts'])}</td>
-                        </tr>
-                        <tr>
-                            <td style="padding: 10px;">Average Score</td>
-                            <td style="padding: 10px; text-align: center;">{stats['yesterday']['avg_score']}%</td>
-                            <td style="padding: 10px; text-align: center;">{stats['today']['avg_score']}%</td>
-                            <td style="padding: 10px; text-align: center;">{get_change(stats['today']['avg_score'], stats['yesterday']['avg_score'])}</td>
-                        </tr>
-                    </table>
-                    
-                    <p>Keep up the great work managing the Quiz App! 🚀</p>
-                </div>
-                <div class="footer">
-                    <p>This is an automated daily report from Quiz App Admin System.</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        return self.email_service.send_email(admin_email, subject, html_content)
+        return self.email_service.send_email(*self.admin_report_message(admin_email, stats))
+    
+    def admin_report_message(self, admin_email, stats):
+        """Daily report email for an admin as (to_email, subject, html, text)"""
+        subject, html_content = render_admin_report(stats)
+        return admin_email, subject, html_content, None
+    
+    def drain_outbox(self, progress=None):
+        """Send due outbox emails: new ones, retries and any left over by an interrupted run"""
+        try:
+            # Rate limited by the email service instead of sleeping between messages
+            return self.outbox.drain(
+                self.email_service.deliver,
+                workers=self.email_service.workers,
+                rate=self.email_service.rate_limit,
+                progress=progress
+            )
+        finally:
+            # Don't hold connections open until the next run
+            self.email_service.pool.close()
     
-    def daily_user_reminders(self):
+    def daily_user_reminders(self, progress=None):
         """Send reminders to inactive users"""
-        logging.info("Starting daily user reminders job...")
+        logger.info("Starting daily user reminders job...")
+        progress = progress or report_nothing
         
-        inactive_users = self.get_inactive_users(days=7)
-        sent_count = 0
+        inactive_count = 0
         
-        for user in inactive_users:
-            if self.send_user_reminder(user):
-                sent_count += 1
-            time.sleep(1)  # Rate limiting
+        # Users stream in batches straight into the outbox
+        def reminders():
+            nonlocal inactive_count
+            for user in self.iter_inactive_users(days=7):
+                inactive_count += 1
+                if inactive_count % self.user_batch_size == 0:
+                    progress(stage='queueing', inactive_users=inactive_count)
+                yield user['email'], user
         
-        logging.info(f"Daily user reminders completed. Sent {sent_count} emails to {len(inactive_users)} inactive users.")
+        # One reminder per user per day; rerunning the job only sends what is still pending
+        run_key = f"daily_user_reminders:{datetime.utcnow().date()}"
+        queued = self.outbox.enqueue(run_key, 'user_reminder', reminders())
+        progress(stage='sending', inactive_users=inactive_count, queued=queued)
+        sent_count, failed_count = self.drain_outbox(progress=progress)
+        
+        logger.info("Daily user reminders completed. Queued %d of %d inactive users; sent %d emails, %d failed.",
+                    queued, inactive_count, sent_count, failed_count,
+                    extra={'inactive_users': inactive_count, 'queued': queued, 'sent': sent_count, 'failed': failed_count})
         return sent_count
     
-    def daily_admin_report(self):
+    def daily_admin_report(self, progress=None):
         """Send daily report to admins"""
-        logging.info("Starting daily admin report job...")
+        logger.info("Starting daily admin report job...")
+        progress = progress or report_nothing
         
         stats = self.get_daily_stats()
         admin_emails = self.get_admin_emails()
-        sent_count = 0
         
-        logging.info(f"Found {len(admin_emails)} valid admin emails: {admin_emails}")
+        logger.info("Found %d valid admin emails: %s", len(admin_emails), admin_emails)
         
-        for email in admin_emails:
-            if self.send_admin_daily_report(email, stats):
-                sent_count += 1
-            time.sleep(1)  # Rate limiting
+        # Every admin gets the same payload, so the report is rendered once per outbox batch
+        run_key = f"daily_admin_report:{datetime.utcnow().date()}"
+        queued = self.outbox.enqueue(run_key, 'admin_report', ((email, stats) for email in admin_emails))
+        progress(stage='sending', admins=len(admin_emails), queued=queued)
+        sent_count, failed_count = self.drain_outbox(progress=progress)
         
-        logging.info(f"Daily admin report completed. Sent {sent_count} emails to {len(admin_emails)} admins.")
+        logger.info("Daily admin report completed. Queued %d reports for %d admins; sent %d emails, %d failed.",
+                    queued, len(admin_emails), sent_count, failed_count,
+                    extra={'admins': len(admin_emails), 'queued': queued, 'sent': sent_count, 'failed': failed_count})
         return sent_count
     
-    def weekly_cleanup(self):
-        """Clean up old logs and temporary data"""
-        logging.info("Starting weekly cleanup job...")
+    def weekly_cleanup(self, progress=None):
+        """
+        Archive old quiz attempts and clean up temporary data (job logs rotate on
+        their own). Errors propagate, so the run is recorded as failed.
+        """
+        logger.info("Starting weekly cleanup job...")
+        progress = progress or report_nothing
+        
+        # Attempts past the retention window move to the archive database (archive.py)
+        result = attempt_archive.archive_attempts(self.SessionLocal, progress=progress)
+        
+        # Sent and failed outbox emails (keep last 30 days)
+        purged = self.outbox.purge(days=30)
+        logger.info("Purged %d old outbox emails", purged)
+        result['outbox_purged'] = purged
+        progress(stage='done', **result)
+        
+        logger.info("Weekly cleanup completed successfully")
+        return result
+    
+    def run_job(self, name, progress=None):
+        """Run one of JOBS by name; `progress(**fields)` is called as the job goes"""
+        if name not in JOBS:
+            raise ValueError(f"Unknown job: {name}")
         
+        started = time.perf_counter()
+        with log_context(job=name):
+            try:
+                result = getattr(self, name)(progress=progress)
+            except Exception:
+                logger.exception("Job %s failed", name,
+                                 extra={'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+                raise
+            logger.info("Job %s finished", name,
+                        extra={'duration_ms': round((time.perf_counter() - started) * 1000, 1), 'result': result})
+        return result
+    
+    def run_scheduled_job(self, name):
+        """Run a job from the in-process schedule; a failure (already logged) doesn't stop the schedule"""
         try:
-            # Clean up old log entries (keep last 30 days)
-            if os.path.exists('jobs.log'):
-                # In a real implementation, you'd rotate logs properly
-                logging.info("Log cleanup completed")
-            
-            # You could add more cleanup tasks here
-            # - Clean up temporary files
-            # - Archive old quiz attempts
-            # - Update statistics tables
-            
-            logging.info("Weekly cleanup completed successfully")
-            return True
-            
-        except Exception as e:
-            logging.error(f"Weekly cleanup failed: {str(e)}")
-            return False
+            return self.run_job(name)
+        except Exception:
+            return None
     
-    def schedule_jobs(self):
-        """Schedule all recurring jobs"""
+    def schedule_jobs(self, run=None):
+        """Schedule all recurring jobs; `run(job_name)` runs them (default: in the calling thread)"""
+        run = run or self.run_scheduled_job
+        
         # Daily user reminders at 9:00 AM
-        schedule.every().day.at("09:00").do(self.daily_user_reminders)
+        schedule.every().day.at("09:00").do(run, 'daily_user_reminders')
         
         # Daily admin report at 8:00 AM
-        schedule.every().day.at("08:00").do(self.daily_admin_report)
+        schedule.every().day.at("08:00").do(run, 'daily_admin_report')
         
         # Weekly cleanup on Sunday at 2:00 AM
-        schedule.every().sunday.at("02:00").do(self.weekly_cleanup)
+        schedule.every().sunday.at("02:00").do(run, 'weekly_cleanup')
+        
+        # Outbox retries, and resuming runs that were interrupted
+        schedule.every(5).minutes.do(run, 'drain_outbox')
         
-        logging.info("Jobs scheduled successfully:")
-        logging.info("- Daily user reminders: 9:00 AM")
-        logging.info("- Daily admin report: 8:00 AM")
-        logging.info("- Weekly cleanup: Sunday 2:00 AM")
+        logger.info("Jobs scheduled successfully:")
+        logger.info("- Daily user reminders: 9:00 AM")
+        logger.info("- Daily admin report: 8:00 AM")
+        logger.info("- Weekly cleanup: Sunday 2:00 AM")
+        logger.info("- Email outbox: every 5 minutes")
     
     def run_scheduler(self):
         """Run the job scheduler"""
         self.running = True
-        logging.info("Job scheduler started")
+        logger.info("Job scheduler started")
         
         while self.running:
             schedule.run_pending()
@@ -508,23 +385,36 @@ class JobScheduler:
             self.schedule_jobs()
             self.thread = threading.Thread(target=self.run_scheduler, daemon=True)
             self.thread.start()
-            logging.info("Job scheduler thread started")
+            logger.info("Job scheduler thread started")
     
     def stop(self):
         """Stop the job scheduler"""
         self.running = False
         if self.thread:
             self.thread.join()
-        logging.info("Job scheduler stopped")
+        logger.info("Job scheduler stopped")
+
+# Shared scheduler instance, created on first use (see get_job_scheduler())
+_job_scheduler = None
+_job_scheduler_lock = threading.Lock()
 
-# Global scheduler instance
-job_scheduler = JobScheduler()
+def get_job_scheduler(engine=None):
+    """
+    The shared job scheduler. It is built the first time it is asked for, on
+    `engine` if one is given (app.py passes the web app's engine) or on an
+    engine of its own, so importing this module opens no database.
+    """
+    global _job_scheduler
+    with _job_scheduler_lock:
+        if _job_scheduler is None:
+            _job_scheduler = JobScheduler(engine)
+        return _job_scheduler
 
 # Manual testing functions
 def test_user_reminders():
     """Test function to manually trigger user reminders"""
     print("🔄 Testing user reminders...")
-    scheduler = JobScheduler()
+    scheduler = get_job_scheduler()
     count = scheduler.daily_user_reminders()
     print(f"✅ Sent {count} reminder emails")
     return count
@@ -532,7 +422,7 @@ def test_user_reminders():
 def test_admin_report():
     """Test function to manually trigger admin report"""
     print("🔄 Testing admin daily report...")
-    scheduler = JobScheduler()
+    scheduler = get_job_scheduler()
     count = scheduler.daily_admin_report()
     print(f"✅ Sent {count} admin report emails")
     return count
@@ -540,15 +430,19 @@ def test_admin_report():
 def test_weekly_cleanup():
     """Test function to manually trigger weekly cleanup"""
     print("🔄 Testing weekly cleanup...")
-    scheduler = JobScheduler()
-    success = scheduler.weekly_cleanup()
-    print(f"✅ Weekly cleanup {'completed' if success else 'failed'}")
-    return success
+    scheduler = get_job_scheduler()
+    try:
+        result = scheduler.weekly_cleanup()
+    except Exception as e:
+        print(f"❌ Weekly cleanup failed: {str(e)}")
+        return False
+    print(f"✅ Weekly cleanup completed: {result}")
+    return result
 
 def test_get_inactive_users():
     """Test function to get inactive users"""
     print("🔄 Getting inactive users...")
-    scheduler = JobScheduler()
+    scheduler = get_job_scheduler()
     users = scheduler.get_inactive_users(days=7)
     print(f"📊 Found {len(users)} inactive users:")
     for user in users:
@@ -558,7 +452,7 @@ def test_get_inactive_users():
 def test_get_daily_stats():
     """Test function to get daily statistics"""
     print("🔄 Getting daily statistics...")
-    scheduler = JobScheduler()
+    scheduler = get_job_scheduler()
     stats = scheduler.get_daily_stats()
     print("📊 Daily Statistics:")
     print(f"  Today: {stats['today']}")
@@ -574,6 +468,10 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         command = sys.argv[1]
         
+        # The job worker sets up logging itself, for its pool processes too
+        if command != "start":
+            configure_logging()
+        
         if command == "test-reminders":
             test_user_reminders()
         elif command == "test-admin-report":
@@ -585,12 +483,9 @@ if __name__ == "__main__":
         elif command == "test-stats":
             test_get_daily_stats()
         elif command == "start":
-            job_scheduler.start()
-            try:
-                while True:
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                job_scheduler.stop()
+            # Standalone scheduler with leader election and a process pool
+            from worker import main
+            main([])
         else:
             print("Available commands:")
             print("  test-reminders     - Test user reminder emails")
@@ -598,7 +493,7 @@ if __name__ == "__main__":
             print("  test-cleanup       - Test weekly cleanup")
             print("  test-inactive-users - Show inactive users")
             print("  test-stats         - Show daily statistics")
-            print("  start              - Start the job scheduler")
+            print("  start              - Start the job worker (same as python worker.py)")
     else:
         print("Usage: python jobs.py <command>")
         print("Available commands:")
@@ -607,4 +502,4 @@ if __name__ == "__main__":
         print("  test-cleanup       - Test weekly cleanup")
         print("  test-inactive-users - Show inactive users")
         print("  test-stats         - Show daily statistics")
-        print("  start              - Start the job scheduler")
\ No newline at end of file
+        print("  start              - Start the job worker (same as python worker.py)")
\ No newline at end of file
@@ -0,0 +1,116 @@
+"""
+Database leases
+
+A lease is a row in job_leases saying which process owns a name until
+when. Acquiring is a single conditional UPDATE (or an INSERT for a new
+name), so it works the same on every database and only one of several
+processes racing for an expired lease gets it. The owner renews the lease
+while it works; if the owner dies, the lease simply expires and another
+process takes over.
+
+Expiry is compared with each process's own clock, so the TTL should be
+comfortably longer than the clock skew between nodes.
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from models import JobLease
+
+logger = logging.getLogger(__name__)
+
+
+def default_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    def __init__(self, session_factory, name, ttl=60, owner=None):
+        self.SessionLocal = session_factory
+        self.name = name
+        self.ttl = ttl
+        self.owner = owner or default_owner()
+
+    def acquire(self):
+        """Take or renew the lease; returns True if this owner holds it"""
+        now = datetime.utcnow()
+        session = self.SessionLocal()
+        try:
+            updated = session.query(JobLease).filter(
+                JobLease.name == self.name,
+                or_(JobLease.owner == self.owner, JobLease.expires_at < now)
+            ).update({
+                'owner': self.owner,
+                'expires_at': now + timedelta(seconds=self.ttl),
+                'updated_at': now
+            }, synchronize_session=False)
+
+            if not updated:
+                # Either nobody has ever held it or someone else holds it now
+                session.add(JobLease(
+                    name=self.name, owner=self.owner,
+                    expires_at=now + timedelta(seconds=self.ttl), updated_at=now
+                ))
+            session.commit()
+            return True
+        except IntegrityError:
+            session.rollback()
+            return False
+        finally:
+            session.close()
+
+    renew = acquire
+
+    def release(self):
+        """Give the lease up now instead of letting it expire"""
+        session = self.SessionLocal()
+        try:
+            session.query(JobLease).filter(
+                JobLease.name == self.name,
+                JobLease.owner == self.owner
+            ).update({'expires_at': datetime.utcnow()}, synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def holder(self):
+        """(owner, expires_at) of the current lease, or None"""
+        session = self.SessionLocal()
+        try:
+            row = session.query(JobLease.owner, JobLease.expires_at).filter(
+                JobLease.name == self.name,
+                JobLease.expires_at >= datetime.utcnow()
+            ).first()
+            return tuple(row) if row else None
+        finally:
+            session.close()
+
+    @contextmanager
+    def keep_alive(self, interval=None):
+        """Renew the lease from a background thread while the block runs"""
+        interval = interval or max(1, self.ttl / 3)
+        stopped = threading.Event()
+
+        def heartbeat():
+            while not stopped.wait(interval):
+                try:
+                    if not self.renew():
+                        logger.warning("Lost lease %s to another process", self.name)
+                except Exception as e:
+                    logger.error("Failed to renew lease %s: %s", self.name, e)
+
+        thread = threading.Thread(target=heartbeat, name=f'lease-{self.name}', daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stopped.set()
+            thread.join()
@@ -0,0 +1,192 @@
+"""
+Bulk email delivery
+
+SMTPConnectionPool keeps authenticated SMTP connections open and reuses
+them across messages instead of connecting, doing STARTTLS and logging in
+for every email. BulkSender sends a stream of messages from a bounded
+worker pool, paced by a TokenBucket rate limiter rather than a fixed sleep
+after each message.
+
+Any SMTP server works for local testing, e.g.
+    python -m aiosmtpd -n -l localhost:1025
+with SMTP_SERVER=localhost, SMTP_PORT=1025 and SMTP_USE_TLS=false.
+"""
+
+import contextvars
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentSendError(Exception):
+    """The message can never be delivered (e.g. an invalid address); don't retry it"""
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available (no-op when rate <= 0)"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _PooledConnection:
+    def __init__(self, server):
+        self.server = server
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of logged-in SMTP connections"""
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 size=4, timeout=30, max_messages=100):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.timeout = timeout
+        # Reconnect now and then; servers limit messages per session
+        self.max_messages = max_messages
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.ehlo()
+            if self.use_tls:
+                server.starttls()
+                server.ehlo()
+            if self.username and self.password and server.has_extn('auth'):
+                server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        self.connects += 1
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is discarded instead of returned if the caller fails"""
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+
+            try:
+                yield conn.server
+            except Exception:
+                self._quit(conn.server)
+                raise
+
+            conn.sent += 1
+            if conn.sent < self.max_messages:
+                self._idle.put(conn)
+            else:
+                self._quit(conn.server)
+
+    def _send(self, send):
+        # An idle connection may have been dropped by the server; retry once on a new one
+        for attempt in range(2):
+            try:
+                with self.connection() as server:
+                    return send(server)
+            except smtplib.SMTPServerDisconnected:
+                if attempt:
+                    raise
+
+    def send_message(self, msg):
+        """Send an email.message.Message"""
+        return self._send(lambda server: server.send_message(msg))
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Send a message that is already serialized"""
+        return self._send(lambda server: server.sendmail(from_addr, to_addrs, msg))
+
+    def close(self):
+        """Log out of all idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(conn.server)
+
+
+class BulkSender:
+    """Sends many messages concurrently with a bounded worker pool and a rate limit"""
+
+    def __init__(self, send, workers=4, rate=5, burst=None):
+        self.send = send
+        self.workers = workers
+        self.rate_limiter = TokenBucket(rate, burst)
+
+    def _send_one(self, message):
+        self.rate_limiter.acquire()
+        try:
+            return bool(self.send(*message))
+        except Exception as e:
+            logger.error("Failed to send email to %s: %s", message[0], e)
+            return False
+
+    def send_all(self, messages):
+        """
+        Send (to_email, subject, html_content, text_content) tuples.
+
+        `messages` may be a generator; at most a few messages per worker are
+        taken from it ahead of sending. Returns the number sent successfully.
+        """
+        sent = 0
+        lock = threading.Lock()
+        in_flight = threading.BoundedSemaphore(self.workers * 2)
+
+        def done(future):
+            nonlocal sent
+            if future.result():
+                with lock:
+                    sent += 1
+            in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='email') as executor:
+            for message in messages:
+                in_flight.acquire()
+                # Workers log with the caller's context (e.g. the job being run)
+                executor.submit(contextvars.copy_context().run, self._send_one, message).add_done_callback(done)
+
+        return sent
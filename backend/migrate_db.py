@@ -2,16 +2,126 @@
 """
 Database Migration Script
 Migrates existing quiz_app.db to new schema with subjects and chapters
+and adds the indexes used by the hot queries
+
+Other databases (DATABASE_URL, e.g. PostgreSQL) start from the current
+schema, so they only get the columns and indexes added since.
 """
 
 import sqlite3
 import os
 from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from database import create_db_engine, database_url
+
+# Indexes declared on the models; created here for databases that predate them
+INDEXES = [
+    ('ix_users_created', 'users', 'created_at'),
+    ('ix_users_role', 'users', 'role'),
+    ('ix_users_created_day', 'users', 'DATE(created_at)'),
+    ('ix_subjects_active_created', 'subjects', 'is_active, created_at'),
+    ('ix_chapters_subject_created', 'chapters', 'subject_id, created_at'),
+    ('ix_quizzes_chapter_created', 'quizzes', 'chapter_id, created_at'),
+    ('ix_quizzes_active_created', 'quizzes', 'is_active, created_at'),
+    ('ix_quizzes_created_by', 'quizzes', 'created_by'),
+    ('ix_questions_quiz', 'questions', 'quiz_id'),
+    ('ix_quiz_attempts_user_completed', 'quiz_attempts', 'user_id, completed_at'),
+    ('ix_quiz_attempts_quiz_completed', 'quiz_attempts', 'quiz_id, completed_at'),
+    ('ix_quiz_attempts_completed_cover', 'quiz_attempts', 'completed_at, user_id, quiz_id, score, total_questions'),
+    ('ix_quiz_attempts_completed_day', 'quiz_attempts', 'DATE(completed_at)'),
+    ('ix_user_answers_attempt', 'user_answers', 'attempt_id'),
+    ('ix_user_answers_question', 'user_answers', 'question_id'),
+]
+
+# Columns added to existing tables: (table, column, type)
+COLUMNS = [
+    ('quiz_attempts', 'shuffle_seed', 'INTEGER'),
+    ('quiz_attempts', 'question_ids', 'TEXT'),
+    ('quizzes', 'sample_size', 'INTEGER'),
+    ('quizzes', 'sample_by_points', 'BOOLEAN DEFAULT FALSE'),
+]
+
+# Indexes replaced by one of the above
+OBSOLETE_INDEXES = [
+    'ix_quiz_attempts_completed',  # by ix_quiz_attempts_completed_cover
+]
+
+def add_columns(cursor):
+    """Add any missing COLUMNS to existing tables"""
+    for table, column, column_type in COLUMNS:
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cursor.fetchall()]
+        if columns and column not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+            print(f"Added {table}.{column}")
+
+def create_indexes(cursor):
+    """Create any missing indexes on existing tables and drop replaced ones"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    existing = {row[0] for row in cursor.fetchall()}
+    
+    created = 0
+    for name, table, columns in INDEXES:
+        if table in tables and name not in existing:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})')
+            created += 1
+    
+    if created:
+        print(f"Created {created} indexes")
+    
+    for name in OBSOLETE_INDEXES:
+        if name in existing:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+            print(f"Dropped obsolete index {name}")
+
+def migrate_schema(engine):
+    """Add missing COLUMNS and INDEXES through SQLAlchemy (databases other than SQLite)"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    if not tables:
+        print("No existing tables found. Will create new ones.")
+        return
+    
+    with engine.begin() as conn:
+        for table, column, column_type in COLUMNS:
+            if table in tables and column not in {c['name'] for c in inspector.get_columns(table)}:
+                conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+                print(f"Added {table}.{column}")
+        
+        existing = {index['name'] for table in tables for index in inspector.get_indexes(table)}
+        created = 0
+        for name, table, columns in INDEXES:
+            if table in tables and name not in existing:
+                conn.execute(text(f'CREATE INDEX {name} ON {table} ({columns})'))
+                created += 1
+        
+        if created:
+            print(f"Created {created} indexes")
+        
+        for name in OBSOLETE_INDEXES:
+            if name in existing:
+                conn.execute(text(f'DROP INDEX {name}'))
+                print(f"Dropped obsolete index {name}")
 
 def migrate_database():
-    db_path = 'instance/quiz_app.db'
+    url = make_url(database_url())
+    
+    if url.get_backend_name() != 'sqlite':
+        print(f"Migrating {url.get_backend_name()} database...")
+        engine = create_db_engine(database_url())
+        try:
+            migrate_schema(engine)
+        finally:
+            engine.dispose()
+        return
     
-    if not os.path.exists(db_path):
+    db_path = url.database
+    
+    if not db_path or not os.path.exists(db_path):
         print("No existing database found. Will create new one.")
         return
     
@@ -165,6 +275,10 @@ def migrate_database():
             
             print(f"Updated quizzes table with chapter_id (default: {chapter_id})")
         
+        # Add columns and indexes for databases that predate them
+        add_columns(cursor)
+        create_indexes(cursor)
+        
         conn.commit()
         print("Database migration completed successfully!")
         
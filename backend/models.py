@@ -5,6 +5,9 @@ db = SQLAlchemy()
 
 class Subject(db.Model):
     __tablename__ = 'subjects'
+    __table_args__ = (
+        db.Index('ix_subjects_active_created', 'is_active', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, unique=True)
@@ -19,6 +22,9 @@ class Subject(db.Model):
 
 class Chapter(db.Model):
     __tablename__ = 'chapters'
+    __table_args__ = (
+        db.Index('ix_chapters_subject_created', 'subject_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -34,6 +40,11 @@ class Chapter(db.Model):
 
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_created', 'created_at'),
+        db.Index('ix_users_role', 'role'),
+        db.Index('ix_users_created_day', db.text('DATE(created_at)')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -48,6 +59,11 @@ class User(db.Model):
 
 class Quiz(db.Model):
     __tablename__ = 'quizzes'
+    __table_args__ = (
+        db.Index('ix_quizzes_chapter_created', 'chapter_id', 'created_at'),
+        db.Index('ix_quizzes_active_created', 'is_active', 'created_at'),
+        db.Index('ix_quizzes_created_by', 'created_by'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -57,6 +73,9 @@ class Quiz(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Questions drawn per attempt from the quiz's pool (see sampling.py); NULL = all of them
+    sample_size = db.Column(db.Integer)
+    sample_by_points = db.Column(db.Boolean, default=False)
     
     # Relationships
     questions = db.relationship('Question', backref='quiz', lazy=True, cascade='all, delete-orphan')
@@ -64,6 +83,9 @@ class Quiz(db.Model):
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        db.Index('ix_questions_quiz', 'quiz_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False)
@@ -80,6 +102,15 @@ class Question(db.Model):
 
 class QuizAttempt(db.Model):
     __tablename__ = 'quiz_attempts'
+    __table_args__ = (
+        db.Index('ix_quiz_attempts_user_completed', 'user_id', 'completed_at'),
+        db.Index('ix_quiz_attempts_quiz_completed', 'quiz_id', 'completed_at'),
+        # Covers the activity stats range queries (activity_stats.py)
+        db.Index('ix_quiz_attempts_completed_cover', 'completed_at', 'user_id', 'quiz_id', 'score', 'total_questions'),
+        db.Index('ix_quiz_attempts_completed_day', db.text('DATE(completed_at)')),
+        # Ids of archived attempts (archive.py) are never handed out again
+        {'sqlite_autoincrement': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -89,15 +120,113 @@ class QuizAttempt(db.Model):
     time_taken = db.Column(db.Integer, default=0)
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
+    # Question and option order of this attempt (see shuffle.py); NULL = unshuffled
+    shuffle_seed = db.Column(db.Integer)
+    # Comma-separated ids of the questions drawn for this attempt; NULL = the whole quiz
+    question_ids = db.Column(db.Text)
     
     # Relationships
     user_answers = db.relationship('UserAnswer', backref='attempt', lazy=True, cascade='all, delete-orphan')
 
 class UserAnswer(db.Model):
     __tablename__ = 'user_answers'
+    __table_args__ = (
+        db.Index('ix_user_answers_attempt', 'attempt_id'),
+        db.Index('ix_user_answers_question', 'question_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     attempt_id = db.Column(db.Integer, db.ForeignKey('quiz_attempts.id'), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False)
     selected_answer = db.Column(db.String(1))
-    is_correct = db.Column(db.Boolean, default=False)
\ No newline at end of file
+    is_correct = db.Column(db.Boolean, default=False)
+
+# Report rollups, maintained incrementally by submit_quiz (see reports.py)
+class QuizReportStat(db.Model):
+    __tablename__ = 'quiz_report_stats'
+    
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_percentage = db.Column(db.Float, nullable=False, default=0)
+    max_score = db.Column(db.Float, nullable=False, default=0)
+    min_score = db.Column(db.Float, nullable=False, default=100)
+
+class UserReportStat(db.Model):
+    __tablename__ = 'user_report_stats'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_percentage = db.Column(db.Float, nullable=False, default=0)
+    best_score = db.Column(db.Float, nullable=False, default=0)
+
+class DailyReportStat(db.Model):
+    __tablename__ = 'daily_report_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    total_percentage = db.Column(db.Float, nullable=False, default=0)
+
+class ScoreBucketStat(db.Model):
+    __tablename__ = 'score_bucket_stats'
+    
+    bucket = db.Column(db.String(20), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+
+# Scheduled emails waiting to be sent (see outbox.py)
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.UniqueConstraint('run_key', 'recipient', name='uq_email_outbox_run_recipient'),
+        db.Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_claim', 'claim_token'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    # e.g. 'daily_user_reminders:2024-05-01'; one message per recipient per run
+    run_key = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32))
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+# Time-limited ownership of a job or of the scheduler (see lease.py)
+class JobLease(db.Model):
+    __tablename__ = 'job_leases'
+    
+    name = db.Column(db.String(100), primary_key=True)  # 'scheduler' or 'job:<name>'
+    owner = db.Column(db.String(200), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Jobs started from the admin API (see job_runs.py)
+class JobRun(db.Model):
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        db.Index('ix_job_runs_status_queued', 'status', 'queued_at'),
+        db.Index('ix_job_runs_queued', 'queued_at'),
+    )
+    
+    id = db.Column(db.String(32), primary_key=True)
+    job = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed, skipped
+    progress = db.Column(db.Text)  # JSON
+    result = db.Column(db.Text)  # JSON
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.Integer)
+    queued_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+# Change counters of the catalog tables, behind the catalog ETags (see catalog.py)
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)  # table name
+    version = db.Column(db.Integer, nullable=False, default=0)
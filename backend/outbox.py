@@ -0,0 +1,326 @@
+"""
+Email outbox
+
+Scheduled jobs don't send their emails directly. They enqueue one row per
+recipient in the email_outbox table, keyed by run (e.g.
+'daily_user_reminders:2024-05-01'), and then drain it. Each row records
+whether it is pending, sent or failed, so:
+
+- a run that dies halfway resumes where it stopped: enqueueing the same run
+  again skips recipients that are already in the outbox, and only pending
+  rows are sent;
+- a failed send is retried later with exponential backoff, up to
+  max_attempts, instead of being lost;
+- rows are claimed with a token before sending, so two drainers never send
+  the same row. A row left 'sending' by a crashed drainer is claimed again
+  once its lease expires (delivery is at-least-once for that one batch).
+"""
+
+import json
+import logging
+import os
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from email_templates import render_admin_report, render_user_reminder
+from mailer import BulkSender, PermanentSendError
+from models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def _render_admin_report(stats):
+    subject, html_content = render_admin_report(stats)
+    return subject, html_content, None
+
+
+# kind -> payload -> (subject, html, text)
+RENDERERS = {
+    'user_reminder': render_user_reminder,
+    'admin_report': _render_admin_report,
+}
+
+# Errors that won't go away by retrying
+PERMANENT_ERRORS = (PermanentSendError, smtplib.SMTPRecipientsRefused)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Outbox:
+    def __init__(self, engine, session_factory):
+        self.engine = engine
+        self.SessionLocal = session_factory
+        self.batch_size = int(os.getenv('OUTBOX_BATCH_SIZE', '100'))
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+        self.retry_delay = int(os.getenv('OUTBOX_RETRY_DELAY', '60'))  # seconds, doubled per attempt
+        self.max_retry_delay = int(os.getenv('OUTBOX_MAX_RETRY_DELAY', '3600'))
+        self.lease = int(os.getenv('OUTBOX_LEASE', '900'))  # seconds before a 'sending' row is reclaimed
+        self.last_drain = None
+        self._table_ready = False
+
+    def ensure_table(self):
+        """Create email_outbox when the jobs run against a database init_db() hasn't touched"""
+        if not self._table_ready:
+            EmailOutbox.__table__.create(self.engine, checkfirst=True)
+            self._table_ready = True
+
+    def retry_delay_for(self, attempts):
+        """Backoff before the next try after `attempts` failed sends"""
+        return min(self.max_retry_delay, self.retry_delay * 2 ** max(0, attempts - 1))
+
+    def enqueue(self, run_key, kind, messages):
+        """
+        Add (recipient, payload) pairs for a run. Recipients already queued
+        for `run_key` are skipped. Returns the number of new rows.
+        """
+        if kind not in RENDERERS:
+            raise ValueError(f"Unknown email kind: {kind}")
+        self.ensure_table()
+
+        queued = 0
+        for batch in _batches(messages, self.batch_size):
+            # Last payload wins if a recipient appears twice in a batch
+            payloads = {recipient: payload for recipient, payload in batch}
+
+            session = self.SessionLocal()
+            try:
+                existing = {recipient for (recipient,) in session.query(EmailOutbox.recipient).filter(
+                    EmailOutbox.run_key == run_key,
+                    EmailOutbox.recipient.in_(list(payloads))
+                )}
+                rows = [
+                    {'run_key': run_key, 'kind': kind, 'recipient': recipient,
+                     'payload': json.dumps(payload, default=str)}
+                    for recipient, payload in payloads.items() if recipient not in existing
+                ]
+                if rows:
+                    try:
+                        session.execute(insert(EmailOutbox), rows)
+                        session.commit()
+                        queued += len(rows)
+                    except IntegrityError:
+                        # Another process enqueued the same run concurrently
+                        session.rollback()
+                        queued += self._insert_each(session, rows)
+            finally:
+                session.close()
+        return queued
+
+    def _insert_each(self, session, rows):
+        queued = 0
+        for row in rows:
+            try:
+                session.execute(insert(EmailOutbox), [row])
+                session.commit()
+                queued += 1
+            except IntegrityError:
+                session.rollback()
+        return queued
+
+    def claim(self, limit):
+        """Claim up to `limit` due rows; returns (token, rows)"""
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        due = or_(
+            and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < now - timedelta(seconds=self.lease))
+        )
+
+        session = self.SessionLocal()
+        try:
+            ids = [row_id for (row_id,) in session.query(EmailOutbox.id).filter(due).order_by(EmailOutbox.id).limit(limit)]
+            if not ids:
+                return token, []
+
+            # `due` is checked again so rows another drainer claimed in the meantime are left alone
+            session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id.in_(ids), due)
+                .values(status='sending', claim_token=token, claimed_at=now),
+                execution_options={'synchronize_session': False}
+            )
+            session.commit()
+
+            rows = session.query(
+                EmailOutbox.id, EmailOutbox.kind, EmailOutbox.recipient,
+                EmailOutbox.payload, EmailOutbox.attempts
+            ).filter(EmailOutbox.claim_token == token).order_by(EmailOutbox.id).all()
+            return token, rows
+        finally:
+            session.close()
+
+    def _messages(self, rows, errors):
+        """(to, subject, html, text, row_id) for claimed rows; identical payloads are rendered once"""
+        rendered = {}
+        for row in rows:
+            key = (row.kind, row.payload)
+            try:
+                if key not in rendered:
+                    rendered[key] = RENDERERS[row.kind](json.loads(row.payload))
+            except Exception as e:
+                errors[row.id] = PermanentSendError(f"Could not render {row.kind} email: {str(e)}")
+                continue
+            yield (row.recipient,) + rendered[key] + (row.id,)
+
+    def _record(self, token, rows, errors):
+        """Mark a claimed batch sent or failed; returns (sent, failed)"""
+        now = datetime.utcnow()
+        sent_ids = [row.id for row in rows if row.id not in errors]
+        failed = 0
+
+        session = self.SessionLocal()
+        try:
+            if sent_ids:
+                session.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id.in_(sent_ids), EmailOutbox.claim_token == token)
+                    .values(status='sent', sent_at=now, attempts=EmailOutbox.attempts + 1,
+                            claim_token=None, last_error=None),
+                    execution_options={'synchronize_session': False}
+                )
+
+            for row in rows:
+                if row.id not in errors:
+                    continue
+                error = errors[row.id]
+                attempts = row.attempts + 1
+                give_up = isinstance(error, PERMANENT_ERRORS) or attempts >= self.max_attempts
+                if give_up:
+                    failed += 1
+                    logger.warning("Giving up on email to %s after %d attempt(s): %s", row.recipient, attempts, error)
+                session.execute(
+                    update(EmailOutbox)
+                    .where(EmailOutbox.id == row.id, EmailOutbox.claim_token == token)
+                    .values(status='failed' if give_up else 'pending', attempts=attempts,
+                            next_attempt_at=now + timedelta(seconds=self.retry_delay_for(attempts)),
+                            claim_token=None, last_error=str(error)[:1000]),
+                    execution_options={'synchronize_session': False}
+                )
+            session.commit()
+        finally:
+            session.close()
+        return len(sent_ids), failed
+
+    def drain(self, deliver, workers=4, rate=5, progress=None):
+        """
+        Send every due row with `deliver(to, subject, html, text)`, which
+        raises on failure. Rows are claimed and recorded a batch at a time,
+        and `progress(sent=..., failed=...)` is called after each batch.
+        Returns (sent, failed); rows scheduled for a retry count as neither.
+        """
+        self.ensure_table()
+        started = datetime.utcnow()
+        errors = {}
+
+        def send(to_email, subject, html_content, text_content, row_id):
+            try:
+                deliver(to_email, subject, html_content, text_content)
+            except Exception as e:
+                errors[row_id] = e
+                raise
+            return True
+
+        sender = BulkSender(send, workers=workers, rate=rate)
+        sent = failed = batches = 0
+        while True:
+            token, rows = self.claim(self.batch_size)
+            if not rows:
+                break
+            batches += 1
+            errors.clear()
+            sender.send_all(self._messages(rows, errors))
+            batch_sent, batch_failed = self._record(token, rows, errors)
+            sent += batch_sent
+            failed += batch_failed
+            if progress:
+                progress(sent=sent, failed=failed)
+
+        if not batches:
+            return sent, failed
+
+        finished = datetime.utcnow()
+        elapsed = (finished - started).total_seconds()
+        self.last_drain = {
+            'started_at': started.isoformat(),
+            'finished_at': finished.isoformat(),
+            'sent': sent,
+            'failed': failed,
+            'per_second': round(sent / elapsed, 2) if elapsed > 0 else None
+        }
+        return sent, failed
+
+    def stats(self):
+        """Queue depth, throughput and recent errors for the admin endpoint"""
+        self.ensure_table()
+        now = datetime.utcnow()
+        session = self.SessionLocal()
+        try:
+            counts = dict(session.query(EmailOutbox.status, func.count(EmailOutbox.id)).group_by(EmailOutbox.status).all())
+
+            due, oldest_pending = session.query(
+                func.sum(case((EmailOutbox.next_attempt_at <= now, 1), else_=0)),
+                func.min(EmailOutbox.created_at)
+            ).filter(EmailOutbox.status == 'pending').one()
+
+            sent_last_hour, sent_last_day = session.query(
+                func.sum(case((EmailOutbox.sent_at >= now - timedelta(hours=1), 1), else_=0)),
+                func.count(EmailOutbox.id)
+            ).filter(EmailOutbox.status == 'sent', EmailOutbox.sent_at >= now - timedelta(days=1)).one()
+
+            runs = {}
+            for run_key, status, count in session.query(
+                EmailOutbox.run_key, EmailOutbox.status, func.count(EmailOutbox.id)
+            ).filter(
+                EmailOutbox.created_at >= now - timedelta(days=2)
+            ).group_by(EmailOutbox.run_key, EmailOutbox.status):
+                runs.setdefault(run_key, {})[status] = count
+
+            recent_errors = session.query(
+                EmailOutbox.recipient, EmailOutbox.status, EmailOutbox.attempts, EmailOutbox.last_error
+            ).filter(
+                EmailOutbox.last_error.isnot(None)
+            ).order_by(EmailOutbox.id.desc()).limit(10).all()
+
+            return {
+                'queue': {status: counts.get(status, 0) for status in ('pending', 'sending', 'sent', 'failed')},
+                'due_now': due or 0,
+                'oldest_pending_seconds': int((now - oldest_pending).total_seconds()) if oldest_pending else None,
+                'sent_last_hour': sent_last_hour or 0,
+                'sent_last_day': sent_last_day or 0,
+                'runs': runs,
+                'recent_errors': [
+                    {'recipient': recipient, 'status': status, 'attempts': attempts, 'error': error}
+                    for recipient, status, attempts, error in recent_errors
+                ],
+                'last_drain': self.last_drain
+            }
+        finally:
+            session.close()
+
+    def purge(self, days=30):
+        """Delete sent and failed rows older than `days`; returns the number deleted"""
+        self.ensure_table()
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        session = self.SessionLocal()
+        try:
+            deleted = session.query(EmailOutbox).filter(
+                EmailOutbox.status.in_(['sent', 'failed']),
+                EmailOutbox.created_at < cutoff
+            ).delete(synchronize_session=False)
+            session.commit()
+            return deleted
+        finally:
+            session.close()
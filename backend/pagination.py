@@ -0,0 +1,117 @@
+"""
+Keyset pagination for list endpoints
+
+List endpoints are ordered newest first on a timestamp column with the row
+id as tie breaker. A page is requested with `limit` (and `cursor` for the
+following pages); the response carries the cursor of the next page, which
+encodes the (timestamp, id) of the last row returned.
+"""
+
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import and_, desc, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DATE_RANGES = {
+    'today': timedelta(days=1),
+    'week': timedelta(days=7),
+    'month': timedelta(days=30),
+    'year': timedelta(days=365)
+}
+
+
+class PaginationError(ValueError):
+    """Raised for malformed paging parameters"""
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeError):
+        raise PaginationError('Invalid cursor')
+
+
+def is_paginated(args):
+    """True when the request asked for a page instead of the full list"""
+    return 'limit' in args or 'cursor' in args
+
+
+def page_limit(args):
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def date_range_start(args):
+    """Start of the `date_range` filter (today/week/month/year), if any"""
+    date_range = args.get('date_range')
+    if not date_range:
+        return None
+    if date_range not in DATE_RANGES:
+        raise PaginationError(f"date_range must be one of: {', '.join(DATE_RANGES)}")
+    return datetime.utcnow() - DATE_RANGES[date_range]
+
+
+def search_pattern(args):
+    """LIKE pattern for the `search` parameter, if any"""
+    search = (args.get('search') or '').strip()
+    if not search:
+        return None
+    escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def keyset_page(query, order_column, id_column, args):
+    """
+    Order `query` newest first and, when paging was requested, restrict it
+    to one page.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page and
+    for unpaginated requests.
+    """
+    query = query.order_by(desc(order_column), desc(id_column))
+
+    if not is_paginated(args):
+        return query.all(), None
+
+    limit = page_limit(args)
+    if args.get('cursor'):
+        timestamp, row_id = decode_cursor(args['cursor'])
+        query = query.filter(or_(
+            order_column < timestamp,
+            and_(order_column == timestamp, id_column < row_id)
+        ))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(
+        getattr(last, order_column.key), getattr(last, id_column.key)
+    )
+
+
+def page_response(items, next_cursor, args):
+    """Response body: a plain list, or a page envelope when paging was requested"""
+    if not is_paginated(args):
+        return items
+    return {
+        'items': items,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
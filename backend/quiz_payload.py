@@ -0,0 +1,114 @@
+"""
+Quiz start payload
+
+POST /api/quizzes/<id>/start answers with the new attempt and the quiz's
+questions (without their answers), so starting a quiz is one request. The
+part of that response every student gets the same (title, time limit,
+question count and questions) is serialized once per quiz and kept as JSON
+bytes in an in-process LRU cache, which is dropped together with the quiz's
+answer key whenever the quiz or its questions change (through another API
+process: within QUIZ_CACHE_CHECK_INTERVAL seconds, see grading.py). A start then inserts
+the attempt row and splices its id into the cached bytes: no query, no ORM
+objects and no JSON encoding per student. A shuffled attempt only adds
+its question and option order as two short index lists.
+
+Questions are cached as one serialized fragment each, so an attempt that
+draws a sample of a large quiz (sampling.py) gets only its own questions,
+joined from the cached fragments.
+"""
+
+import json
+from collections import namedtuple
+
+from grading import AnswerKeyCache
+from models import db, Quiz, Question
+from sampling import draw_positions, points_strata
+from shuffle import option_orders, question_order
+
+QuizPayload = namedtuple('QuizPayload', ['question_ids', 'head', 'questions', 'sample_size', 'strata'])
+
+
+def _json(value):
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def load_payload(quiz_id):
+    """The start payload of an active quiz, or None"""
+    quiz = db.session.query(
+        Quiz.title, Quiz.description, Quiz.time_limit, Quiz.sample_size, Quiz.sample_by_points
+    ).filter(Quiz.id == quiz_id, Quiz.is_active == True).first()
+    if quiz is None:
+        return None
+
+    questions = db.session.query(
+        Question.id, Question.question,
+        Question.option_a, Question.option_b, Question.option_c, Question.option_d,
+        Question.points
+    ).filter(Question.quiz_id == quiz_id).order_by(Question.id).all()
+
+    # Only a pool larger than the sample is sampled
+    sample_size = quiz.sample_size if quiz.sample_size and quiz.sample_size < len(questions) else None
+    strata = points_strata([row[6] or 0 for row in questions]) if sample_size and quiz.sample_by_points else None
+
+    head = _json({
+        'quiz_title': quiz.title,
+        'description': quiz.description,
+        'time_limit': quiz.time_limit,
+        'total_questions': sample_size or len(questions)
+    })
+    return QuizPayload(
+        question_ids=tuple(row[0] for row in questions),
+        head=head[1:-1],
+        questions=tuple(_json({
+            'id': question_id,
+            'question': text,
+            'option_a': option_a,
+            'option_b': option_b,
+            'option_c': option_c,
+            'option_d': option_d,
+            'points': points
+        }) for question_id, text, option_a, option_b, option_c, option_d, points in questions),
+        sample_size=sample_size,
+        strata=strata
+    )
+
+
+def draw_questions(payload):
+    """Positions of the questions of a new attempt: a fresh sample, or None for the whole quiz"""
+    if payload.sample_size is None:
+        return None
+    return draw_positions(len(payload.question_ids), payload.sample_size, payload.strata)
+
+
+def start_response(payload, attempt_id, seed=None, positions=None):
+    """
+    The start response body: the attempt id and, for a shuffled attempt, its
+    question and option order (shuffle.py), followed by the cached quiz
+    details and the questions at `positions` (all of them if None)
+    """
+    if positions is None:
+        question_ids, questions = payload.question_ids, payload.questions
+    else:
+        question_ids = [payload.question_ids[i] for i in positions]
+        questions = [payload.questions[i] for i in positions]
+
+    head = b'{"attempt_id":%d,' % attempt_id
+    if seed is not None:
+        head += b'"question_order":%s,"option_order":%s,' % (
+            _json(question_order(seed, question_ids)),
+            _json(option_orders(seed, question_ids))
+        )
+    return head + payload.head + b',"questions":[' + b','.join(questions) + b']}'
+
+
+payload_cache = AnswerKeyCache()
+
+
+def get_payload(quiz_id):
+    """Start payload of an active quiz (None if there is no such quiz)"""
+    return payload_cache.get(quiz_id, loader=load_payload)
+
+
+def invalidate_payloads(*quiz_ids):
+    """Drop cached payloads after their quiz or questions changed (call after commit)"""
+    payload_cache.invalidate(*quiz_ids)
@@ -0,0 +1,590 @@
+"""
+Admin report aggregation
+
+The admin dashboard report is served from small rollup tables (per quiz,
+per user, per day and per score bucket) that submit_quiz() keeps up to date
+in the same transaction as the attempt itself. Use `python reports.py backfill`
+to rebuild the rollups from the full attempt history.
+
+Attempts moved to the archive database by the weekly cleanup (archive.py)
+stay in the rollups: archiving doesn't touch them, and rebuilding or
+refreshing rollup rows adds what the archived attempts contribute.
+
+Two engines that read quiz_attempts directly are kept alongside: `sql`, which
+pushes every aggregate down into GROUP BY queries, and `python`, the original
+row-by-row fold. Both produce the report exactly as it was computed before
+the rollups existed (see benchmarks/bench_reports.py), over the attempts that
+have not been archived.
+"""
+
+from datetime import date, datetime, timedelta
+from itertools import chain
+from sqlalchemy import Float, case, cast, delete, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import (
+    db, User, Quiz, QuizAttempt,
+    QuizReportStat, UserReportStat, DailyReportStat, ScoreBucketStat
+)
+
+SCORE_BUCKETS = ('excellent', 'good', 'fair', 'poor')
+
+# Keep IN (...) lists well below SQLite's bound parameter limit
+ID_CHUNK_SIZE = 500
+
+
+def attempt_percentage(score, total_questions):
+    """Percentage score of a single attempt"""
+    if total_questions and total_questions > 0:
+        return (score / total_questions) * 100
+    return 0
+
+
+def score_bucket(percentage):
+    """Score distribution bucket for a percentage"""
+    if percentage >= 80:
+        return 'excellent'
+    elif percentage >= 60:
+        return 'good'
+    elif percentage >= 40:
+        return 'fair'
+    return 'poor'
+
+
+def percentage_expr(score=QuizAttempt.score, total_questions=QuizAttempt.total_questions):
+    """SQL expression for the percentage score of an attempt"""
+    return case(
+        (total_questions > 0,
+         cast(score, Float) / total_questions * 100),
+        else_=0.0
+    )
+
+
+def score_bucket_expr(percentage):
+    """SQL expression mapping a percentage onto its score bucket"""
+    return case(
+        (percentage >= 80, 'excellent'),
+        (percentage >= 60, 'good'),
+        (percentage >= 40, 'fair'),
+        else_='poor'
+    )
+
+
+def _as_date(value):
+    # SQLite returns DATE() results as strings, other backends as dates
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[i:i + ID_CHUNK_SIZE]
+
+
+# INSERT ... ON CONFLICT DO UPDATE, so concurrent first submissions for a key don't both insert
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _upsert(model, key_column, key, changes, initial):
+    """Insert a rollup row, or apply an in-place UPDATE to it if it exists"""
+    upsert_insert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsert_insert is not None:
+        db.session.execute(
+            upsert_insert(model).values(**initial).on_conflict_do_update(index_elements=[key_column], set_=changes)
+        )
+        return
+
+    result = db.session.execute(
+        update(model).where(key_column == key).values(**changes),
+        execution_options={'synchronize_session': False}
+    )
+    if result.rowcount == 0:
+        db.session.add(model(**initial))
+
+
+def record_attempt(attempt):
+    """Fold a freshly completed attempt into the rollups (caller commits)"""
+    percentage = attempt_percentage(attempt.score, attempt.total_questions)
+
+    _upsert(
+        QuizReportStat, QuizReportStat.quiz_id, attempt.quiz_id,
+        {
+            'attempts': QuizReportStat.attempts + 1,
+            'total_percentage': QuizReportStat.total_percentage + percentage,
+            'max_score': case((QuizReportStat.max_score < percentage, percentage), else_=QuizReportStat.max_score),
+            'min_score': case((QuizReportStat.min_score > percentage, percentage), else_=QuizReportStat.min_score)
+        },
+        {
+            'quiz_id': attempt.quiz_id,
+            'attempts': 1,
+            'total_percentage': percentage,
+            'max_score': max(0, percentage),
+            'min_score': min(100, percentage)
+        }
+    )
+
+    _upsert(
+        UserReportStat, UserReportStat.user_id, attempt.user_id,
+        {
+            'attempts': UserReportStat.attempts + 1,
+            'total_percentage': UserReportStat.total_percentage + percentage,
+            'best_score': case((UserReportStat.best_score < percentage, percentage), else_=UserReportStat.best_score)
+        },
+        {
+            'user_id': attempt.user_id,
+            'attempts': 1,
+            'total_percentage': percentage,
+            'best_score': max(0, percentage)
+        }
+    )
+
+    day = attempt.completed_at.date()
+    _upsert(
+        DailyReportStat, DailyReportStat.day, day,
+        {
+            'attempts': DailyReportStat.attempts + 1,
+            'total_percentage': DailyReportStat.total_percentage + percentage
+        },
+        {'day': day, 'attempts': 1, 'total_percentage': percentage}
+    )
+
+    bucket = score_bucket(percentage)
+    _upsert(
+        ScoreBucketStat, ScoreBucketStat.bucket, bucket,
+        {'attempts': ScoreBucketStat.attempts + 1},
+        {'bucket': bucket, 'attempts': 1}
+    )
+
+
+def _archived(by, *criteria):
+    """Archived attempts' (key, attempts, total_percentage, max, min) grouped by 'quiz', 'user', 'day' or 'bucket'"""
+    # archive.py builds on this module
+    from archive import attempt_archive
+    return attempt_archive.rollup_rows(by, *criteria)
+
+
+def _merge(*row_sets):
+    """Combine (key, attempts, total_percentage, max, min) rows for the same keys"""
+    merged = {}
+    for key, attempts, total, high, low in chain(*row_sets):
+        if key in merged:
+            count, total_so_far, high_so_far, low_so_far = merged[key]
+            merged[key] = (count + attempts, total_so_far + total, max(high_so_far, high), min(low_so_far, low))
+        else:
+            merged[key] = (attempts, total, high, low)
+    return merged
+
+
+def _rollup_rows(key, *criteria):
+    """(key, attempts, total_percentage, max, min) of the completed attempts in quiz_attempts"""
+    pct = percentage_expr()
+    return db.session.query(
+        key, func.count(QuizAttempt.id), func.sum(pct), func.max(pct), func.min(pct)
+    ).filter(
+        QuizAttempt.completed_at.isnot(None), *criteria
+    ).group_by(key).all()
+
+
+def _insert_quiz_rollups(rows):
+    if rows:
+        db.session.execute(insert(QuizReportStat), [
+            {'quiz_id': quiz_id, 'attempts': attempts, 'total_percentage': total,
+             'max_score': max(0, high), 'min_score': min(100, low)}
+            for quiz_id, (attempts, total, high, low) in rows.items()
+        ])
+
+
+def _insert_user_rollups(rows):
+    if rows:
+        db.session.execute(insert(UserReportStat), [
+            {'user_id': user_id, 'attempts': attempts, 'total_percentage': total, 'best_score': max(0, high)}
+            for user_id, (attempts, total, high, _) in rows.items()
+        ])
+
+
+def rebuild_rollups():
+    """Rebuild every rollup table from the attempt history, archived attempts included (caller commits)"""
+    pct = percentage_expr()
+
+    for model in (QuizReportStat, UserReportStat, DailyReportStat, ScoreBucketStat):
+        db.session.execute(delete(model))
+
+    _insert_quiz_rollups(_merge(_rollup_rows(QuizAttempt.quiz_id), _archived('quiz')))
+    _insert_user_rollups(_merge(_rollup_rows(QuizAttempt.user_id), _archived('user')))
+
+    # Dates come back as strings on SQLite
+    daily = _merge(
+        (_as_date(d), *totals)
+        for d, *totals in chain(_rollup_rows(func.date(QuizAttempt.completed_at)), _archived('day'))
+    )
+    if daily:
+        db.session.execute(insert(DailyReportStat), [
+            {'day': day, 'attempts': attempts, 'total_percentage': total}
+            for day, (attempts, total, _, _) in daily.items()
+        ])
+
+    buckets = _merge(_rollup_rows(score_bucket_expr(pct)), _archived('bucket'))
+    if buckets:
+        db.session.execute(insert(ScoreBucketStat), [
+            {'bucket': bucket, 'attempts': attempts}
+            for bucket, (attempts, _, _, _) in buckets.items()
+        ])
+
+
+def _subtract(daily, buckets):
+    """Take (day, attempts, total_percentage, ...) and (bucket, attempts, ...) rows out of the rollups"""
+    days = []
+    for d, count, total, *_ in daily:
+        days.append(_as_date(d))
+        db.session.execute(
+            update(DailyReportStat).where(DailyReportStat.day == days[-1]).values(
+                attempts=DailyReportStat.attempts - count,
+                total_percentage=DailyReportStat.total_percentage - total
+            ),
+            execution_options={'synchronize_session': False}
+        )
+
+    for name, count, *_ in buckets:
+        db.session.execute(
+            update(ScoreBucketStat).where(ScoreBucketStat.bucket == name).values(
+                attempts=ScoreBucketStat.attempts - count
+            ),
+            execution_options={'synchronize_session': False}
+        )
+
+    if days:
+        db.session.execute(delete(DailyReportStat).where(DailyReportStat.day.in_(days), DailyReportStat.attempts <= 0))
+
+
+def forget_attempts(*criteria):
+    """
+    Remove the attempts matching `criteria` from the daily and score bucket
+    rollups before they are deleted.
+
+    Returns the (quiz_ids, user_ids) whose rollup rows must be passed to
+    refresh_rollups() once the attempts are gone.
+    """
+    pct = percentage_expr()
+    _subtract(
+        _rollup_rows(func.date(QuizAttempt.completed_at), *criteria),
+        _rollup_rows(score_bucket_expr(pct), *criteria)
+    )
+
+    pairs = db.session.query(QuizAttempt.quiz_id, QuizAttempt.user_id).filter(
+        QuizAttempt.completed_at.isnot(None), *criteria
+    ).distinct().all()
+    return {quiz_id for quiz_id, _ in pairs}, {user_id for _, user_id in pairs}
+
+
+def forget_archived(*criteria):
+    """
+    forget_attempts() for archived attempts; `criteria` are on
+    archive.archived_attempts.
+    """
+    _subtract(_archived('day', *criteria), _archived('bucket', *criteria))
+    quiz_ids = {quiz_id for quiz_id, *_ in _archived('quiz', *criteria)}
+    user_ids = {user_id for user_id, *_ in _archived('user', *criteria)}
+    return quiz_ids, user_ids
+
+
+def refresh_rollups(quiz_ids=(), user_ids=()):
+    """Recompute the per-quiz and per-user rollup rows from the remaining attempts, archived ones included"""
+    from archive import archived_attempts  # see _archived()
+
+    for chunk in _chunks(quiz_ids):
+        db.session.execute(delete(QuizReportStat).where(QuizReportStat.quiz_id.in_(chunk)))
+        _insert_quiz_rollups(_merge(
+            _rollup_rows(QuizAttempt.quiz_id, QuizAttempt.quiz_id.in_(chunk)),
+            _archived('quiz', archived_attempts.c.quiz_id.in_(chunk))
+        ))
+
+    for chunk in _chunks(user_ids):
+        db.session.execute(delete(UserReportStat).where(UserReportStat.user_id.in_(chunk)))
+        _insert_user_rollups(_merge(
+            _rollup_rows(QuizAttempt.user_id, QuizAttempt.user_id.in_(chunk)),
+            _archived('user', archived_attempts.c.user_id.in_(chunk))
+        ))
+
+
+def _format_report(quiz_stats_dict, user_stats_dict, daily_stats, score_counts):
+    """Turn the accumulated statistics into the /api/admin/reports payload"""
+    # Calculate averages for quiz stats
+    quiz_statistics = []
+    for stats in quiz_stats_dict.values():
+        avg_score = stats['total_percentage'] / stats['attempts'] if stats['attempts'] > 0 else 0
+        min_score = stats['min_score'] if stats['attempts'] > 0 else 0
+        quiz_statistics.append({
+            'quiz_title': stats['quiz_title'],
+            'attempts': stats['attempts'],
+            'avg_score': round(avg_score, 2),
+            'max_score': round(stats['max_score'], 2),
+            'min_score': round(min_score, 2)
+        })
+
+    # Calculate averages for user stats
+    user_performance = []
+    for stats in user_stats_dict.values():
+        avg_score = stats['total_percentage'] / stats['attempts'] if stats['attempts'] > 0 else 0
+        user_performance.append({
+            'username': stats['username'],
+            'attempts': stats['attempts'],
+            'avg_score': round(avg_score, 2),
+            'best_score': round(stats['best_score'], 2)
+        })
+
+    # Calculate daily averages
+    user_activity = []
+    for date_str, stats in daily_stats.items():
+        avg_percentage = stats['total_percentage'] / stats['count'] if stats['count'] > 0 else 0
+        user_activity.append({
+            'date': date_str,
+            'avg_percentage': round(avg_percentage, 2)
+        })
+
+    # Sort results; ties by name, so every engine returns the same order
+    quiz_statistics.sort(key=lambda x: (-x['attempts'], x['quiz_title']))
+    user_performance.sort(key=lambda x: (-x['avg_score'], x['username']))
+    user_activity.sort(key=lambda x: x['date'])
+
+    return {
+        'quiz_statistics': quiz_statistics,
+        'user_performance': user_performance,
+        'user_activity': user_activity,
+        'score_distribution': score_counts
+    }
+
+
+def build_report_from_rollups():
+    """
+    Build the admin report from the rollup tables only.
+
+    Daily activity is bucketed by whole days, so the window covers the last
+    seven calendar days rather than the last 7 * 24 hours.
+    """
+    # Quizzes (and users) sharing a title are reported together, as before
+    quiz_stats_dict = {}
+    quiz_rows = db.session.query(
+        Quiz.title,
+        QuizReportStat.attempts,
+        QuizReportStat.total_percentage,
+        QuizReportStat.max_score,
+        QuizReportStat.min_score
+    ).join(Quiz, QuizReportStat.quiz_id == Quiz.id).filter(
+        QuizReportStat.attempts > 0
+    ).order_by(QuizReportStat.quiz_id)
+
+    for title, attempts, total, max_score, min_score in quiz_rows:
+        if title not in quiz_stats_dict:
+            quiz_stats_dict[title] = {
+                'quiz_title': title,
+                'attempts': 0,
+                'total_percentage': 0,
+                'max_score': 0,
+                'min_score': 100
+            }
+        stats = quiz_stats_dict[title]
+        stats['attempts'] += attempts
+        stats['total_percentage'] += total
+        stats['max_score'] = max(stats['max_score'], max_score)
+        stats['min_score'] = min(stats['min_score'], min_score)
+
+    user_stats_dict = {}
+    user_rows = db.session.query(
+        User.username,
+        UserReportStat.attempts,
+        UserReportStat.total_percentage,
+        UserReportStat.best_score
+    ).join(User, UserReportStat.user_id == User.id).filter(
+        UserReportStat.attempts > 0
+    ).order_by(UserReportStat.user_id)
+
+    for username, attempts, total, best_score in user_rows:
+        if username not in user_stats_dict:
+            user_stats_dict[username] = {
+                'username': username,
+                'attempts': 0,
+                'total_percentage': 0,
+                'best_score': 0
+            }
+        stats = user_stats_dict[username]
+        stats['attempts'] += attempts
+        stats['total_percentage'] += total
+        stats['best_score'] = max(stats['best_score'], best_score)
+
+    # Today and the six days before it
+    cutoff = (datetime.utcnow() - timedelta(days=6)).date()
+    daily_stats = {}
+    for row in DailyReportStat.query.filter(
+        DailyReportStat.day >= cutoff, DailyReportStat.attempts > 0
+    ):
+        daily_stats[row.day.isoformat()] = {
+            'total_percentage': row.total_percentage,
+            'count': row.attempts
+        }
+
+    score_counts = dict.fromkeys(SCORE_BUCKETS, 0)
+    for row in ScoreBucketStat.query.all():
+        score_counts[row.bucket] = row.attempts
+
+    return _format_report(quiz_stats_dict, user_stats_dict, daily_stats, score_counts)
+
+
+def _completed_attempts_query(*columns):
+    """Completed attempts joined to their quiz and user"""
+    return db.session.query(*columns).select_from(QuizAttempt).join(
+        Quiz, QuizAttempt.quiz_id == Quiz.id
+    ).join(
+        User, QuizAttempt.user_id == User.id
+    ).filter(
+        QuizAttempt.completed_at.isnot(None)
+    )
+
+
+def build_report_sql():
+    """Build the admin report with one GROUP BY query per section"""
+    pct = percentage_expr()
+    first_seen = func.min(QuizAttempt.id)
+
+    # Groups are ordered by their first attempt, matching the row-by-row fold
+    quiz_stats_dict = {}
+    for title, attempts, total, max_score, min_score in _completed_attempts_query(
+        Quiz.title, func.count(QuizAttempt.id), func.sum(pct), func.max(pct), func.min(pct)
+    ).group_by(Quiz.title).order_by(first_seen):
+        quiz_stats_dict[title] = {
+            'quiz_title': title,
+            'attempts': attempts,
+            'total_percentage': total,
+            'max_score': max(0, max_score),
+            'min_score': min(100, min_score)
+        }
+
+    user_stats_dict = {}
+    for username, attempts, total, best_score in _completed_attempts_query(
+        User.username, func.count(QuizAttempt.id), func.sum(pct), func.max(pct)
+    ).group_by(User.username).order_by(first_seen):
+        user_stats_dict[username] = {
+            'username': username,
+            'attempts': attempts,
+            'total_percentage': total,
+            'best_score': max(0, best_score)
+        }
+
+    day = func.date(QuizAttempt.completed_at)
+    daily_stats = {}
+    for d, count, total in _completed_attempts_query(
+        day, func.count(QuizAttempt.id), func.sum(pct)
+    ).filter(
+        QuizAttempt.completed_at >= datetime.utcnow() - timedelta(days=7)
+    ).group_by(day):
+        daily_stats[_as_date(d).isoformat()] = {'total_percentage': total, 'count': count}
+
+    bucket = score_bucket_expr(pct)
+    score_counts = dict.fromkeys(SCORE_BUCKETS, 0)
+    for name, count in _completed_attempts_query(
+        bucket, func.count(QuizAttempt.id)
+    ).group_by(bucket):
+        score_counts[name] = count
+
+    return _format_report(quiz_stats_dict, user_stats_dict, daily_stats, score_counts)
+
+
+def build_report_python():
+    """Build the admin report by folding every completed attempt in Python"""
+    completed_attempts = _completed_attempts_query(
+        QuizAttempt.score,
+        QuizAttempt.total_questions,
+        QuizAttempt.completed_at,
+        Quiz.title.label('quiz_title'),
+        User.username
+    ).all()
+
+    quiz_stats_dict = {}
+    user_stats_dict = {}
+    daily_stats = {}
+    score_counts = dict.fromkeys(SCORE_BUCKETS, 0)
+    week_ago = datetime.utcnow() - timedelta(days=7)
+
+    for attempt in completed_attempts:
+        percentage = attempt_percentage(attempt.score, attempt.total_questions)
+
+        quiz_title = attempt.quiz_title
+        if quiz_title not in quiz_stats_dict:
+            quiz_stats_dict[quiz_title] = {
+                'quiz_title': quiz_title,
+                'attempts': 0,
+                'total_percentage': 0,
+                'max_score': 0,
+                'min_score': 100
+            }
+        stats = quiz_stats_dict[quiz_title]
+        stats['attempts'] += 1
+        stats['total_percentage'] += percentage
+        stats['max_score'] = max(stats['max_score'], percentage)
+        stats['min_score'] = min(stats['min_score'], percentage)
+
+        username = attempt.username
+        if username not in user_stats_dict:
+            user_stats_dict[username] = {
+                'username': username,
+                'attempts': 0,
+                'total_percentage': 0,
+                'best_score': 0
+            }
+        stats = user_stats_dict[username]
+        stats['attempts'] += 1
+        stats['total_percentage'] += percentage
+        stats['best_score'] = max(stats['best_score'], percentage)
+
+        if attempt.completed_at >= week_ago:
+            date_str = attempt.completed_at.date().isoformat()
+            if date_str not in daily_stats:
+                daily_stats[date_str] = {'total_percentage': 0, 'count': 0}
+            daily_stats[date_str]['total_percentage'] += percentage
+            daily_stats[date_str]['count'] += 1
+
+        score_counts[score_bucket(percentage)] += 1
+
+    return _format_report(quiz_stats_dict, user_stats_dict, daily_stats, score_counts)
+
+
+REPORT_ENGINES = {
+    'rollup': build_report_from_rollups,
+    'sql': build_report_sql,
+    'python': build_report_python
+}
+
+
+def build_report(engine='rollup'):
+    """Build the admin report with the named engine"""
+    if engine not in REPORT_ENGINES:
+        raise ValueError(f"Unknown report engine: {engine}")
+    return REPORT_ENGINES[engine]()
+
+
+def rollups_missing():
+    """True when there is attempt history but the rollups were never built"""
+    has_rollups = db.session.query(ScoreBucketStat.bucket).first() is not None
+    has_history = db.session.query(QuizAttempt.id).filter(
+        QuizAttempt.completed_at.isnot(None)
+    ).first() is not None
+    return has_history and not has_rollups
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        from app import app
+
+        with app.app_context():
+            db.create_all()
+            print("Rebuilding report rollups from attempt history...")
+            rebuild_rollups()
+            db.session.commit()
+            print("Report rollups rebuilt successfully!")
+    else:
+        print("Usage: python reports.py backfill")
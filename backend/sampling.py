@@ -0,0 +1,59 @@
+"""
+Question bank sampling
+
+A quiz with a sample_size gives each attempt that many of its questions,
+drawn at random from the whole quiz, so a quiz can be backed by a pool of
+thousands of questions. The pool is the quiz's cached start payload
+(quiz_payload.py), which holds its question ids in id order and, for
+quizzes with sample_by_points, their positions grouped by points. Drawing
+picks positions in those arrays (random.sample, O(sample size)), so a start
+never reads the pool from the database, let alone sorts it with
+ORDER BY RANDOM().
+
+With sample_by_points each points value gets a share of the sample
+proportional to its share of the pool (largest remainder rounding), so the
+total points of an attempt stay close to the same from one attempt to the
+next.
+
+The drawn ids are stored on the attempt (QuizAttempt.question_ids), and
+submit_quiz() grades only those questions.
+"""
+
+import random
+
+
+def points_strata(points):
+    """Positions of the questions grouped by points: ((points, (position, ...)), ...)"""
+    strata = {}
+    for position, question_points in enumerate(points):
+        strata.setdefault(question_points, []).append(position)
+    return tuple((question_points, tuple(positions)) for question_points, positions in sorted(strata.items()))
+
+
+def allocate(sizes, total):
+    """Split `total` draws over groups of `sizes` in proportion (largest remainder)"""
+    pool = sum(sizes)
+    quotas = [size * total // pool for size in sizes]
+    by_remainder = sorted(range(len(sizes)), key=lambda i: sizes[i] * total % pool, reverse=True)
+    for i in by_remainder[:total - sum(quotas)]:
+        quotas[i] += 1
+    return quotas
+
+
+def draw_positions(pool_size, sample_size, strata=None, rng=random):
+    """Positions (sorted) of `sample_size` questions drawn from a pool of `pool_size`"""
+    if not strata:
+        return sorted(rng.sample(range(pool_size), sample_size))
+    quotas = allocate([len(positions) for _, positions in strata], sample_size)
+    drawn = []
+    for (_, positions), quota in zip(strata, quotas):
+        drawn.extend(rng.sample(positions, quota))
+    return sorted(drawn)
+
+
+def encode_ids(question_ids):
+    return ','.join(str(question_id) for question_id in question_ids)
+
+
+def decode_ids(text):
+    return [int(question_id) for question_id in text.split(',')] if text else []
@@ -0,0 +1,68 @@
+"""
+Per-attempt question and option order
+
+Each attempt gets a random shuffle_seed when it starts (QuizAttempt). The
+order of its questions and of each question's options is a pure function of
+that seed and the question ids, so nothing else is stored: the server
+recomputes it to grade a submission.
+
+The start response keeps the quiz's shared, cached question list
+(quiz_payload.py) and adds only indices:
+
+- question_order: positions in the question list, in the order to show them
+- option_order: per question in the list, the original letters in the order
+  to show them, e.g. "CADB" shows option C first, labelled A
+
+Answers come back as the letters the student saw. to_original_answers()
+maps them back to the question's own letters before grading. Each
+question's place and option order depend only on its own id, so editing
+other questions of the quiz mid-attempt doesn't reshuffle it.
+"""
+
+import secrets
+from itertools import permutations
+
+LETTERS = 'ABCD'
+OPTION_ORDERS = [''.join(order) for order in permutations(LETTERS)]
+
+MASK = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+# Keeps a question's option order independent of its place in the question order
+OPTION_SALT = 0x5851F42D4C957F2D
+
+
+def new_seed():
+    return secrets.randbits(31)
+
+
+def _mix(seed, question_id):
+    """splitmix64 of (seed, question id): stable across processes and Python versions"""
+    z = (seed * 0xBF58476D1CE4E5B9 + question_id * 0x94D049BB133111EB + GOLDEN_GAMMA) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+
+def question_order(seed, question_ids):
+    """Positions in `question_ids` in the order an attempt shows them"""
+    return sorted(range(len(question_ids)), key=lambda i: _mix(seed, question_ids[i]))
+
+
+def option_orders(seed, question_ids):
+    """For each question, its letters in the order an attempt shows them"""
+    return [OPTION_ORDERS[_mix(seed ^ OPTION_SALT, question_id) % len(OPTION_ORDERS)] for question_id in question_ids]
+
+
+def to_original_answers(seed, answers):
+    """Map submitted answers ({question_id: letter shown}) to the questions' own letters"""
+    original = {}
+    for question_id, shown in answers.items():
+        # Anything but a single option letter (e.g. null or '' for unanswered) is kept as sent
+        if isinstance(shown, str) and len(shown) == 1 and shown in LETTERS:
+            try:
+                order = OPTION_ORDERS[_mix(seed ^ OPTION_SALT, int(question_id)) % len(OPTION_ORDERS)]
+            except ValueError:
+                continue
+            shown = order[LETTERS.index(shown)]
+        original[question_id] = shown
+    return original
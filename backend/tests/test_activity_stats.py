@@ -0,0 +1,62 @@
+"""Windowed activity stats"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from activity_stats import StatsWindowError, compute_stats, parse_window
+from models import db, QuizAttempt, User
+from reports import record_attempt
+
+# A window no other test writes to
+START = datetime(2001, 3, 10)
+END = START + timedelta(days=2)
+
+
+def test_compute_stats(quiz_app, make_quiz):
+    (first, _), (second, _) = make_quiz('A'), make_quiz('B')
+    with quiz_app.app.app_context():
+        users = [User(username=f'stats_{n}', email=f'stats_{n}@example.com', password_hash='x',
+                      created_at=START + timedelta(hours=n)) for n in range(3)]
+        db.session.add_all(users)
+        db.session.flush()
+        a, b, c = (user.id for user in users)
+
+        def attempt(user_id, quiz_id, score, completed_at):
+            row = QuizAttempt(user_id=user_id, quiz_id=quiz_id, score=score, total_questions=4,
+                              started_at=completed_at, completed_at=completed_at)
+            db.session.add(row)
+            # Counted in the report rollups too, like a submission
+            record_attempt(row)
+
+        # Current window: a twice on the first quiz, b once on the second
+        attempt(a, first, 4, START)
+        attempt(a, first, 2, START + timedelta(days=1))
+        attempt(b, second, 1, END - timedelta(seconds=1))
+        # Previous window: c once; the window boundaries are exclusive at the end
+        attempt(c, second, 3, START - timedelta(hours=1))
+        attempt(c, second, 3, START - timedelta(days=2, seconds=1))
+        attempt(b, first, 4, END)
+        db.session.commit()
+
+        stats = compute_stats(db.session, START, END)
+        db.session.rollback()
+
+    assert stats['current'] == {'active_users': 2, 'total_attempts': 3, 'avg_score': 58.33, 'quizzes_taken': 2}
+    assert stats['previous'] == {'active_users': 1, 'total_attempts': 1, 'avg_score': 75.0, 'quizzes_taken': 1}
+    assert stats['new_users'] == 3
+    assert stats['top_quiz']['attempts'] == 2
+    assert stats['top_quiz']['avg_score'] == 75.0
+    assert stats['window']['days'] == 2
+
+
+def test_parse_window():
+    now = datetime(2024, 5, 15, 13, 30)  # a Wednesday
+    today = datetime(2024, 5, 15)
+    assert parse_window({}, now) == (today, today + timedelta(days=1))
+    assert parse_window({'days': '7'}, now) == (today - timedelta(days=6), today + timedelta(days=1))
+    assert parse_window({'period': 'week'}, now) == (datetime(2024, 5, 13), today + timedelta(days=1))
+    assert parse_window({'start': '2024-05-01', 'end': '2024-05-02'}, now) == (datetime(2024, 5, 1), datetime(2024, 5, 3))
+    for args in ({'days': 'x'}, {'period': 'month'}, {'days': '0'}, {'days': '400'}):
+        with pytest.raises(StatsWindowError):
+            parse_window(args, now)
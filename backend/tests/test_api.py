@@ -0,0 +1,101 @@
+"""Login and the quiz start/submit round trip"""
+
+
+def test_login(client):
+    response = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['access_token']
+    assert body['user']['role'] == 'admin'
+
+
+def test_login_rejects_wrong_password(client):
+    response = client.post('/api/login', json={'username': 'admin', 'password': 'wrong'})
+    assert response.status_code == 401
+
+
+def test_admin_endpoints_need_admin(client, make_student):
+    _, headers = make_student()
+    assert client.get('/api/admin/users', headers=headers).status_code == 403
+
+
+def test_start_and_submit(client, make_quiz, make_student, answer_sheet):
+    quiz_id, key = make_quiz('ABCD', points=[1, 2, 3, 4])
+    _, headers = make_student()
+
+    response = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+    assert response.status_code == 200
+    attempt = response.get_json()
+    assert attempt['total_questions'] == 4
+    assert sorted(question['id'] for question in attempt['questions']) == sorted(key)
+    assert all('correct_answer' not in question for question in attempt['questions'])
+
+    # Right on the first two questions (3 points), wrong on the others
+    letters = dict(key)
+    for question_id in sorted(key)[2:]:
+        letters[question_id] = 'B' if key[question_id] == 'A' else 'A'
+    response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                           json={'answers': answer_sheet(attempt, letters), 'time_taken': 30}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json() == {'score': 3, 'total_points': 10, 'percentage': 30.0}
+
+    response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                           json={'answers': answer_sheet(attempt, key)}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_submit_other_users_attempt(client, make_quiz, make_student):
+    quiz_id, _ = make_quiz('A')
+    _, owner = make_student()
+    _, other = make_student()
+    attempt = client.post(f'/api/quizzes/{quiz_id}/start', headers=owner).get_json()
+    response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit", json={'answers': {}}, headers=other)
+    assert response.status_code == 404
+
+
+def test_question_pool_is_admin_only(client, admin_headers, make_quiz, make_student):
+    quiz_id, key = make_quiz('ABCD', sample_size=2)
+    _, headers = make_student()
+    assert client.get(f'/api/quizzes/{quiz_id}/questions', headers=headers).status_code == 403
+
+    response = client.get(f'/api/quizzes/{quiz_id}/questions', headers=admin_headers)
+    assert response.status_code == 200
+    assert [question['id'] for question in response.get_json()] == sorted(key)
+
+    # Students get only their attempt's sample
+    attempt = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers).get_json()
+    assert len(attempt['questions']) == attempt['total_questions'] == 2
+
+
+def test_submit_after_quiz_deactivated(client, admin_headers, make_quiz, make_student, answer_sheet):
+    quiz_id, key = make_quiz('AB')
+    _, headers = make_student()
+    attempt = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers).get_json()
+
+    response = client.put(f'/api/quizzes/{quiz_id}', json={'is_active': False}, headers=admin_headers)
+    assert response.status_code == 200
+    assert client.post(f'/api/quizzes/{quiz_id}/start', headers=headers).status_code != 200
+
+    # An attempt started before the quiz was switched off can still be handed in
+    response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                           json={'answers': answer_sheet(attempt, key), 'time_taken': 30}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['percentage'] == 100.0
+
+
+def test_submit_refused_while_quiz_being_deleted(quiz_app, client, admin_headers, make_quiz, make_student,
+                                                 answer_sheet):
+    quiz_id, key = make_quiz('AB')
+    _, headers = make_student()
+    attempt = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers).get_json()
+
+    # A background delete that is still running: the quiz is deactivated and its run is active
+    client.put(f'/api/quizzes/{quiz_id}', json={'is_active': False}, headers=admin_headers)
+    runs = quiz_app.background_deletions.runs
+    run_id = runs.start(f'delete_quiz:{quiz_id}')
+    try:
+        response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                               json={'answers': answer_sheet(attempt, key), 'time_taken': 30}, headers=headers)
+        assert response.status_code == 400
+    finally:
+        runs.update(run_id, status='failed')
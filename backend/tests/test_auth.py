@@ -0,0 +1,53 @@
+"""Role checks and the user role cache"""
+
+from flask_jwt_extended import decode_token
+
+from auth import UserRoleCache
+
+
+def test_role_cache_skips_store_invalidated_mid_load():
+    cache = UserRoleCache(ttl=60)
+
+    def demoted_while_loading(user_id):
+        cache.invalidate(user_id)
+        return 'admin'
+
+    assert cache.get(7, loader=demoted_while_loading) == 'admin'
+    # The stale role wasn't cached: the next lookup loads the current one
+    assert cache.get(7, loader=lambda user_id: 'user') == 'user'
+    assert cache.get(7, loader=lambda user_id: 'admin') == 'user'
+
+
+def test_role_cache_skips_store_cleared_mid_load():
+    cache = UserRoleCache(ttl=60)
+
+    def cleared_while_loading(user_id):
+        cache.clear()
+        return 'admin'
+
+    cache.get(7, loader=cleared_while_loading)
+    assert cache.get(7, loader=lambda user_id: 'user') == 'user'
+
+
+def test_role_cache_expires():
+    cache = UserRoleCache(ttl=0)
+    cache.get(7, loader=lambda user_id: 'admin')
+    assert cache.get(7, loader=lambda user_id: 'user') == 'user'
+
+
+def test_demotion_applies_at_once(client, admin_headers, make_student):
+    user_id, headers = make_student()
+    assert client.get('/api/admin/users', headers=headers).status_code == 403
+
+    assert client.put(f'/api/admin/users/{user_id}', json={'role': 'admin'}, headers=admin_headers).status_code == 200
+    assert client.get('/api/admin/users', headers=headers).status_code == 200
+
+    assert client.put(f'/api/admin/users/{user_id}', json={'role': 'user'}, headers=admin_headers).status_code == 200
+    assert client.get('/api/admin/users', headers=headers).status_code == 403
+
+
+def test_token_carries_no_role(quiz_app, make_student):
+    _, headers = make_student()
+    with quiz_app.app.app_context():
+        claims = decode_token(headers['Authorization'].split()[1])
+    assert 'role' not in claims
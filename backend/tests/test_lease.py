@@ -0,0 +1,65 @@
+"""Database leases (lease.py)"""
+
+import time
+import uuid
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from lease import Lease
+from models import JobLease
+
+
+@pytest.fixture
+def session_factory(quiz_app):
+    with quiz_app.app.app_context():
+        engine = quiz_app.db.engine
+    JobLease.__table__.create(engine, checkfirst=True)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def name():
+    return f'test:{uuid.uuid4().hex}'
+
+
+def test_only_one_owner_holds_a_lease(session_factory, name):
+    first = Lease(session_factory, name, ttl=60, owner='first')
+    second = Lease(session_factory, name, ttl=60, owner='second')
+
+    assert first.acquire()
+    assert not second.acquire()
+    assert first.renew()
+    assert first.holder()[0] == 'first'
+
+
+def test_released_lease_can_be_taken(session_factory, name):
+    first = Lease(session_factory, name, ttl=60, owner='first')
+    second = Lease(session_factory, name, ttl=60, owner='second')
+
+    assert first.acquire()
+    first.release()
+    assert first.holder() is None
+    assert second.acquire()
+    assert second.holder()[0] == 'second'
+
+
+def test_expired_lease_passes_to_another_owner(session_factory, name):
+    first = Lease(session_factory, name, ttl=1, owner='first')
+    second = Lease(session_factory, name, ttl=60, owner='second')
+
+    assert first.acquire()
+    assert not second.acquire()
+    time.sleep(1.1)
+    assert first.holder() is None
+    assert second.acquire()
+    # The old owner can't renew a lease it lost
+    assert not first.renew()
+
+
+def test_keep_alive_renews(session_factory, name):
+    lease = Lease(session_factory, name, ttl=1, owner='worker')
+    assert lease.acquire()
+    with lease.keep_alive(interval=0.2):
+        time.sleep(1.5)
+        assert lease.holder()[0] == 'worker'
@@ -0,0 +1,156 @@
+"""Email delivery through a real (local) SMTP server"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('aiosmtpd', reason='The mailer tests need aiosmtpd')
+
+from aiosmtpd.controller import Controller
+
+from mailer import BulkSender, SMTPConnectionPool, TokenBucket
+
+
+class RecordingHandler:
+    """Accepts every message except to addresses starting with 'bounce'"""
+
+    def __init__(self):
+        self.recipients = []
+        self.sessions = set()
+        self._lock = threading.Lock()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('bounce'):
+            return '550 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.recipients.extend(envelope.rcpt_tos)
+            self.sessions.add(id(session))
+        return '250 Message accepted for delivery'
+
+
+class SMTPServer:
+    """An aiosmtpd server on a fixed local port that can be restarted (dropping its connections)"""
+
+    def __init__(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        self.handler = RecordingHandler()
+        self.controller = None
+
+    def start(self):
+        self.controller = Controller(self.handler, hostname='127.0.0.1', port=self.port)
+        self.controller.start()
+
+    def stop(self):
+        self.controller.stop()
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def pool(self, **options):
+        return SMTPConnectionPool('127.0.0.1', self.port, use_tls=False, **options)
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    server.start()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+def message(to_addr):
+    return f'From: noreply@example.com\r\nTo: {to_addr}\r\nSubject: Test\r\n\r\nHello\r\n'
+
+
+def test_pool_reuses_connection(smtp_server):
+    pool = smtp_server.pool()
+    try:
+        for n in range(5):
+            pool.sendmail('noreply@example.com', [f'user{n}@example.com'], message(f'user{n}@example.com'))
+    finally:
+        pool.close()
+
+    assert smtp_server.handler.recipients == [f'user{n}@example.com' for n in range(5)]
+    assert pool.connects == 1
+    assert len(smtp_server.handler.sessions) == 1
+
+
+def test_pool_reconnects_every_max_messages(smtp_server):
+    pool = smtp_server.pool(max_messages=2)
+    try:
+        for n in range(5):
+            pool.sendmail('noreply@example.com', [f'user{n}@example.com'], message(f'user{n}@example.com'))
+    finally:
+        pool.close()
+
+    assert len(smtp_server.handler.recipients) == 5
+    assert pool.connects == 3
+    assert len(smtp_server.handler.sessions) == 3
+
+
+def test_pool_reconnects_after_server_drops_connection(smtp_server):
+    pool = smtp_server.pool()
+    try:
+        pool.sendmail('noreply@example.com', ['first@example.com'], message('first@example.com'))
+        # The idle pooled connection dies with the server
+        smtp_server.restart()
+        pool.sendmail('noreply@example.com', ['second@example.com'], message('second@example.com'))
+    finally:
+        pool.close()
+
+    assert smtp_server.handler.recipients == ['first@example.com', 'second@example.com']
+    assert pool.connects == 2
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=20, capacity=5)
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.1
+
+    # Another 10 tokens at 20 per second take half a second
+    for _ in range(10):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.45
+
+
+def test_token_bucket_without_rate_does_not_wait():
+    bucket = TokenBucket(rate=0)
+    started = time.monotonic()
+    for _ in range(1000):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.1
+
+
+def test_bulk_sender_counts_failures(smtp_server):
+    pool = smtp_server.pool(size=2)
+
+    def send(to_email, subject, html_content, text_content=None):
+        pool.sendmail('noreply@example.com', [to_email], message(to_email))
+        return True
+
+    addresses = [f'user{n}@example.com' for n in range(6)] + ['bounce1@example.com', 'bounce2@example.com']
+    sender = BulkSender(send, workers=2, rate=50, burst=2)
+    started = time.monotonic()
+    try:
+        sent = sender.send_all((address, 'Test', '<p>Hello</p>', 'Hello') for address in addresses)
+    finally:
+        pool.close()
+
+    # Refused recipients count as failures and don't stop the others
+    assert sent == 6
+    assert sorted(smtp_server.handler.recipients) == sorted(addresses[:6])
+    # 8 messages with a burst of 2 at 50 per second
+    assert time.monotonic() - started >= 0.1
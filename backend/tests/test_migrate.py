@@ -0,0 +1,22 @@
+"""migrate_db.py on databases created before the newer columns and indexes"""
+
+from sqlalchemy import inspect, text
+
+from migrate_db import migrate_database
+from models import db
+
+
+def test_migrate_adds_missing_columns_and_indexes(quiz_app):
+    with quiz_app.app.app_context():
+        db.session.execute(text('DROP INDEX ix_questions_quiz'))
+        db.session.execute(text('ALTER TABLE quiz_attempts DROP COLUMN question_ids'))
+        db.session.commit()
+        db.engine.dispose()
+
+    migrate_database()
+
+    with quiz_app.app.app_context():
+        db.engine.dispose()
+        inspector = inspect(db.engine)
+        assert 'question_ids' in {column['name'] for column in inspector.get_columns('quiz_attempts')}
+        assert 'ix_questions_quiz' in {index['name'] for index in inspector.get_indexes('questions')}
@@ -0,0 +1,111 @@
+"""Email outbox claims, retries and backoff (outbox.py)"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+from sqlalchemy.orm import sessionmaker
+
+from mailer import PermanentSendError
+from models import EmailOutbox
+from outbox import Outbox
+
+
+@pytest.fixture
+def outbox(quiz_app):
+    with quiz_app.app.app_context():
+        engine = quiz_app.db.engine
+    session_factory = sessionmaker(bind=engine)
+    outbox = Outbox(engine, session_factory)
+    outbox.ensure_table()
+    with engine.begin() as conn:
+        conn.execute(delete(EmailOutbox))
+    return outbox
+
+
+def rows(outbox):
+    session = outbox.SessionLocal()
+    try:
+        return {row.recipient: row for row in session.query(EmailOutbox)}
+    finally:
+        session.close()
+
+
+def reminders(*recipients):
+    return [(recipient, {'username': recipient, 'last_attempt': None, 'total_attempts': 0})
+            for recipient in recipients]
+
+
+def test_enqueue_skips_recipients_already_queued(outbox):
+    run_key = f'test:{uuid.uuid4().hex}'
+    assert outbox.enqueue(run_key, 'user_reminder', reminders('a@example.com', 'b@example.com')) == 2
+    assert outbox.enqueue(run_key, 'user_reminder', reminders('b@example.com', 'c@example.com')) == 1
+    assert sorted(rows(outbox)) == ['a@example.com', 'b@example.com', 'c@example.com']
+
+
+def test_claim_takes_each_row_once(outbox):
+    outbox.enqueue('test', 'user_reminder', reminders('a@example.com', 'b@example.com', 'c@example.com'))
+
+    token, claimed = outbox.claim(2)
+    assert [row.recipient for row in claimed] == ['a@example.com', 'b@example.com']
+    _, rest = outbox.claim(10)
+    assert [row.recipient for row in rest] == ['c@example.com']
+    assert outbox.claim(10)[1] == []
+
+    state = rows(outbox)
+    assert {state[recipient].status for recipient in state} == {'sending'}
+    assert state['a@example.com'].claim_token == token
+
+
+def test_claim_takes_back_rows_of_a_dead_drainer(outbox):
+    outbox.enqueue('test', 'user_reminder', reminders('a@example.com'))
+    outbox.claim(10)
+    assert outbox.claim(10)[1] == []
+
+    # The drainer died before recording the batch; its claim lapses after the lease
+    session = outbox.SessionLocal()
+    session.execute(update(EmailOutbox).values(
+        claimed_at=datetime.utcnow() - timedelta(seconds=outbox.lease + 1)))
+    session.commit()
+    session.close()
+
+    assert [row.recipient for row in outbox.claim(10)[1]] == ['a@example.com']
+
+
+def test_retry_delay_doubles_up_to_the_cap(outbox):
+    outbox.retry_delay, outbox.max_retry_delay = 60, 600
+    assert [outbox.retry_delay_for(attempts) for attempts in range(1, 7)] == [60, 120, 240, 480, 600, 600]
+
+
+def test_failed_sends_back_off_then_give_up(outbox):
+    outbox.max_attempts = 3
+    outbox.enqueue('test', 'user_reminder', reminders('ok@example.com', 'flaky@example.com', 'bad@example.com'))
+
+    def deliver(to_email, subject, html_content, text_content=None):
+        if to_email == 'flaky@example.com':
+            raise ConnectionError('try again')
+        if to_email == 'bad@example.com':
+            raise PermanentSendError('no such address')
+
+    started = datetime.utcnow()
+    assert outbox.drain(deliver, workers=2, rate=0) == (1, 1)
+    state = rows(outbox)
+    assert state['ok@example.com'].status == 'sent'
+    assert (state['bad@example.com'].status, state['bad@example.com'].attempts) == ('failed', 1)
+    flaky = state['flaky@example.com']
+    assert (flaky.status, flaky.attempts, flaky.last_error) == ('pending', 1, 'try again')
+    assert flaky.next_attempt_at >= started + timedelta(seconds=outbox.retry_delay_for(1))
+
+    # Not due yet: a second drain leaves it alone
+    assert outbox.drain(deliver, workers=2, rate=0) == (0, 0)
+
+    # Due again each time until max_attempts
+    for attempts in (2, 3):
+        session = outbox.SessionLocal()
+        session.execute(update(EmailOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        session.commit()
+        session.close()
+        outbox.drain(deliver, workers=2, rate=0)
+        assert rows(outbox)['flaky@example.com'].attempts == attempts
+    assert rows(outbox)['flaky@example.com'].status == 'failed'
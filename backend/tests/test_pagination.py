@@ -0,0 +1,53 @@
+"""Keyset pagination (pagination.py)"""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from pagination import PaginationError, decode_cursor, encode_cursor, page_limit
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not base64!', encode_cursor(datetime(2024, 5, 1), 1)[:-4], 'MjAyNHwx'])
+def test_invalid_cursor(cursor):
+    with pytest.raises(PaginationError):
+        decode_cursor(cursor)
+
+
+def test_page_limit():
+    assert page_limit({}) == 50
+    assert page_limit({'limit': '5'}) == 5
+    assert page_limit({'limit': '100000'}) == 200
+    for limit in ('0', '-1', 'ten'):
+        with pytest.raises(PaginationError):
+            page_limit({'limit': limit})
+
+
+def test_pages_split_rows_with_equal_timestamps(quiz_app, client, admin_headers):
+    from models import User, db
+
+    # Seven users created at the same instant: the id breaks the tie across page boundaries
+    tag = uuid.uuid4().hex[:8]
+    created_at = datetime(2001, 1, 1, 9, 0, 0)
+    with quiz_app.app.app_context():
+        users = [User(username=f'tie_{tag}_{n}', email=f'tie_{tag}_{n}@example.com', password_hash='x',
+                      created_at=created_at) for n in range(7)]
+        db.session.add_all(users)
+        db.session.commit()
+        expected = sorted((user.id for user in users), reverse=True)
+
+    seen = []
+    url = f'/api/admin/users?search=tie_{tag}&limit=3'
+    page = client.get(url, headers=admin_headers).get_json()
+    while True:
+        seen.extend(user['id'] for user in page['items'])
+        if not page['next_cursor']:
+            break
+        page = client.get(f"{url}&cursor={page['next_cursor']}", headers=admin_headers).get_json()
+
+    assert seen == expected
@@ -0,0 +1,93 @@
+"""The report engines and the rollup upserts"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, DailyReportStat, QuizReportStat, ScoreBucketStat, UserReportStat
+from reports import REPORT_ENGINES, build_report, rebuild_rollups
+
+
+@pytest.fixture
+def submit(client, answer_sheet):
+    """Start and submit an attempt answering `letters` ({question id: letter})"""
+    def run(quiz_id, headers, letters):
+        attempt = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers).get_json()
+        response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                               json={'answers': answer_sheet(attempt, letters), 'time_taken': 10}, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+    return run
+
+
+def rollup_rows(quiz_id, user_id):
+    quiz = db.session.get(QuizReportStat, quiz_id)
+    user = db.session.get(UserReportStat, user_id)
+    return (
+        (quiz.attempts, quiz.total_percentage, quiz.max_score, quiz.min_score),
+        (user.attempts, user.total_percentage, user.best_score)
+    )
+
+
+def test_rollups_upserted_on_submit(quiz_app, make_quiz, make_student, submit):
+    quiz_id, key = make_quiz('ABCD')
+    user_id, headers = make_student()
+    wrong = {question_id: 'D' if letter != 'D' else 'C' for question_id, letter in key.items()}
+    with quiz_app.app.app_context():
+        buckets_before = {row.bucket: row.attempts for row in ScoreBucketStat.query}
+
+    # The first submission inserts the quiz and user rows, the next ones update them
+    submit(quiz_id, headers, key)
+    with quiz_app.app.app_context():
+        assert rollup_rows(quiz_id, user_id) == ((1, 100.0, 100.0, 100.0), (1, 100.0, 100.0))
+
+    submit(quiz_id, headers, wrong)
+    half = dict(key)
+    half.update(dict(list(wrong.items())[:2]))
+    submit(quiz_id, headers, half)
+    with quiz_app.app.app_context():
+        assert rollup_rows(quiz_id, user_id) == ((3, 150.0, 100.0, 0.0), (3, 150.0, 100.0))
+        buckets = {row.bucket: row.attempts for row in ScoreBucketStat.query}
+        assert buckets['excellent'] == buckets_before.get('excellent', 0) + 1
+        assert buckets['fair'] == buckets_before.get('fair', 0) + 1
+        assert buckets['poor'] == buckets_before.get('poor', 0) + 1
+        assert sum(row.attempts for row in DailyReportStat.query) == sum(buckets.values())
+
+
+def test_report_engines_agree(quiz_app, make_quiz, make_student, submit):
+    quizzes = [make_quiz('ABCA'), make_quiz('DCB', points=[1, 2, 3])]
+    for n in range(3):
+        _, headers = make_student()
+        for quiz_id, key in quizzes:
+            letters = {question_id: 'ABCD'[(i + n) % 4] for i, question_id in enumerate(key)}
+            submit(quiz_id, headers, letters)
+
+    with quiz_app.app.app_context():
+        reports = {engine: build_report(engine) for engine in REPORT_ENGINES}
+        assert reports['sql'] == reports['python']
+        assert reports['rollup'] == reports['sql']
+
+        # Rebuilding the rollups from the attempt history gives the same report
+        rebuild_rollups()
+        db.session.commit()
+        assert build_report('rollup') == reports['sql']
+
+
+def test_admin_reports_endpoint(client, admin_headers, quiz_app):
+    response = client.get('/api/admin/reports', headers=admin_headers)
+    assert response.status_code == 200
+    with quiz_app.app.app_context():
+        assert response.get_json() == build_report('sql')
+
+
+def test_rollup_daily_activity_covers_seven_calendar_days(quiz_app):
+    today = datetime.utcnow().date()
+    with quiz_app.app.app_context():
+        for days_ago in (6, 7):
+            db.session.merge(DailyReportStat(day=today - timedelta(days=days_ago), attempts=1, total_percentage=50))
+        db.session.flush()
+        dates = {row['date'] for row in build_report('rollup')['user_activity']}
+        db.session.rollback()
+
+    assert (today - timedelta(days=6)).isoformat() in dates
+    assert (today - timedelta(days=7)).isoformat() not in dates
@@ -0,0 +1,93 @@
+"""Question bank sampling (sampling.py) and sampled attempts"""
+
+import random
+from collections import Counter
+
+from quiz_payload import QuizPayload, draw_questions
+from sampling import allocate, decode_ids, draw_positions, encode_ids, points_strata
+
+
+def test_allocate_examples():
+    assert allocate([10], 3) == [3]
+    assert allocate([5, 3, 2], 5) == [3, 1, 1]
+    assert allocate([1, 1, 1], 2) == [1, 1, 0]
+    assert allocate([6, 3, 1], 10) == [6, 3, 1]
+    assert allocate([6, 3, 1], 0) == [0, 0, 0]
+
+
+def test_allocate_quotas_are_proportional():
+    rng = random.Random(1)
+    for _ in range(2000):
+        sizes = [rng.randint(1, 40) for _ in range(rng.randint(1, 6))]
+        pool = sum(sizes)
+        total = rng.randint(0, pool)
+        quotas = allocate(sizes, total)
+
+        assert sum(quotas) == total
+        for size, quota in zip(sizes, quotas):
+            # Each group gets its exact share rounded down or up, and never more than it has
+            assert size * total // pool <= quota <= -(-size * total // pool)
+            assert quota <= size
+
+
+def test_points_strata():
+    assert points_strata([1, 3, 1, 2, 3, 3]) == ((1, (0, 2)), (2, (3,)), (3, (1, 4, 5)))
+    assert points_strata([]) == ()
+
+
+def test_draw_positions_without_strata():
+    rng = random.Random(2)
+    for sample_size in (0, 1, 7, 50):
+        positions = draw_positions(50, sample_size, rng=rng)
+        assert len(positions) == sample_size
+        assert positions == sorted(set(positions))
+        assert all(0 <= position < 50 for position in positions)
+
+
+def test_draw_positions_keeps_strata_quotas():
+    points = [1] * 50 + [2] * 30 + [5] * 20
+    strata = points_strata(points)
+    rng = random.Random(3)
+    for sample_size in (1, 9, 10, 33, 100):
+        positions = draw_positions(len(points), sample_size, strata, rng=rng)
+        assert positions == sorted(set(positions))
+        drawn = Counter(points[position] for position in positions)
+        assert [drawn[question_points] for question_points, _ in strata] == allocate([50, 30, 20], sample_size)
+
+
+def test_draw_questions():
+    question_ids = tuple(range(101, 111))
+    whole = QuizPayload(question_ids, b'', (), None, None)
+    assert draw_questions(whole) is None
+
+    strata = points_strata([1] * 6 + [2] * 4)
+    sampled = QuizPayload(question_ids, b'', (), 5, strata)
+    for _ in range(20):
+        positions = draw_questions(sampled)
+        assert len(positions) == 5
+        assert sum(position < 6 for position in positions) == 3
+
+
+def test_encode_ids_round_trip():
+    assert decode_ids(encode_ids([5, 12, 7])) == [5, 12, 7]
+    assert decode_ids(encode_ids([])) == []
+    assert decode_ids(None) == []
+
+
+def test_sampled_attempt_grades_drawn_questions(client, make_quiz, make_student, answer_sheet):
+    points = [1] * 6 + [3] * 4
+    quiz_id, key = make_quiz('ABCDABCDAB', points=points, sample_size=5, sample_by_points=True)
+    points_by_id = dict(zip(sorted(key), points))
+    _, headers = make_student()
+
+    response = client.post(f'/api/quizzes/{quiz_id}/start', headers=headers)
+    assert response.status_code == 200
+    attempt = response.get_json()
+    drawn = [question['id'] for question in attempt['questions']]
+    assert len(drawn) == 5
+    assert sorted(points_by_id[question_id] for question_id in drawn) == [1, 1, 1, 3, 3]
+
+    response = client.post(f"/api/attempts/{attempt['attempt_id']}/submit",
+                           json={'answers': answer_sheet(attempt, key), 'time_taken': 30}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json() == {'score': 9, 'total_points': 9, 'percentage': 100.0}
@@ -0,0 +1,60 @@
+"""Per-attempt question and option order (shuffle.py)"""
+
+from shuffle import LETTERS, OPTION_ORDERS, _mix, option_orders, question_order, to_original_answers
+
+SEEDS = (0, 1, 12345, 2 ** 31 - 1)
+
+
+def test_mix_is_pinned():
+    # Attempts are graded by recomputing the order, possibly on another process or Python version
+    assert _mix(0, 0) == 0xE220A8397B1DCDAF  # splitmix64's first output for state 0
+    assert _mix(12345, 67) == 0x968DF1D63C5B7043
+    assert option_orders(12345, [1, 2, 3]) == ['ADBC', 'CBAD', 'BDCA']
+    assert question_order(12345, [1, 2, 3, 4, 5]) == [1, 4, 2, 0, 3]
+
+
+def test_question_order_is_a_permutation():
+    question_ids = list(range(100, 150))
+    for seed in SEEDS:
+        order = question_order(seed, question_ids)
+        assert sorted(order) == list(range(len(question_ids)))
+        assert order == question_order(seed, question_ids)
+
+
+def test_question_order_depends_on_seed():
+    question_ids = list(range(1, 21))
+    assert len({tuple(question_order(seed, question_ids)) for seed in SEEDS}) == len(SEEDS)
+
+
+def test_order_of_a_question_ignores_other_questions():
+    seed = 12345
+    question_ids = [3, 8, 21, 34, 55]
+    shown = [question_ids[i] for i in question_order(seed, question_ids)]
+
+    # Adding a question slots it in without moving the others relative to each other
+    more_ids = question_ids + [89]
+    shown_more = [more_ids[i] for i in question_order(seed, more_ids)]
+    assert [question_id for question_id in shown_more if question_id != 89] == shown
+    assert option_orders(seed, more_ids)[:len(question_ids)] == option_orders(seed, question_ids)
+
+
+def test_option_orders_use_every_permutation():
+    orders = option_orders(7, list(range(1, 2401)))
+    assert set(orders) == set(OPTION_ORDERS)
+    assert all(sorted(order) == list(LETTERS) for order in orders)
+
+
+def test_to_original_answers_inverts_option_orders():
+    question_ids = list(range(1, 201))
+    for seed in SEEDS:
+        orders = option_orders(seed, question_ids)
+        for original in LETTERS:
+            # The student picks the option that was originally `original`, labelled as shown
+            answers = {str(question_id): LETTERS[order.index(original)]
+                       for question_id, order in zip(question_ids, orders)}
+            assert to_original_answers(seed, answers) == {str(question_id): original for question_id in question_ids}
+
+
+def test_to_original_answers_keeps_other_values():
+    answers = {'1': None, '2': '', '3': 'E', '4': 'ab', 'x': 'A'}
+    assert to_original_answers(12345, answers) == {'1': None, '2': '', '3': 'E', '4': 'ab'}
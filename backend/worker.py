@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Job Worker
+Runs the scheduled jobs outside the web server
+
+Any number of workers can run, on one machine or several. They elect a
+leader through the 'scheduler' lease in job_leases, and only the leader
+starts scheduled jobs. A job runs in a process pool so it never holds the
+scheduler's GIL, and it also takes its own 'job:<name>' lease, so a job is
+never run twice at once, even by a manual run or while leadership changes
+hands. Jobs started from the admin API are queued in job_runs
+(job_runs.py) and run by the leader in the same pool. Pool processes send
+their log records back to the worker, which writes the job log
+(job_logging.py).
+
+Usage: python worker.py [--processes N]
+       python worker.py run <job>      (run one job now, in this process)
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import schedule
+
+import job_runs
+from job_logging import configure_child_logging, configure_logging
+from jobs import JOBS, get_job_scheduler
+
+# Named explicitly: run as a script, __name__ would be '__main__'
+logger = logging.getLogger('worker')
+
+
+def run_job(name):
+    """Run a scheduled job in a pool process"""
+    return job_runs.run_job(get_job_scheduler(), name)
+
+
+def run_requested(run_id, name):
+    """Run a job queued from the admin API in a pool process"""
+    scheduler = get_job_scheduler()
+    return scheduler.runs.execute(scheduler, run_id, name)
+
+
+class Worker:
+    def __init__(self, processes=None, lease_ttl=None, poll_interval=None, log_queue=None):
+        self.log_queue = log_queue
+        self.processes = processes or int(os.getenv('JOB_PROCESSES', '2'))
+        self.poll_interval = poll_interval or int(os.getenv('SCHEDULER_POLL_INTERVAL', '5'))
+        self.lease = job_runs.leader_lease(get_job_scheduler().SessionLocal)
+        if lease_ttl:
+            self.lease.ttl = lease_ttl
+        self.is_leader = False
+        self.running = False
+        self.futures = {}
+        self.pool = None
+
+    def submit(self, name):
+        """Start a scheduled job in the pool (leader only, one run per job at a time)"""
+        if not self.is_leader:
+            return
+        future = self.futures.get(name)
+        if future and not future.done():
+            logger.warning("Job %s is still running - skipping this run", name)
+            return
+
+        logger.info("Starting job %s", name)
+        future = self.pool.submit(run_job, name)
+        future.add_done_callback(lambda f: self.finished(name, f))
+        self.futures[name] = future
+
+    def dispatch_requested(self):
+        """Start the runs queued from the admin API (leader only)"""
+        if not self.is_leader:
+            return
+        try:
+            get_job_scheduler().runs.fail_abandoned()
+            while True:
+                claimed = get_job_scheduler().runs.claim()
+                if not claimed:
+                    return
+                run_id, name = claimed
+                logger.info("Starting requested job %s (%s)", name, run_id)
+                self.pool.submit(run_requested, run_id, name).add_done_callback(lambda f, name=name: self.finished(name, f))
+        except Exception as e:
+            logger.error("Failed to start requested jobs: %s", e)
+
+    @staticmethod
+    def finished(name, future):
+        error = future.exception()
+        if error:
+            logger.error("Job %s failed: %s", name, error)
+        else:
+            logger.info("Job %s finished: %s", name, future.result())
+
+    def elect(self):
+        """Take or renew the leader lease; logs when leadership changes"""
+        try:
+            leader = self.lease.acquire()
+        except Exception as e:
+            logger.error("Leader election failed: %s", e)
+            leader = False
+
+        if leader != self.is_leader:
+            logger.info("%s %s the job scheduler leader", self.lease.owner, 'is now' if leader else 'is no longer')
+        self.is_leader = leader
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        get_job_scheduler().runs.ensure_table()
+        # Fresh interpreters rather than forks of a process holding database connections
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=configure_child_logging if self.log_queue is not None else None,
+            initargs=(self.log_queue,) if self.log_queue is not None else ()
+        )
+        get_job_scheduler().schedule_jobs(run=self.submit)
+
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        logger.info("Job worker %s started with %d processes", self.lease.owner, self.processes)
+
+        renew_every = max(1, min(self.poll_interval, self.lease.ttl / 3))
+        try:
+            while self.running:
+                self.elect()
+                # Followers keep the schedule moving too, so a new leader doesn't
+                # rerun jobs the previous one already started
+                schedule.run_pending()
+                self.dispatch_requested()
+                deadline = time.monotonic() + renew_every
+                while self.running and time.monotonic() < deadline:
+                    time.sleep(0.5)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            logger.info("Job worker stopping, waiting for running jobs...")
+            self.pool.shutdown(wait=True)
+            schedule.clear()
+            if self.is_leader:
+                self.lease.release()
+            logger.info("Job worker stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Quiz app job worker')
+    parser.add_argument('--processes', type=int, help='job processes (default: JOB_PROCESSES or 2)')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run one job now')
+    run_parser.add_argument('job', choices=JOBS)
+    args = parser.parse_args(argv)
+
+    # Pool processes log through this queue, so only this process writes the job log
+    log_queue = configure_logging(multiprocessing.get_context('spawn').Queue())
+
+    if args.command == 'run':
+        get_job_scheduler().runs.ensure_table()
+        print(f"{args.job}: {run_job(args.job)}")
+        return
+
+    Worker(processes=args.processes, log_queue=log_queue).run()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
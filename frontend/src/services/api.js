@@ -43,6 +43,9 @@ export default {
   register: (userData) => api.post("/register", userData),
   getProfile: () => api.get("/profile"),
 
+  // Catalog tree: subjects with their chapters and quizzes
+  getCatalog: () => api.get("/catalog"),
+
   // Subject endpoints
   getSubjects: () => api.get("/subjects"),
   createSubject: (subjectData) => api.post("/subjects", subjectData),
@@ -67,13 +70,14 @@ export default {
   startQuiz: (quizId) => api.post(`/quizzes/${quizId}/start`),
   submitQuiz: (attemptId, submissionData) =>
     api.post(`/attempts/${attemptId}/submit`, submissionData),
-  getQuizAttempts: (quizId) => api.get(`/quizzes/${quizId}/attempts`),
+  getQuizAttempts: (quizId, params) =>
+    api.get(`/quizzes/${quizId}/attempts`, { params }),
 
   // User endpoints
-  getUserAttempts: () => api.get("/user/attempts"),
+  getUserAttempts: (params) => api.get("/user/attempts", { params }),
 
   // Admin endpoints
-  getUsers: () => api.get("/admin/users"),
+  getUsers: (params) => api.get("/admin/users", { params }),
   addUser: (userData) => api.post("/admin/users", userData),
   deleteUser: (userId) => api.delete(`/admin/users/${userId}`),
   updateUser: (userId, userData) => api.put(`/admin/users/${userId}`, userData),
@@ -83,6 +87,8 @@ export default {
   testUserReminders: () => api.post("/admin/jobs/test-reminders"),
   testAdminReport: () => api.post("/admin/jobs/test-admin-report"),
   testCleanup: () => api.post("/admin/jobs/test-cleanup"),
+  getJobRun: (jobId) => api.get(`/admin/jobs/runs/${jobId}`),
+  getJobRuns: () => api.get("/admin/jobs/runs"),
   getInactiveUsers: () => api.get("/admin/jobs/inactive-users"),
   getDailyStats: () => api.get("/admin/jobs/daily-stats"),
 };